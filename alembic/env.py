@@ -4,6 +4,8 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
+from app.config import settings
+from app.database.shards import shard_urls
 from app.models.models import Base
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -57,19 +59,27 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
+    section = config.get_section(config.config_ini_section, {})
+    # Partitioned storage keeps the same schema in every shard file.
+    shards = int(
+        context.get_x_argument(as_dictionary=True).get(
+            "shards", settings.database_shards
+        )
     )
-
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
+    for url in shard_urls(section["sqlalchemy.url"], shards):
+        connectable = engine_from_config(
+            {**section, "sqlalchemy.url": url},
+            prefix="sqlalchemy.",
+            poolclass=pool.NullPool,
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        with connectable.connect() as connection:
+            context.configure(
+                connection=connection, target_metadata=target_metadata
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
 
 
 if context.is_offline_mode():
@@ -0,0 +1,114 @@
+"""Add category stats
+
+Revision ID: 53f587a2ad21
+Revises: efc213bd65d7
+Create Date: 2026-10-18 13:31:45.210598
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '53f587a2ad21'
+down_revision = 'efc213bd65d7'
+branch_labels = None
+depends_on = None
+
+# Products without a category are counted under category_id 0.
+ADD_ROW = """
+    INSERT INTO category_stats (
+        category_id, product_count, total_quantity, inventory_value,
+        price_sum, priced_count
+    )
+    VALUES (
+        COALESCE(new.category_id, 0),
+        1,
+        COALESCE(new.quantity, 0),
+        COALESCE(new.price * new.quantity, 0),
+        COALESCE(new.price, 0),
+        new.price IS NOT NULL
+    )
+    ON CONFLICT (category_id) DO UPDATE SET
+        product_count = product_count + 1,
+        total_quantity = total_quantity + excluded.total_quantity,
+        inventory_value = inventory_value + excluded.inventory_value,
+        price_sum = price_sum + excluded.price_sum,
+        priced_count = priced_count + excluded.priced_count;
+"""
+
+REMOVE_ROW = """
+    UPDATE category_stats SET
+        product_count = product_count - 1,
+        total_quantity = total_quantity - COALESCE(old.quantity, 0),
+        inventory_value =
+            inventory_value - COALESCE(old.price * old.quantity, 0),
+        price_sum = price_sum - COALESCE(old.price, 0),
+        priced_count = priced_count - (old.price IS NOT NULL)
+    WHERE category_id = COALESCE(old.category_id, 0);
+    DELETE FROM category_stats
+    WHERE category_id = COALESCE(old.category_id, 0) AND product_count = 0;
+"""
+
+# MIN/MAX cannot be maintained by subtraction, but each is a single seek
+# into ix_products_category_id_price.
+REFRESH_BOUNDS = """
+    UPDATE category_stats SET
+        min_price = (
+            SELECT MIN(price) FROM products
+            WHERE category_id IS {row}.category_id
+        ),
+        max_price = (
+            SELECT MAX(price) FROM products
+            WHERE category_id IS {row}.category_id
+        )
+    WHERE category_id = COALESCE({row}.category_id, 0);
+"""
+
+
+def upgrade() -> None:
+    op.create_table('category_stats',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('product_count', sa.Integer(), nullable=False),
+    sa.Column('total_quantity', sa.Integer(), nullable=False),
+    sa.Column('inventory_value', sa.Float(), nullable=False),
+    sa.Column('price_sum', sa.Float(), nullable=False),
+    sa.Column('priced_count', sa.Integer(), nullable=False),
+    sa.Column('min_price', sa.Float(), nullable=True),
+    sa.Column('max_price', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('category_id')
+    )
+    op.execute(
+        "CREATE TRIGGER category_stats_insert AFTER INSERT ON products "
+        f"BEGIN {ADD_ROW} {REFRESH_BOUNDS.format(row='new')} END"
+    )
+    op.execute(
+        "CREATE TRIGGER category_stats_delete AFTER DELETE ON products "
+        f"BEGIN {REMOVE_ROW} {REFRESH_BOUNDS.format(row='old')} END"
+    )
+    op.execute(
+        "CREATE TRIGGER category_stats_update "
+        "AFTER UPDATE OF price, quantity, category_id ON products "
+        f"BEGIN {REMOVE_ROW} {ADD_ROW} "
+        f"{REFRESH_BOUNDS.format(row='old')} "
+        f"{REFRESH_BOUNDS.format(row='new')} END"
+    )
+    op.execute(
+        """
+        INSERT INTO category_stats
+        SELECT COALESCE(category_id, 0), COUNT(*),
+               COALESCE(SUM(quantity), 0),
+               COALESCE(SUM(price * quantity), 0),
+               COALESCE(SUM(price), 0), COUNT(price),
+               MIN(price), MAX(price)
+        FROM products
+        GROUP BY COALESCE(category_id, 0)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER category_stats_update")
+    op.execute("DROP TRIGGER category_stats_delete")
+    op.execute("DROP TRIGGER category_stats_insert")
+    op.drop_table('category_stats')
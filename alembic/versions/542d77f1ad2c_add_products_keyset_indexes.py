@@ -0,0 +1,26 @@
+"""Add products keyset indexes
+
+Revision ID: 542d77f1ad2c
+Revises: 9d7619994399
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '542d77f1ad2c'
+down_revision = '9d7619994399'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # ORDER BY id walks the rowid, so only the price order needs an index.
+    op.create_index(
+        'ix_products_price_id', 'products', ['price', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_price_id', table_name='products')
@@ -0,0 +1,59 @@
+"""Add change log
+
+Revision ID: 66ec6b0b0b75
+Revises: 53f587a2ad21
+Create Date: 2026-10-18 15:02:11.483920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '66ec6b0b0b75'
+down_revision = '53f587a2ad21'
+branch_labels = None
+depends_on = None
+
+TABLES = {'product': 'products', 'category': 'categories'}
+
+# (trigger suffix, event, row holding the id and version)
+EVENTS = (
+    ('insert', 'INSERT', 'new'),
+    ('update', 'UPDATE', 'new'),
+    ('delete', 'DELETE', 'old'),
+)
+
+
+def upgrade() -> None:
+    op.create_table('change_log',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=16), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(length=8), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=True),
+    sa.Column(
+        'changed_at',
+        sa.DateTime(),
+        server_default=sa.text('CURRENT_TIMESTAMP'),
+        nullable=False,
+    ),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True,
+    )
+    for entity, table in TABLES.items():
+        for name, event, row in EVENTS:
+            op.execute(
+                f"CREATE TRIGGER change_log_{table}_{name} "
+                f"AFTER {event} ON {table} BEGIN "
+                "INSERT INTO change_log (entity, entity_id, op, version) "
+                f"VALUES ('{entity}', {row}.id, '{name}', {row}.version); "
+                "END"
+            )
+
+
+def downgrade() -> None:
+    for table in TABLES.values():
+        for name, _, _ in EVENTS:
+            op.execute(f"DROP TRIGGER change_log_{table}_{name}")
+    op.drop_table('change_log')
@@ -0,0 +1,33 @@
+"""Enable incremental vacuum
+
+Revision ID: 8c6ff54e20b8
+Revises: 66ec6b0b0b75
+Create Date: 2026-10-18 18:40:27.305117
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c6ff54e20b8'
+down_revision = '66ec6b0b0b75'
+branch_labels = None
+depends_on = None
+
+
+def set_auto_vacuum(mode: str) -> None:
+    # The mode of an existing file only changes with a full VACUUM, which
+    # cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        op.execute(f'PRAGMA auto_vacuum = {mode}')
+        op.execute('VACUUM')
+
+
+def upgrade() -> None:
+    # Lets the maintenance task hand pages freed by bulk deletes back to
+    # the OS a few at a time with PRAGMA incremental_vacuum.
+    set_auto_vacuum('INCREMENTAL')
+
+
+def downgrade() -> None:
+    set_auto_vacuum('NONE')
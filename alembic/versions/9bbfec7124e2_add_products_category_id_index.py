@@ -0,0 +1,33 @@
+"""Add products category id index
+
+Revision ID: 9bbfec7124e2
+Revises: 8c6ff54e20b8
+Create Date: 2026-10-19 10:12:03.551870
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9bbfec7124e2'
+down_revision = '8c6ff54e20b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Serves category pages in id order, cursor pages included, without
+    # sorting the whole category.
+    op.create_index(
+        'ix_products_category_id_id',
+        'products',
+        ['category_id', 'id'],
+        unique=False,
+    )
+    # Statistics for the planner; the maintenance task's PRAGMA optimize
+    # keeps them current from here on.
+    op.execute('ANALYZE')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_category_id_id', table_name='products')
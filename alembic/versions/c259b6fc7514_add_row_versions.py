@@ -0,0 +1,34 @@
+"""Add row versions
+
+Revision ID: c259b6fc7514
+Revises: 542d77f1ad2c
+Create Date: 2026-10-18 10:02:17.530911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c259b6fc7514'
+down_revision = '542d77f1ad2c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'products',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+    )
+    op.add_column(
+        'categories',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('categories') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,41 @@
+"""Add products out of stock indexes
+
+Revision ID: d46b3457541a
+Revises: 9bbfec7124e2
+Create Date: 2026-10-19 14:05:37.214690
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd46b3457541a'
+down_revision = '9bbfec7124e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The in-stock indexes' counterparts: out-of-stock pages walk only
+    # the few out-of-stock rows, already in sort order.
+    op.create_index(
+        'ix_products_out_of_stock_id',
+        'products',
+        ['id'],
+        unique=False,
+        sqlite_where=sa.text('quantity <= 0'),
+    )
+    op.create_index(
+        'ix_products_out_of_stock_price_id',
+        'products',
+        ['price', 'id'],
+        unique=False,
+        sqlite_where=sa.text('quantity <= 0'),
+    )
+    op.execute('ANALYZE')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_out_of_stock_price_id', table_name='products')
+    op.drop_index('ix_products_out_of_stock_id', table_name='products')
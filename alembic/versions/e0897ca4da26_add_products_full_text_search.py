@@ -0,0 +1,67 @@
+"""Add products full-text search
+
+Revision ID: e0897ca4da26
+Revises: c259b6fc7514
+Create Date: 2026-10-18 11:26:03.904117
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e0897ca4da26'
+down_revision = 'c259b6fc7514'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # External-content table: the text lives only in products, the FTS5
+    # table stores the index. Prefix indexes keep "ham*" queries fast.
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE products_fts USING fts5(
+            name,
+            description,
+            content='products',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER products_fts_update
+        AFTER UPDATE OF name, description ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO products_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+        """
+    )
+    op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER products_fts_update")
+    op.execute("DROP TRIGGER products_fts_delete")
+    op.execute("DROP TRIGGER products_fts_insert")
+    op.execute("DROP TABLE products_fts")
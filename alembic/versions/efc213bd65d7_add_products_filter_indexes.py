@@ -0,0 +1,55 @@
+"""Add products filter indexes
+
+Revision ID: efc213bd65d7
+Revises: e0897ca4da26
+Create Date: 2026-10-18 12:40:51.662380
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'efc213bd65d7'
+down_revision = 'e0897ca4da26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_products_category_id_price',
+        'products',
+        ['category_id', 'price'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_products_quantity', 'products', ['quantity'], unique=False
+    )
+    op.create_index(
+        'ix_products_created_at', 'products', ['created_at'], unique=False
+    )
+    # Most of the catalog is in stock, so these only pay off as partial
+    # indexes that serve in_stock pages straight in sort order.
+    op.create_index(
+        'ix_products_in_stock_id',
+        'products',
+        ['id'],
+        unique=False,
+        sqlite_where=sa.text('quantity > 0'),
+    )
+    op.create_index(
+        'ix_products_in_stock_price_id',
+        'products',
+        ['price', 'id'],
+        unique=False,
+        sqlite_where=sa.text('quantity > 0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_in_stock_price_id', table_name='products')
+    op.drop_index('ix_products_in_stock_id', table_name='products')
+    op.drop_index('ix_products_created_at', table_name='products')
+    op.drop_index('ix_products_quantity', table_name='products')
+    op.drop_index('ix_products_category_id_price', table_name='products')
@@ -0,0 +1,97 @@
+"""Maintenance commands.
+
+    python -m app.cli rebuild-search-index
+    python -m app.cli rebuild-stats
+    python -m app.cli verify-stats
+    python -m app.cli compact-changes
+    python -m app.cli vacuum
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from app import crud
+from app.config import settings
+from app.database.engine import async_session
+from app.database.shards import shard_router
+from app.services.maintenance import reclaim_free_pages
+
+
+def session_factories():
+    """One session factory per database file, shards included."""
+    if shard_router is not None:
+        return shard_router.sessions
+    return [async_session]
+
+
+async def rebuild_search_index():
+    for session_factory in session_factories():
+        async with session_factory() as db:
+            await crud.rebuild_search_index(db=db)
+            await db.commit()
+    print("Search index rebuilt")
+
+
+async def rebuild_stats():
+    for session_factory in session_factories():
+        async with session_factory() as db:
+            await crud.rebuild_category_stats(db=db)
+            await db.commit()
+    print("Category stats rebuilt")
+
+
+async def verify_stats():
+    mismatched = set()
+    for session_factory in session_factories():
+        async with session_factory() as db:
+            mismatched.update(await crud.verify_category_stats(db=db))
+    mismatched = sorted(mismatched)
+    if mismatched:
+        print(f"Stats differ for categories: {mismatched}")
+        sys.exit(1)
+    print("Category stats match")
+
+
+async def compact_changes():
+    before = datetime.utcnow() - timedelta(
+        seconds=settings.change_log_retention
+    )
+    removed = 0
+    for session_factory in session_factories():
+        async with session_factory() as db:
+            removed += await crud.compact_changes(db=db, before=before)
+            await db.commit()
+    print(f"Removed {removed} change log entries")
+
+
+async def vacuum():
+    reclaimed = 0
+    for session_factory in session_factories():
+        reclaimed += await reclaim_free_pages(
+            session_factory, settings.vacuum_step_pages
+        )
+        async with session_factory() as db:
+            await crud.optimize(db=db)
+            await db.commit()
+    print(f"Reclaimed {reclaimed} free pages")
+
+
+COMMANDS = {
+    "rebuild-search-index": rebuild_search_index,
+    "rebuild-stats": rebuild_stats,
+    "verify-stats": verify_stats,
+    "compact-changes": compact_changes,
+    "vacuum": vacuum,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+    asyncio.run(COMMANDS[args.command]())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from typing import Optional
+
+from pydantic import BaseSettings
+
+
+class Settings(BaseSettings):
+    database_url: str = "sqlite+aiosqlite:///./products.db"
+    # Defaults to database_url; GET handlers use this engine.
+    database_read_url: Optional[str] = None
+    database_echo: bool = False
+    database_read_pool_size: int = 5
+    database_read_max_overflow: int = 10
+    # SQLite has a single writer, so extra write connections only contend.
+    database_write_pool_size: int = 1
+    database_write_max_overflow: int = 0
+    database_pool_timeout: float = 30.0
+    # Products are spread over this many SQLite files, each with its own
+    # writer. Shard 0 is database_url and holds everything else too.
+    database_shards: int = 1
+    # Every shard reads offset + limit rows for an offset page, so deeper
+    # pages than this must use cursors when storage is partitioned.
+    database_shard_max_offset: int = 1000
+
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # Negative values are KiB, positive values are pages.
+    sqlite_cache_size: int = -64000
+    sqlite_busy_timeout: int = 5000
+
+    # Coalesce concurrent product writes into shared transactions.
+    write_batching_enabled: bool = False
+    write_batch_window: float = 0.002
+    write_batch_max_size: int = 100
+
+    cache_enabled: bool = True
+    cache_max_size: int = 10000
+    cache_ttl: float = 60.0
+
+    # Change log entries older than this many seconds are compacted away.
+    change_log_retention: float = 7 * 24 * 3600
+    change_log_compact_interval: float = 3600.0
+    # Change streams also poll this often, for writes by other processes.
+    change_feed_poll_interval: float = 1.0
+
+    # Open every pooled connection and run each read query once at
+    # start-up, before /health/ready reports ready. The first
+    # warmup_preload_rows products are read in id and price order.
+    warmup_enabled: bool = True
+    warmup_preload_rows: int = 1000
+
+    # Free pages left by deletes are handed back to the OS, and planner
+    # statistics refreshed, every maintenance_interval seconds. Each
+    # transaction frees at most vacuum_step_pages pages.
+    maintenance_interval: float = 600.0
+    vacuum_step_pages: int = 1000
+
+    # Serve product and category reads from a memory-mapped snapshot file
+    # shared by all workers; one worker rebuilds it as the data changes.
+    snapshot_enabled: bool = False
+    snapshot_path: str = "./products.snapshot"
+    snapshot_interval: float = 0.5
+    # How often each worker checks for a newer snapshot file.
+    snapshot_reload_interval: float = 0.1
+
+    # Concurrent requests let through to the database; the rest queue for
+    # up to admission_queue_timeout seconds and are then shed with 503.
+    admission_enabled: bool = True
+    admission_read_limit: int = 16
+    admission_read_queue: int = 128
+    admission_write_limit: int = 4
+    admission_write_queue: int = 128
+    admission_queue_timeout: float = 2.0
+    admission_retry_after: int = 1
+
+    # Requests running more SQL statements than this are logged (0 disables).
+    metrics_statement_limit: int = 20
+
+    class Config:
+        env_file = ".env"
+
+
+settings = Settings()
@@ -1,22 +1,245 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    Float,
+    String,
+    and_,
+    column,
+    delete,
+    func,
+    literal_column,
+    or_,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from app.models.models import Product, Category
-from app.serializers.schemas import ProductCreate
+from app.models.models import Product, Category, CategoryStats, ChangeLog
+from app.serializers.schemas import (
+    ProductCreate,
+    ProductFilter,
+    ProductUpdate,
+)
+from app.services.cache import product_cache
+from app.services.inventory import InsufficientStock, UnknownProduct
+from app.services.search import HIGHLIGHT
+from app.services.write_queue import run_write
+
+# Keeps every statement well under SQLite's bound-parameter limit.
+BULK_BATCH_SIZE = 500
+
+# Selecting plain columns skips ORM identity-map bookkeeping on list reads.
+PRODUCT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.price,
+    Product.quantity,
+    Product.category_id,
+    Product.created_at,
+    Product.version,
+)
+PRODUCT_FIELDS = {column.key: column for column in PRODUCT_COLUMNS}
+
+
+def product_columns(fields: Optional[Sequence[str]] = None):
+    """The columns to select for ``fields``, or all of them for None."""
+    if fields is None:
+        return PRODUCT_COLUMNS
+    return tuple(PRODUCT_FIELDS[name] for name in fields)
+
+
+CATEGORY_COLUMNS = (Category.id, Category.name, Category.version)
+
+
+# Without STAT4, SQLite guesses that a one-sided range keeps a quarter of
+# the table, so walking the sort order and discarding rows looks cheaper
+# than searching the range's index. People filter to narrow a listing, so
+# range filters are declared selective; the terms still use indexes.
+RANGE_FILTER_LIKELIHOOD = literal_column("0.05")
+
+
+def _narrow(term):
+    return func.likelihood(term, RANGE_FILTER_LIKELIHOOD)
+
+
+def apply_product_filter(stmt, filters: Optional[ProductFilter]):
+    if filters is None:
+        return stmt
+    if filters.category_id is not None:
+        stmt = stmt.where(Product.category_id == filters.category_id)
+    if filters.min_price is not None:
+        stmt = stmt.where(_narrow(Product.price >= filters.min_price))
+    if filters.max_price is not None:
+        stmt = stmt.where(_narrow(Product.price <= filters.max_price))
+    # A literal, not a bound parameter, so the partial in-stock indexes
+    # can be matched against it.
+    if filters.in_stock is True:
+        stmt = stmt.where(Product.quantity > literal_column("0"))
+    elif filters.in_stock is False:
+        stmt = stmt.where(Product.quantity <= literal_column("0"))
+    if filters.created_after is not None:
+        stmt = stmt.where(_narrow(Product.created_at > filters.created_after))
+    if filters.created_before is not None:
+        stmt = stmt.where(
+            _narrow(Product.created_at < filters.created_before)
+        )
+    return stmt
+
+
+def product_page_stmt(
+    limit: int,
+    offset: int = 0,
+    order_by: str = "id",
+    filters: Optional[ProductFilter] = None,
+    after_id: Optional[int] = None,
+    after_price: Optional[float] = None,
+    fields: Optional[Sequence[str]] = None,
+):
+    stmt = apply_product_filter(select(*product_columns(fields)), filters)
+    if order_by == "price":
+        stmt = stmt.order_by(Product.price, Product.id)
+        if after_id is not None and after_price is None:
+            # NULL prices sort first, so the cursor may still be inside them.
+            stmt = stmt.where(
+                or_(
+                    and_(Product.price.is_(None), Product.id > after_id),
+                    Product.price.isnot(None),
+                )
+            )
+        elif after_id is not None:
+            stmt = stmt.where(
+                tuple_(Product.price, Product.id) > (after_price, after_id)
+            )
+    else:
+        stmt = stmt.order_by(Product.id)
+        if after_id is not None:
+            stmt = stmt.where(Product.id > after_id)
+    return stmt.offset(offset).limit(limit)
 
 
-async def get_all_products(db: AsyncSession, offset: int, limit: int):
-    stmt = select(Product).offset(offset).limit(limit)
+async def get_all_products(
+    db: AsyncSession,
+    offset: int,
+    limit: int,
+    filters: Optional[ProductFilter] = None,
+    fields: Optional[Sequence[str]] = None,
+):
+    stmt = product_page_stmt(
+        limit=limit, offset=offset, filters=filters, fields=fields
+    )
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return result.all()
 
 
 async def get_all_products_sorted_by_price(
-    db: AsyncSession, offset: int, limit: int
+    db: AsyncSession,
+    offset: int,
+    limit: int,
+    filters: Optional[ProductFilter] = None,
+    fields: Optional[Sequence[str]] = None,
 ):
-    stmt = select(Product).order_by(Product.price).offset(offset).limit(limit)
+    stmt = product_page_stmt(
+        limit=limit,
+        offset=offset,
+        order_by="price",
+        filters=filters,
+        fields=fields,
+    )
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return result.all()
+
+
+async def get_products_after(
+    db: AsyncSession,
+    limit: int,
+    after_id: Optional[int] = None,
+    after_price: Optional[float] = None,
+    order_by: str = "id",
+    filters: Optional[ProductFilter] = None,
+    fields: Optional[Sequence[str]] = None,
+):
+    stmt = product_page_stmt(
+        limit=limit,
+        order_by=order_by,
+        filters=filters,
+        after_id=after_id,
+        after_price=after_price,
+        fields=fields,
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+
+async def stream_products(
+    db: AsyncSession,
+    batch_size: int = 1000,
+    fields: Optional[Sequence[str]] = None,
+):
+    stmt = (
+        select(*product_columns(fields))
+        .order_by(Product.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(stmt)
+    async for rows in result.partitions():
+        yield rows
+
+
+SEARCH_SQL = """
+SELECT p.id, p.name, p.description, p.price, p.quantity, p.category_id,
+       p.created_at, p.version, hits.score, hits.snippet
+FROM (
+    SELECT rowid,
+           bm25(products_fts, 10.0, 1.0) AS score,
+           snippet(products_fts, -1, :open, :close, '…', 12) AS snippet
+    FROM products_fts
+    WHERE products_fts MATCH :match
+) AS hits
+JOIN products AS p ON p.id = hits.rowid
+{after}
+ORDER BY hits.score, p.id
+LIMIT :limit
+"""
+
+
+async def search_products(
+    db: AsyncSession,
+    match: str,
+    limit: int,
+    after_score: Optional[float] = None,
+    after_id: Optional[int] = None,
+    highlight: Tuple[str, str] = HIGHLIGHT,
+):
+    params = {
+        "match": match,
+        "limit": limit,
+        "open": highlight[0],
+        "close": highlight[1],
+    }
+    after = ""
+    if after_id is not None:
+        after = "WHERE (hits.score, p.id) > (:after_score, :after_id)"
+        params.update(after_score=after_score, after_id=after_id)
+    stmt = text(SEARCH_SQL.format(after=after)).columns(
+        *PRODUCT_COLUMNS, column("score", Float), column("snippet", String)
+    )
+    result = await db.execute(stmt, params)
+    return result.all()
+
+
+async def rebuild_search_index(db: AsyncSession):
+    await db.execute(
+        text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+    )
+    await db.execute(
+        text("INSERT INTO products_fts(products_fts) VALUES ('optimize')")
+    )
 
 
 async def get_product_by_id(db: AsyncSession, product_id: int):
@@ -25,37 +248,414 @@ async def get_product_by_id(db: AsyncSession, product_id: int):
     return result.scalar()
 
 
+async def get_product_row(
+    db: AsyncSession, product_id: int, fields: Sequence[str]
+) -> Optional[Row]:
+    stmt = select(*product_columns(fields)).where(Product.id == product_id)
+    result = await db.execute(stmt)
+    return result.first()
+
+
+async def get_products_by_ids(
+    db: AsyncSession, ids: Iterable[int]
+) -> Dict[int, Row]:
+    ids = list(ids)
+    products = {}
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        stmt = select(*PRODUCT_COLUMNS).where(
+            Product.id.in_(ids[start : start + BULK_BATCH_SIZE])
+        )
+        result = await db.execute(stmt)
+        products.update((row.id, row) for row in result)
+    return products
+
+
+async def allocate_product_ids(
+    db: AsyncSession, count: int
+) -> Optional[List[int]]:
+    """Ids for ``count`` new products on a partitioned shard.
+
+    Shard ``k`` of ``n`` only hands out ids with ``id % n == k``. Returns
+    None for an unpartitioned database, where SQLite picks the ids. Call
+    it inside the write transaction that inserts the rows.
+    """
+    shard = db.info.get("shard")
+    if shard is None:
+        return None
+    index, shards = shard
+    last = await db.scalar(select(func.max(Product.id))) or 0
+    first = last + ((index - last) % shards or shards)
+    return [first + shards * i for i in range(count)]
+
+
+def next_product_id(shard: Tuple[int, int]):
+    """SQL for the next id shard ``index`` of ``shards`` may hand out.
+
+    Embedding it in the INSERT allocates the id without a round trip of
+    its own; the write transaction keeps the max from moving meanwhile.
+    """
+    index, shards = shard
+    after = (
+        func.coalesce(select(func.max(Product.id)).scalar_subquery(), 0) + 1
+    )
+    # SQLite's % keeps the sign of the dividend.
+    return after + ((index - after) % shards + shards) % shards
+
+
 async def create_product(db: AsyncSession, product: ProductCreate):
-    db_product = Product(
-        name=product.name,
-        description=product.description,
-        price=product.price,
-        quantity=product.quantity,
-        category_id=product.category_id,
-    )
-    db.add(db_product)
-    await db.commit()
-    await db.refresh(db_product)
+    async def insert(session: AsyncSession):
+        shard = session.info.get("shard")
+        db_product = Product(
+            id=next_product_id(shard) if shard else None,
+            name=product.name,
+            description=product.description,
+            price=product.price,
+            quantity=product.quantity,
+            category_id=product.category_id,
+        )
+        session.add(db_product)
+        await session.flush()
+        return db_product
+
+    db_product = await run_write(db, insert)
+    product_cache.invalidate(db_product.id)
     return db_product
 
 
+async def get_product_ids_by_name(
+    db: AsyncSession, names: Iterable[str]
+) -> Dict[str, int]:
+    names = list(names)
+    ids = {}
+    for start in range(0, len(names), BULK_BATCH_SIZE):
+        stmt = select(Product.name, Product.id).where(
+            Product.name.in_(names[start : start + BULK_BATCH_SIZE])
+        )
+        result = await db.execute(stmt)
+        ids.update(result.tuples().all())
+    return ids
+
+
+async def upsert_products(
+    db: AsyncSession, rows: List[dict]
+) -> Dict[str, Tuple[int, bool]]:
+    """Insert or update rows by name without committing.
+
+    Returns ``{name: (id, created)}`` for every name in ``rows``.
+    """
+    names = {row["name"] for row in rows}
+    existing = await get_product_ids_by_name(db, names)
+    stmt = sqlite_insert(Product.__table__)
+    updates = {
+        column: stmt.excluded[column]
+        for column in ("description", "price", "quantity", "category_id")
+    }
+    updates["version"] = Product.__table__.c.version + 1
+    stmt = stmt.on_conflict_do_update(index_elements=["name"], set_=updates)
+    groups = [rows]
+    new = [row for row in rows if row["name"] not in existing]
+    ids = await allocate_product_ids(db, len(new))
+    if ids is not None:
+        # Every row of one statement must have the same keys.
+        groups = [
+            [row for row in rows if row["name"] in existing],
+            [dict(row, id=product_id) for row, product_id in zip(new, ids)],
+        ]
+    for group in groups:
+        for start in range(0, len(group), BULK_BATCH_SIZE):
+            await db.execute(stmt, group[start : start + BULK_BATCH_SIZE])
+    ids = await get_product_ids_by_name(db, names)
+    return {name: (ids[name], name not in existing) for name in names}
+
+
+async def get_categories_by_ids(
+    db: AsyncSession, ids: Iterable[int]
+) -> Dict[int, Row]:
+    ids = list(ids)
+    categories = {}
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        stmt = select(*CATEGORY_COLUMNS).where(
+            Category.id.in_(ids[start : start + BULK_BATCH_SIZE])
+        )
+        result = await db.execute(stmt)
+        categories.update((row.id, row) for row in result)
+    return categories
+
+
+async def get_category_ids_by_name(db: AsyncSession) -> Dict[str, int]:
+    result = await db.execute(select(Category.name, Category.id))
+    return dict(result.tuples().all())
+
+
 async def update_product(
-    db: AsyncSession, product_id: int, product: ProductCreate
-):
-    db_product = await db.get(Product, product_id)
-    db_product.name = product.name
-    db_product.description = product.description
-    db_product.price = product.price
-    db_product.quantity = product.quantity
-    category = await db.get(Category, product.category_id)
-    db_product.category = category
-    await db.commit()
-    await db.refresh(db_product)
-    return db_product
+    db: AsyncSession, product_id: int, product: ProductUpdate
+) -> Optional[Row]:
+    return await patch_product(db, product_id, product.dict())
 
 
-async def delete_product(db: AsyncSession, product_id: int):
-    db_product = await db.get(Product, product_id)
-    db.delete(db_product)
-    await db.commit()
-    return db_product
+async def patch_product(
+    db: AsyncSession, product_id: int, values: dict
+) -> Optional[Row]:
+    """Applies ``values`` in a single UPDATE … RETURNING statement.
+
+    Returns the updated row, or None when no product has ``product_id``.
+    """
+    stmt = (
+        update(Product)
+        .where(Product.id == product_id)
+        .values(**values, version=Product.version + 1)
+        .returning(*PRODUCT_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+
+    async def patch(session: AsyncSession):
+        result = await session.execute(stmt)
+        return result.first()
+
+    row = await run_write(db, patch)
+    product_cache.invalidate(product_id)
+    return row
+
+
+async def delete_product(db: AsyncSession, product_id: int) -> bool:
+    stmt = (
+        delete(Product)
+        .where(Product.id == product_id)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+
+    async def remove(session: AsyncSession):
+        result = await session.execute(stmt)
+        return result.first() is not None
+
+    deleted = await run_write(db, remove)
+    product_cache.invalidate(product_id)
+    return deleted
+
+
+async def delete_products(
+    db: AsyncSession, filters: Optional[ProductFilter], limit: int
+) -> List[int]:
+    """Deletes up to ``limit`` products matching ``filters``, lowest ids
+    first, in one transaction. Returns the ids deleted.
+    """
+    batch = (
+        apply_product_filter(select(Product.id), filters)
+        .order_by(Product.id)
+        .limit(limit)
+    )
+    stmt = (
+        delete(Product)
+        .where(Product.id.in_(batch.scalar_subquery()))
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+
+    async def remove(session: AsyncSession):
+        result = await session.execute(stmt)
+        return result.scalars().all()
+
+    product_ids = await run_write(db, remove)
+    for product_id in product_ids:
+        product_cache.invalidate(product_id)
+    return product_ids
+
+
+async def reserve_stock(
+    db: AsyncSession, items: Dict[int, int]
+) -> Dict[int, int]:
+    """Takes ``items`` ({product_id: quantity}) out of stock, all or nothing.
+
+    Each product costs one conditional UPDATE, so concurrent reservations
+    can never take stock below zero. Returns the remaining quantities.
+    """
+    return await _adjust_stock(db, items, reserve=True)
+
+
+async def release_stock(
+    db: AsyncSession, items: Dict[int, int]
+) -> Dict[int, int]:
+    """Puts ``items`` back into stock, all or nothing."""
+    return await _adjust_stock(db, items, reserve=False)
+
+
+async def _adjust_stock(
+    db: AsyncSession, items: Dict[int, int], reserve: bool
+) -> Dict[int, int]:
+    async def adjust(session: AsyncSession):
+        remaining = {}
+        # A fixed order keeps concurrent carts from interleaving oddly.
+        for product_id, quantity in sorted(items.items()):
+            stmt = update(Product).where(Product.id == product_id)
+            if reserve:
+                stmt = stmt.where(Product.quantity >= quantity).values(
+                    quantity=Product.quantity - quantity
+                )
+            else:
+                stmt = stmt.values(
+                    quantity=func.coalesce(Product.quantity, 0) + quantity
+                )
+            stmt = (
+                stmt.values(version=Product.version + 1)
+                .returning(Product.quantity)
+                .execution_options(synchronize_session=False)
+            )
+            left = (await session.execute(stmt)).scalar_one_or_none()
+            if left is None:
+                # Raising rolls back the items already adjusted.
+                available = await session.execute(
+                    select(Product.quantity).where(Product.id == product_id)
+                )
+                row = available.first()
+                if row is None:
+                    raise UnknownProduct(product_id)
+                raise InsufficientStock(product_id, quantity, row.quantity)
+            remaining[product_id] = left
+        return remaining
+
+    remaining = await run_write(db, adjust)
+    for product_id in remaining:
+        product_cache.invalidate(product_id)
+    return remaining
+
+
+async def detach_category_products(
+    db: AsyncSession, category_id: int
+) -> List[int]:
+    """Moves a category's products to no category in one statement."""
+    stmt = (
+        update(Product)
+        .where(Product.category_id == category_id)
+        .values(category_id=None, version=Product.version + 1)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+
+def _category_stats_query():
+    category_id = func.coalesce(Product.category_id, 0)
+    return select(
+        category_id.label("category_id"),
+        func.count().label("product_count"),
+        func.coalesce(func.sum(Product.quantity), 0).label("total_quantity"),
+        func.coalesce(func.sum(Product.price * Product.quantity), 0.0).label(
+            "inventory_value"
+        ),
+        func.coalesce(func.sum(Product.price), 0.0).label("price_sum"),
+        func.count(Product.price).label("priced_count"),
+        func.min(Product.price).label("min_price"),
+        func.max(Product.price).label("max_price"),
+    ).group_by(category_id)
+
+
+async def get_category_stats(
+    db: AsyncSession, category_id: Optional[int] = None
+) -> List[CategoryStats]:
+    stmt = select(CategoryStats).order_by(CategoryStats.category_id)
+    if category_id is not None:
+        stmt = stmt.where(CategoryStats.category_id == category_id)
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+
+async def rebuild_category_stats(db: AsyncSession):
+    await db.execute(CategoryStats.__table__.delete())
+    query = _category_stats_query()
+    await db.execute(
+        CategoryStats.__table__.insert().from_select(
+            [column.name for column in query.selected_columns], query
+        )
+    )
+
+
+async def verify_category_stats(
+    db: AsyncSession, tolerance: float = 1e-6
+) -> List[int]:
+    """Returns the categories whose stored stats differ from a recount."""
+    expected = {
+        row.category_id: row
+        for row in (await db.execute(_category_stats_query())).all()
+    }
+    stored = {row.category_id: row for row in await get_category_stats(db)}
+    mismatched = []
+    for category_id in sorted(set(expected) | set(stored)):
+        want, have = expected.get(category_id), stored.get(category_id)
+        if want is None or have is None:
+            mismatched.append(category_id)
+            continue
+        for name in want._fields:
+            a, b = getattr(want, name), getattr(have, name)
+            if a is None or b is None:
+                if a is not b:
+                    mismatched.append(category_id)
+                    break
+            elif abs(a - b) > tolerance * max(1.0, abs(a)):
+                mismatched.append(category_id)
+                break
+    return mismatched
+
+
+async def incremental_vacuum(db: AsyncSession, pages: int) -> int:
+    """Returns up to ``pages`` free pages to the OS and says how many.
+
+    Files without auto_vacuum = INCREMENTAL cannot shrink this way, so
+    nothing is freed for them.
+    """
+    if await db.scalar(text("PRAGMA auto_vacuum")) != 2:
+        return 0
+    free = await db.scalar(text("PRAGMA freelist_count"))
+    pages = min(pages, free)
+    # Each step of the pragma frees one page, and Python's sqlite3 steps
+    # a statement only once.
+    for _ in range(pages):
+        await db.execute(text("PRAGMA incremental_vacuum(1)"))
+    return pages
+
+
+async def optimize(db: AsyncSession):
+    """Refreshes the planner statistics that have gone stale."""
+    await db.execute(text("PRAGMA optimize"))
+
+
+async def get_changes(db: AsyncSession, since: int, limit: int) -> List[Row]:
+    stmt = (
+        select(ChangeLog.__table__)
+        .where(ChangeLog.seq > since)
+        .order_by(ChangeLog.seq)
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+
+async def get_change_log_bounds(
+    db: AsyncSession,
+) -> Tuple[Optional[int], int]:
+    """The oldest retained sequence number and the last one ever issued."""
+    oldest = await db.scalar(select(func.min(ChangeLog.seq)))
+    last = await db.scalar(
+        text("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+    )
+    return oldest, last or 0
+
+
+async def compact_changes(db: AsyncSession, before: datetime) -> int:
+    """Deletes change log entries recorded before ``before`` (UTC).
+
+    Sequence numbers and timestamps grow together, so this finds the first
+    entry to keep and deletes everything ahead of it by primary key.
+    """
+    keep_from = await db.scalar(
+        select(ChangeLog.seq)
+        .where(ChangeLog.changed_at >= before)
+        .order_by(ChangeLog.seq)
+        .limit(1)
+    )
+    stmt = delete(ChangeLog).execution_options(synchronize_session=False)
+    if keep_from is not None:
+        stmt = stmt.where(ChangeLog.seq < keep_from)
+    result = await db.execute(stmt)
+    return result.rowcount
@@ -1,12 +1,93 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-SQLALCHEMY_DATABASE_URI = "sqlite+aiosqlite:///./products.db"
+from app.config import settings
+from app.services.metrics import instrument_engine
+
+SQLALCHEMY_DATABASE_URI = settings.database_url
+
+
+def _is_memory_database(url: str) -> bool:
+    return make_url(url).database in (None, "", ":memory:")
+
+
+def _sqlite_pragmas(read_only: bool):
+    pragmas = [
+        f"PRAGMA busy_timeout = {settings.sqlite_busy_timeout:d}",
+        f"PRAGMA cache_size = {settings.sqlite_cache_size:d}",
+        f"PRAGMA mmap_size = {settings.sqlite_mmap_size:d}",
+        f"PRAGMA synchronous = {settings.sqlite_synchronous}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # The journal mode is stored in the file, so only the writer sets it.
+        pragmas.append(f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+    return pragmas
+
+
+def create_engine(
+    url: str, pool_size: int, max_overflow: int, read_only: bool = False
+):
+    options = {"echo": settings.database_echo}
+    if not _is_memory_database(url):
+        options.update(
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=settings.database_pool_timeout,
+        )
+    engine = create_async_engine(url, **options)
+    instrument_engine(engine.sync_engine)
+    if engine.dialect.name == "sqlite":
+        pragmas = _sqlite_pragmas(read_only)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+            # Let SQLAlchemy emit BEGIN itself so SAVEPOINTs nest properly.
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine.sync_engine, "begin")
+        def begin(conn):
+            # Writers take the lock up front instead of failing to upgrade
+            # a read transaction once another writer got there first.
+            conn.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+    return engine
+
+
+write_engine = create_engine(
+    SQLALCHEMY_DATABASE_URI,
+    pool_size=settings.database_write_pool_size,
+    max_overflow=settings.database_write_max_overflow,
+)
+if settings.database_read_url is None and _is_memory_database(
+    SQLALCHEMY_DATABASE_URI
+):
+    # A second in-memory engine would be a different, empty database.
+    read_engine = write_engine
+else:
+    read_engine = create_engine(
+        settings.database_read_url or SQLALCHEMY_DATABASE_URI,
+        pool_size=settings.database_read_pool_size,
+        max_overflow=settings.database_read_max_overflow,
+        read_only=True,
+    )
+engine = write_engine
 
-engine = create_async_engine(SQLALCHEMY_DATABASE_URI, echo=True)
 async_session = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False, autocommit=False
+    write_engine, class_=AsyncSession, expire_on_commit=False, autocommit=False
+)
+async_read_session = sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False, autocommit=False
 )
 
 
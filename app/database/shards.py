@@ -0,0 +1,161 @@
+import asyncio
+import os
+import zlib
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database.engine import (
+    SQLALCHEMY_DATABASE_URI,
+    create_engine,
+    read_engine,
+    write_engine,
+)
+from app.services.write_queue import WriteBatcher
+
+ShardOp = Callable[[AsyncSession, int], Awaitable[Any]]
+
+
+def shard_urls(url: str, count: int) -> List[str]:
+    """The database URLs of ``count`` shards, shard 0 being ``url`` itself.
+
+    ``products.db`` becomes ``products.db``, ``products.shard1.db``, …
+    """
+    parsed = make_url(url)
+    if count > 1 and parsed.database in (None, "", ":memory:"):
+        raise ValueError("In-memory databases cannot be partitioned")
+    root, extension = os.path.splitext(parsed.database or "")
+    urls = [url]
+    for shard in range(1, count):
+        urls.append(
+            parsed.set(
+                database=f"{root}.shard{shard}{extension}"
+            ).render_as_string(hide_password=False)
+        )
+    return urls
+
+
+class ShardRouter:
+    """Spreads products over several SQLite files, each with its own writer.
+
+    A product with ``id`` lives in shard ``id % len(router)``, and each
+    shard only hands out ids of its own residue, so an id alone says where
+    a product is. New products are placed by a hash of their name, which
+    keeps names unique because every file enforces that itself. Categories
+    and all other tables are used from shard 0 only.
+
+    Sessions carry ``info["shard"] = (shard, count)`` for the id allocator
+    in ``crud``, and writer sessions their shard's ``write_batcher``.
+    """
+
+    def __init__(self, engines: Sequence[Tuple[AsyncEngine, AsyncEngine]]):
+        self.engines = list(engines)
+        self.sessions: List[sessionmaker] = []
+        self.read_sessions: List[sessionmaker] = []
+        self.write_batchers: List[WriteBatcher] = []
+        count = len(self.engines)
+        for shard, (write, read) in enumerate(self.engines):
+            info = {"shard": (shard, count)}
+            sessions = sessionmaker(
+                write, class_=AsyncSession, expire_on_commit=False, info=info
+            )
+            batcher = WriteBatcher(
+                sessions,
+                window=settings.write_batch_window,
+                max_batch=settings.write_batch_max_size,
+                enabled=settings.write_batching_enabled,
+            )
+            sessions.configure(info={**info, "write_batcher": batcher})
+            self.sessions.append(sessions)
+            self.read_sessions.append(
+                sessionmaker(
+                    read,
+                    class_=AsyncSession,
+                    expire_on_commit=False,
+                    info=info,
+                )
+            )
+            self.write_batchers.append(batcher)
+
+    @classmethod
+    def from_urls(
+        cls,
+        urls: Sequence[str],
+        first: Optional[Tuple[AsyncEngine, AsyncEngine]] = None,
+    ) -> "ShardRouter":
+        """Opens engines for ``urls``, reusing ``first`` for shard 0."""
+        engines = []
+        for shard, url in enumerate(urls):
+            if shard == 0 and first is not None:
+                engines.append(first)
+                continue
+            engines.append(
+                (
+                    create_engine(
+                        url,
+                        pool_size=settings.database_write_pool_size,
+                        max_overflow=settings.database_write_max_overflow,
+                    ),
+                    create_engine(
+                        url,
+                        pool_size=settings.database_read_pool_size,
+                        max_overflow=settings.database_read_max_overflow,
+                        read_only=True,
+                    ),
+                )
+            )
+        return cls(engines)
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_for_id(self, product_id: int) -> int:
+        return product_id % len(self.engines)
+
+    def shard_for_name(self, name: str) -> int:
+        # crc32 rather than hash(), which differs between processes.
+        return zlib.crc32(name.encode("utf-8")) % len(self.engines)
+
+    async def fan_out(
+        self,
+        op: ShardOp,
+        shards: Optional[Iterable[int]] = None,
+        read: bool = True,
+    ) -> List[Any]:
+        """Runs ``op(session, shard)`` on every shard (or ``shards``) at once.
+
+        Each shard gets its own session. Results come back in shard order.
+        """
+        factories = self.read_sessions if read else self.sessions
+
+        async def run(shard: int):
+            async with factories[shard]() as session:
+                return await op(session, shard)
+
+        if shards is None:
+            shards = range(len(self.engines))
+        return await asyncio.gather(*(run(shard) for shard in shards))
+
+    async def stop(self):
+        for batcher in self.write_batchers:
+            await batcher.stop()
+
+
+shard_router: Optional[ShardRouter] = None
+if settings.database_shards > 1:
+    shard_router = ShardRouter.from_urls(
+        shard_urls(SQLALCHEMY_DATABASE_URI, settings.database_shards),
+        first=(write_engine, read_engine),
+    )
@@ -1,47 +1,523 @@
-from typing import List
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Optional, Union
 
-from fastapi import FastAPI, Depends, HTTPException, Query
+import orjson
+
+from fastapi import (
+    FastAPI,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import (
+    ORJSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from app import crud
 from app.models.models import Category
+from app.config import settings
+from app.services import (
+    change_feed,
+    export,
+    import_service,
+    maintenance,
+    snapshot,
+    warmup,
+)
+from app.services.admission import AdmissionMiddleware
+from app.services.metrics import MetricsMiddleware, TimedRoute, metrics
+from app.services.etag import entity_etag, if_none_match, list_etag
+from app.services.cache import category_cache, product_cache
+from app.services.inventory import InsufficientStock, StockError
+from app.services.pagination import (
+    InvalidCursor,
+    PageTooDeep,
+    decode_page_cursor,
+    encode_cursor,
+)
+from app.services.projection import (
+    InvalidFields,
+    parse_fields,
+    project,
+    with_fields,
+)
 from app.services.product_service import ProductService, ProductValidator
-from app.database.engine import async_session
+from app.services.search import highlight_snippet
+from app.services.sharded_product_service import (
+    ShardedProductService,
+    ShardedStatsService,
+)
+from app.services.snapshot import Table, catalog_snapshot
+from app.services.stats_service import StatsService
+from app.services.warmup import readiness
+from app.services.write_queue import write_batcher
+from app.database.engine import (
+    async_read_session,
+    async_session,
+    read_engine,
+    write_engine,
+)
+from app.database.shards import shard_router
 from app.serializers import schemas
 
+MAX_BATCH_IDS = 10000
+
+product_validator = ProductValidator()
+if shard_router is not None:
+    product_service = ShardedProductService(shard_router)
+    stats_service = ShardedStatsService(shard_router)
+else:
+    product_service = ProductService()
+    stats_service = StatsService()
+
+
+background_tasks: List[asyncio.Task] = []
+
+
+def start_change_log_compaction():
+    # Every shard's triggers fill its own change log.
+    session_factories = [async_session]
+    if shard_router is not None:
+        session_factories = shard_router.sessions
+    for session_factory in session_factories:
+        background_tasks.append(
+            asyncio.create_task(
+                change_feed.compact_periodically(
+                    session_factory,
+                    retention=settings.change_log_retention,
+                    interval=settings.change_log_compact_interval,
+                )
+            )
+        )
+
+
+def start_database_maintenance():
+    session_factories = [async_session]
+    if shard_router is not None:
+        session_factories = shard_router.sessions
+    for session_factory in session_factories:
+        background_tasks.append(
+            asyncio.create_task(
+                maintenance.maintain_periodically(
+                    session_factory,
+                    interval=settings.maintenance_interval,
+                    step_pages=settings.vacuum_step_pages,
+                )
+            )
+        )
+
+
+def start_snapshot_builder():
+    if catalog_snapshot.enabled:
+        background_tasks.append(
+            asyncio.create_task(
+                snapshot.maintain_snapshot(
+                    async_read_session,
+                    settings.snapshot_path,
+                    interval=settings.snapshot_interval,
+                )
+            )
+        )
+
+
+def start_warm_up():
+    if not settings.warmup_enabled:
+        readiness.ready = True
+        return
+    engines = [write_engine, read_engine]
+    if shard_router is not None:
+        engines = [engine for pair in shard_router.engines for engine in pair]
+
+    async def run_queries():
+        async with async_read_session() as db:
+            await warm_up_queries(db=db)
+
+    background_tasks.append(
+        asyncio.create_task(warmup.warm_up(engines, run_queries))
+    )
+
+
+async def stop_write_batcher():
+    await write_batcher.stop()
+    if shard_router is not None:
+        await shard_router.stop()
+
+
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_change_log_compaction()
+    start_database_maintenance()
+    start_snapshot_builder()
+    # Runs while the server already accepts requests; /health/ready
+    # tells the load balancer when it is done.
+    start_warm_up()
+    try:
+        yield
+    finally:
+        readiness.ready = False
+        await stop_write_batcher()
+        await stop_background_tasks()
+
+
 app = FastAPI(
     title="Product Management",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
-
-product_service = ProductService()
-product_validator = ProductValidator()
+# Set before any route is declared so every route is timed.
+app.router.route_class = TimedRoute
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware)
+# Added last so it is outermost and its timings include queueing.
+app.add_middleware(MetricsMiddleware)
 
 
 async def get_db() -> AsyncSession:
-    async with async_session() as session:
+    session_factory = async_session
+    if shard_router is not None:
+        # Shard 0 sessions know their shard, which new products need.
+        session_factory = shard_router.sessions[0]
+    async with session_factory() as session:
+        yield session
+
+
+async def get_read_db() -> AsyncSession:
+    async with async_read_session() as session:
         yield session
 
 
-@app.get("/products/", response_model=List[schemas.Product])
+def get_read_session_factory():
+    """For long-lived responses that should not hold one session throughout."""
+    return async_read_session
+
+
+def single_database():
+    """Rejects routes that read one database's change log."""
+    if shard_router is not None:
+        raise HTTPException(
+            status_code=501,
+            detail="The change feed is not available with partitioned "
+            "storage",
+        )
+
+
+def product_fields(
+    fields: Optional[str] = Query(
+        None, description="Comma-separated product fields to return"
+    )
+) -> Optional[List[str]]:
+    try:
+        return parse_fields(fields)
+    except InvalidFields as exc:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(exc.unknown) or fields!r}",
+        )
+
+
+@app.get(
+    "/products/",
+    response_model=Union[
+        List[schemas.Product],
+        List[schemas.ProductWithCategory],
+        schemas.ProductPage,
+    ],
+)
 async def read_all_products(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    order_by: str = Query("id", regex="^(id|price)$"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    expand: Optional[str] = Query(None, regex="^category$"),
+    fields: Optional[List[str]] = Depends(product_fields),
+    filters: schemas.ProductFilter = Depends(),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    offset = (page - 1) * per_page
-    products = await product_service.get_all_products(
-        db=db, offset=offset, limit=per_page
+    paged = cursor is not None or limit is not None
+    if not expand and fields is None and order_by == "id":
+        unfiltered = all(value is None for value in filters.dict().values())
+        current = catalog_snapshot.current() if unfiltered else None
+        if current is not None:
+            try:
+                return _snapshot_products(
+                    request,
+                    response,
+                    current.products,
+                    page=page,
+                    per_page=per_page,
+                    cursor=cursor,
+                    limit=limit,
+                    filters=filters,
+                )
+            except InvalidCursor:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+    # The ETag needs id and version, and expansion needs category_id.
+    columns = with_fields(
+        fields, "id", "version", *(["category_id"] if expand else [])
+    )
+    if paged:
+        try:
+            products, next_cursor = await product_service.get_products_page(
+                db=db,
+                limit=limit or per_page,
+                cursor=cursor,
+                order_by=order_by,
+                filters=filters,
+                fields=columns,
+            )
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        bounds = (order_by, cursor, limit, per_page, filters.json())
+    else:
+        offset = (page - 1) * per_page
+        try:
+            products = await product_service.get_all_products(
+                db=db,
+                offset=offset,
+                limit=per_page,
+                order_by=order_by,
+                filters=filters,
+                fields=columns,
+            )
+        except PageTooDeep as exc:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Pages beyond offset {exc.max_offset} need a cursor",
+            )
+        bounds = (order_by, offset, per_page, filters.json())
+    bounds += (expand, fields)
+    # Rows are serialized directly; response_model only documents the shape.
+    items = export.rows_to_dicts(products)
+    if expand:
+        items = await product_service.expand_categories(db=db, products=items)
+    etag = list_etag("products", bounds, _versions(items))
+    items = project(items, fields)
+    if paged:
+        return if_none_match(request, response, etag) or ORJSONResponse(
+            {"items": items, "next_cursor": next_cursor},
+            headers=response.headers,
+        )
+    return if_none_match(request, response, etag) or ORJSONResponse(
+        items, headers=response.headers
+    )
+
+
+def _snapshot_products(
+    request: Request,
+    response: Response,
+    products: Table,
+    page: int,
+    per_page: int,
+    cursor: Optional[str],
+    limit: Optional[int],
+    filters: schemas.ProductFilter,
+):
+    """An unfiltered id-ordered page, answered from the snapshot's JSON.
+
+    The bounds and ETag match what the database path would produce.
+    """
+    if cursor is None and limit is None:
+        offset = (page - 1) * per_page
+        start = min(offset, len(products))
+        stop = min(offset + per_page, len(products))
+        bounds = ("id", offset, per_page, filters.json())
+        body = products.json_array(start, stop)
+    else:
+        start = 0
+        if cursor is not None:
+            after_id, _ = decode_page_cursor(cursor, "id")
+            start = products.index_after(after_id)
+        stop = min(start + (limit or per_page), len(products))
+        next_cursor = None
+        if stop < len(products):
+            last_id = products.ids[stop - 1]
+            next_cursor = encode_cursor({"o": "id", "id": last_id})
+        bounds = ("id", cursor, limit, per_page, filters.json())
+        body = b'{"items":%s,"next_cursor":%s}' % (
+            products.json_array(start, stop),
+            orjson.dumps(next_cursor),
+        )
+    etag = list_etag(
+        "products", bounds + (None, None), products.versions_of(start, stop)
+    )
+    return if_none_match(request, response, etag) or Response(
+        body, media_type="application/json", headers=response.headers
     )
-    return products
 
 
-@app.get("/products/{product_id}", response_model=schemas.Product)
-async def read_product(product_id: int, db: AsyncSession = Depends(get_db)):
-    product = await product_service.get_product_by_id(
-        db=db, product_id=product_id
+def _snapshot_entity(
+    request: Request,
+    response: Response,
+    kind: str,
+    entity_id: int,
+    table: Table,
+) -> Optional[Response]:
+    """Answers straight from the snapshot's JSON when it has the entity."""
+    found = table.get(entity_id)
+    if found is None:
+        # Possibly created after the snapshot was taken.
+        return None
+    version, body = found
+    etag = entity_etag(kind, entity_id, version)
+    return if_none_match(request, response, etag) or Response(
+        body, media_type="application/json", headers=response.headers
     )
-    if not product:
+
+
+def _versions(items: List[dict]):
+    """(id, version) pairs for a product list's ETag, embedded ones too."""
+    for item in items:
+        yield item["id"], item["version"]
+        if item.get("category") is not None:
+            yield item["category"]["id"], item["category"]["version"]
+
+
+@app.get("/products/export")
+async def export_products(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    batch_size: int = Query(1000, ge=1, le=10000),
+    fields: Optional[List[str]] = Depends(product_fields),
+    db: AsyncSession = Depends(get_read_db),
+):
+    partitions = product_service.export_products(
+        db=db, batch_size=batch_size, fields=fields
+    )
+    if format == "csv":
+        body = export.render_csv(
+            partitions,
+            [column.key for column in crud.product_columns(fields)],
+        )
+    else:
+        body = export.render_ndjson(partitions)
+    return StreamingResponse(
+        body,
+        media_type=export.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="products.{format}"'
+        },
+    )
+
+
+@app.get("/products/search", response_model=schemas.ProductSearchPage)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    prefix: bool = True,
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        hits, next_cursor = await product_service.search_products(
+            db=db, query=q, limit=limit, cursor=cursor, prefix=prefix
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    items = export.rows_to_dicts(hits)
+    for item in items:
+        item["snippet"] = highlight_snippet(item["snippet"])
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
+
+
+@app.get("/products/batch", response_model=schemas.ProductBatch)
+async def read_products_batch(
+    ids: str = Query(..., regex=r"^\d+(,\d+)*$"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await _read_products_batch(
+        db=db, ids=[int(i) for i in ids.split(",")]
+    )
+
+
+@app.post("/products/batch", response_model=schemas.ProductBatch)
+async def read_products_batch_by_body(
+    batch: schemas.ProductBatchRequest,
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await _read_products_batch(db=db, ids=batch.ids)
+
+
+async def _read_products_batch(db: AsyncSession, ids: List[int]):
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_IDS} ids per batch",
+        )
+    products, missing = await product_service.get_products_by_ids(
+        db=db, ids=ids
+    )
+    return ORJSONResponse(
+        {
+            "products": {str(i): p for i, p in products.items()},
+            "missing": missing,
+        }
+    )
+
+
+@app.get(
+    "/products/{product_id}",
+    response_model=Union[schemas.Product, schemas.ProductWithCategory],
+)
+async def read_product(
+    product_id: int,
+    request: Request,
+    response: Response,
+    expand: Optional[str] = Query(None, regex="^category$"),
+    fields: Optional[List[str]] = Depends(product_fields),
+    db: AsyncSession = Depends(get_read_db),
+):
+    if not expand and fields is None:
+        current = catalog_snapshot.current()
+        if current is not None:
+            served = _snapshot_entity(
+                request, response, "product", product_id, current.products
+            )
+            if served is not None:
+                return served
+        product = await product_service.get_product_by_id(
+            db=db, product_id=product_id
+        )
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        etag = entity_etag("product", product.id, product.version)
+        return if_none_match(request, response, etag) or product
+    columns = with_fields(
+        fields, "id", "version", *(["category_id"] if expand else [])
+    )
+    item = await product_service.get_product_dict(
+        db=db, product_id=product_id, fields=columns
+    )
+    if item is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    if expand:
+        (item,) = await product_service.expand_categories(
+            db=db, products=[item]
+        )
+    etag = list_etag(
+        "product", (product_id, expand, fields), _versions([item])
+    )
+    return if_none_match(request, response, etag) or ORJSONResponse(
+        project([item], fields)[0], headers=response.headers
+    )
 
 
 @app.post("/products/", response_model=schemas.Product)
@@ -49,10 +525,85 @@ async def create_product(
     product: schemas.ProductCreate, db: AsyncSession = Depends(get_db)
 ):
     product_validator.validate_product_create(product)
-    db_product = await product_service.create_product(db=db, product=product)
+    with _unique_product_name():
+        db_product = await product_service.create_product(
+            db=db, product=product
+        )
     return db_product
 
 
+@contextmanager
+def _unique_product_name():
+    """Answers a write that would duplicate a product name with 409."""
+    try:
+        yield
+    except IntegrityError as exc:
+        if "products.name" not in str(exc.orig):
+            raise
+        raise HTTPException(
+            status_code=409, detail="Product name already exists"
+        )
+
+
+@app.post("/products/bulk", response_model=schemas.ProductBulkResponse)
+async def bulk_upsert_products(
+    products: List[schemas.ProductCreate], db: AsyncSession = Depends(get_db)
+):
+    response = schemas.ProductBulkResponse()
+    valid = []
+    for index, product in enumerate(products):
+        try:
+            product_validator.validate_product_create(product)
+        except HTTPException as exc:
+            response.results.append(
+                schemas.ProductBulkResult(
+                    index=index, status="error", detail=exc.detail
+                )
+            )
+            response.failed += 1
+        else:
+            valid.append((index, product))
+    written = await product_service.bulk_upsert_products(
+        db=db, products=[product for _, product in valid]
+    )
+    seen = set()
+    for index, product in valid:
+        product_id, created = written[product.name]
+        created = created and product.name not in seen
+        seen.add(product.name)
+        response.results.append(
+            schemas.ProductBulkResult(
+                index=index,
+                status="created" if created else "updated",
+                id=product_id,
+            )
+        )
+        if created:
+            response.created += 1
+        else:
+            response.updated += 1
+    response.results.sort(key=lambda result: result.index)
+    return response
+
+
+@app.post("/products/import", response_model=schemas.ProductImportReport)
+async def import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, regex="^(ndjson|csv)$"),
+    chunk_size: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+):
+    format = format or import_service.detect_format(file.filename)
+    if format is None:
+        raise HTTPException(status_code=400, detail="Unsupported file format")
+    importer = import_service.ProductImporter(
+        validator=product_validator,
+        chunk_size=chunk_size,
+        product_service=product_service,
+    )
+    return await importer.run(db=db, stream=file.file, fmt=format)
+
+
 @app.put("/products/{product_id}", response_model=schemas.Product)
 async def update_product(
     product_id: int,
@@ -60,14 +611,119 @@ async def update_product(
     db: AsyncSession = Depends(get_db),
 ):
     product_validator.validate_product_update(product)
-    db_product = await product_service.update_product(
-        db=db, product_id=product_id, product=product
-    )
+    with _unique_product_name():
+        db_product = await product_service.update_product(
+            db=db, product_id=product_id, product=product
+        )
+    if not db_product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return db_product
+
+
+@app.patch("/products/{product_id}", response_model=schemas.Product)
+async def patch_product(
+    product_id: int,
+    product: schemas.ProductPatch,
+    db: AsyncSession = Depends(get_db),
+):
+    product_validator.validate_product_update(product)
+    with _unique_product_name():
+        db_product = await product_service.patch_product(
+            db=db, product_id=product_id, product=product
+        )
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     return db_product
 
 
+@app.post("/products/reserve", response_model=schemas.CartStockLevels)
+async def reserve_cart(
+    cart: schemas.CartStockChange, db: AsyncSession = Depends(get_db)
+):
+    try:
+        items = await product_service.reserve_stock(db=db, items=cart.items)
+    except StockError as exc:
+        raise _stock_error(exc)
+    return schemas.CartStockLevels(items=items)
+
+
+@app.post("/products/release", response_model=schemas.CartStockLevels)
+async def release_cart(
+    cart: schemas.CartStockChange, db: AsyncSession = Depends(get_db)
+):
+    try:
+        items = await product_service.release_stock(db=db, items=cart.items)
+    except StockError as exc:
+        raise _stock_error(exc)
+    return schemas.CartStockLevels(items=items)
+
+
+@app.post("/products/{product_id}/reserve", response_model=schemas.StockLevel)
+async def reserve_product(
+    product_id: int,
+    change: schemas.StockChange,
+    db: AsyncSession = Depends(get_db),
+):
+    item = schemas.StockChangeItem(product_id=product_id, **change.dict())
+    try:
+        (level,) = await product_service.reserve_stock(db=db, items=[item])
+    except StockError as exc:
+        raise _stock_error(exc)
+    return level
+
+
+@app.post("/products/{product_id}/release", response_model=schemas.StockLevel)
+async def release_product(
+    product_id: int,
+    change: schemas.StockChange,
+    db: AsyncSession = Depends(get_db),
+):
+    item = schemas.StockChangeItem(product_id=product_id, **change.dict())
+    try:
+        (level,) = await product_service.release_stock(db=db, items=[item])
+    except StockError as exc:
+        raise _stock_error(exc)
+    return level
+
+
+def _stock_error(exc: StockError) -> HTTPException:
+    if isinstance(exc, InsufficientStock):
+        return HTTPException(
+            status_code=409,
+            detail={
+                "message": "Insufficient stock",
+                "product_id": exc.product_id,
+                "requested": exc.requested,
+                "available": exc.available,
+            },
+        )
+    return HTTPException(
+        status_code=404, detail=f"Product {exc.product_id} not found"
+    )
+
+
+@app.delete("/products/", response_model=schemas.ProductsDeleted)
+async def delete_products(
+    filters: schemas.ProductFilter = Depends(),
+    all_products: bool = Query(
+        False, alias="all", description="Allow deleting without filters"
+    ),
+    batch_size: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+):
+    unfiltered = all(value is None for value in filters.dict().values())
+    if unfiltered and not all_products:
+        raise HTTPException(
+            status_code=400,
+            detail="Give a filter such as category_id or created_before, "
+            "or all=true to delete every product",
+        )
+    deleted = await product_service.delete_products(
+        db=db, filters=filters, batch_size=batch_size
+    )
+    return schemas.ProductsDeleted(deleted=deleted)
+
+
 @app.delete("/products/{product_id}")
 async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
     if not await product_service.delete_product(db=db, product_id=product_id):
@@ -77,12 +733,19 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
 
 @app.get("/categories/", response_model=List[schemas.Category])
 async def get_all_categories(
-    skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_read_db),
 ):
     stmt = select(Category).offset(skip).limit(limit)
     result = await db.execute(stmt)
     categories = result.scalars().all()
-    return categories
+    etag = list_etag(
+        "categories", (skip, limit), ((c.id, c.version) for c in categories)
+    )
+    return if_none_match(request, response, etag) or categories
 
 
 @app.post("/categories", response_model=schemas.Category)
@@ -97,12 +760,35 @@ async def create_category(
 
 
 @app.get("/categories/{category_id}", response_model=schemas.Category)
-async def get_category(category_id: int, db: AsyncSession = Depends(get_db)):
+async def get_category(
+    category_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+):
+    current = catalog_snapshot.current()
+    if current is not None:
+        served = _snapshot_entity(
+            request, response, "category", category_id, current.categories
+        )
+        if served is not None:
+            return served
+    category = category_cache.get(category_id)
+    if category is None:
+        category = await _load_category(db=db, category_id=category_id)
+    etag = entity_etag("category", category.id, category.version)
+    return if_none_match(request, response, etag) or category
+
+
+async def _load_category(db: AsyncSession, category_id: int):
+    generation = category_cache.generation()
     stmt = select(Category).filter(Category.id == category_id)
     result = await db.execute(stmt)
     category = result.scalar()
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
+    category = schemas.Category.from_orm(category)
+    category_cache.set(category_id, category, generation)
     return category
 
 
@@ -120,6 +806,7 @@ async def update_category(
     db_category.name = category.name
     await db.commit()
     await db.refresh(db_category)
+    category_cache.invalidate(category_id)
     return db_category
 
 
@@ -132,6 +819,166 @@ async def delete_category(
     db_category = result.scalar()
     if not db_category:
         raise HTTPException(status_code=404, detail="Category not found")
+    product_ids = await product_service.detach_category_products(
+        db=db, category_id=category_id
+    )
     await db.delete(db_category)
     await db.commit()
+    category_cache.invalidate(category_id)
+    for product_id in product_ids:
+        product_cache.invalidate(product_id)
     return {"message": "Category deleted successfully"}
+
+
+@app.get(
+    "/categories/{category_id}/stats", response_model=schemas.CategoryStats
+)
+async def get_category_stats(
+    category_id: int, db: AsyncSession = Depends(get_read_db)
+):
+    if category_cache.get(category_id) is None:
+        await _load_category(db=db, category_id=category_id)
+    return await stats_service.get_category_stats(
+        db=db, category_id=category_id
+    )
+
+
+@app.get("/stats", response_model=schemas.CatalogStats)
+async def get_catalog_stats(db: AsyncSession = Depends(get_read_db)):
+    return await stats_service.get_catalog_stats(db=db)
+
+
+@app.get(
+    "/changes",
+    response_model=schemas.ChangePage,
+    dependencies=[Depends(single_database)],
+)
+async def read_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        changes, has_more = await change_feed.read_changes(
+            db=db, since=since, limit=limit
+        )
+    except change_feed.ChangesExpired:
+        raise _changes_expired()
+    return ORJSONResponse(
+        {
+            "changes": export.rows_to_dicts(changes),
+            "last_seq": changes[-1].seq if changes else since,
+            "has_more": has_more,
+        }
+    )
+
+
+@app.get("/changes/stream", dependencies=[Depends(single_database)])
+async def stream_changes(
+    since: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[int] = Header(None, ge=0),
+    session_factory=Depends(get_read_session_factory),
+):
+    """Server-sent events, one ``change`` event per change log entry.
+
+    Reconnecting clients resume from the Last-Event-ID header.
+    """
+    if since is None:
+        since = last_event_id or 0
+    async with session_factory() as db:
+        try:
+            await change_feed.read_changes(db=db, since=since, limit=1)
+        except change_feed.ChangesExpired:
+            raise _changes_expired()
+    return StreamingResponse(
+        change_feed.stream_changes(
+            session_factory,
+            since=since,
+            poll_interval=settings.change_feed_poll_interval,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _changes_expired() -> HTTPException:
+    return HTTPException(
+        status_code=410,
+        detail="Changes since this point were compacted; resync the "
+        "full lists and continue from the latest seq",
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        "products": product_cache.stats(),
+        "categories": category_cache.stats(),
+        "snapshot": catalog_snapshot.stats(),
+    }
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """200 once this worker has warmed up, 503 before and at shutdown."""
+    if not readiness.ready:
+        return ORJSONResponse({"status": "warming up"}, status_code=503)
+    return {"status": "ready", "warmup_seconds": readiness.warmup_seconds}
+
+
+async def warm_up_queries(db: AsyncSession):
+    """Runs each read query shape behind the routes once.
+
+    That compiles the statements into the engines' caches. The first
+    ``warmup_preload_rows`` products in id and price order are read too,
+    pulling the table and price index pages into the OS page cache.
+    """
+    rows = max(settings.warmup_preload_rows, 1)
+    products = []
+    for order_by in ("id", "price"):
+        products = await product_service.get_all_products(
+            db=db, offset=0, limit=rows, order_by=order_by
+        )
+        cursor = None
+        for _ in range(2):
+            _, cursor = await product_service.get_products_page(
+                db=db, limit=1, cursor=cursor, order_by=order_by
+            )
+    items = export.rows_to_dicts(products[:10])
+    category_id = next(
+        (p["category_id"] for p in items if p["category_id"] is not None),
+        None,
+    )
+    for filters in (
+        schemas.ProductFilter(category_id=category_id),
+        schemas.ProductFilter(in_stock=True),
+    ):
+        await product_service.get_all_products(
+            db=db, offset=0, limit=1, filters=filters
+        )
+    await product_service.search_products(db=db, query="a", limit=1)
+    ids = [p["id"] for p in items]
+    for product_id in ids[:1]:
+        await product_service.get_product_by_id(db=db, product_id=product_id)
+    await product_service.get_products_by_ids(db=db, ids=ids)
+    await product_service.expand_categories(db=db, products=items)
+    await db.execute(select(Category).offset(0).limit(100))
+    if category_id is not None:
+        await _load_category(db=db, category_id=category_id)
+        await stats_service.get_category_stats(
+            db=db, category_id=category_id
+        )
+    await stats_service.get_catalog_stats(db=db)
+    if shard_router is None:
+        try:
+            await change_feed.read_changes(db=db, since=0, limit=1)
+        except change_feed.ChangesExpired:
+            pass
@@ -3,21 +3,63 @@ from datetime import datetime
 from sqlalchemy.orm import relationship
 
 from app.database.engine import Base
-from sqlalchemy import Column, String, Integer, DateTime, Float, ForeignKey
+from sqlalchemy import (
+    Column,
+    String,
+    Integer,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    text,
+)
 
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_category_id_price", "category_id", "price"),
+        Index("ix_products_category_id_id", "category_id", "id"),
+        Index("ix_products_quantity", "quantity"),
+        Index("ix_products_created_at", "created_at"),
+        Index(
+            "ix_products_in_stock_id",
+            "id",
+            sqlite_where=text("quantity > 0"),
+        ),
+        Index(
+            "ix_products_in_stock_price_id",
+            "price",
+            "id",
+            sqlite_where=text("quantity > 0"),
+        ),
+        Index(
+            "ix_products_out_of_stock_id",
+            "id",
+            sqlite_where=text("quantity <= 0"),
+        ),
+        Index(
+            "ix_products_out_of_stock_price_id",
+            "price",
+            "id",
+            sqlite_where=text("quantity <= 0"),
+        ),
+    )
+
     id = Column(Integer, primary_key=True)
     name = Column(String(255), unique=True)
     description = Column(String(255))
     price = Column(Float)
     quantity = Column(Integer)
-    created_at = Column(DateTime, default=datetime.now())
+    created_at = Column(DateTime, default=datetime.now)
+    version = Column(Integer, nullable=False, server_default="1")
 
     category_id = Column(Integer, ForeignKey("categories.id"))
     category = relationship("Category", back_populates="products")
 
+    __mapper_args__ = {"version_id_col": version}
+
     def __repr__(self):
         return f"<Product {self.name} - {self.description}>"
 
@@ -26,8 +68,54 @@ class Category(Base):
     __tablename__ = "categories"
     id = Column(Integer, primary_key=True)
     name = Column(String(255), unique=True)
+    version = Column(Integer, nullable=False, server_default="1")
 
     products = relationship("Product", back_populates="category")
 
+    __mapper_args__ = {"version_id_col": version}
+
     def __repr__(self):
         return f"<Category {self.name}>"
+
+
+class CategoryStats(Base):
+    """Per-category aggregates kept current by triggers on products.
+
+    Products without a category are counted under category_id 0.
+    """
+
+    __tablename__ = "category_stats"
+    category_id = Column(Integer, primary_key=True, autoincrement=False)
+    product_count = Column(Integer, nullable=False)
+    total_quantity = Column(Integer, nullable=False)
+    inventory_value = Column(Float, nullable=False)
+    price_sum = Column(Float, nullable=False)
+    priced_count = Column(Integer, nullable=False)
+    min_price = Column(Float)
+    max_price = Column(Float)
+
+    def __repr__(self):
+        return f"<CategoryStats {self.category_id}>"
+
+
+class ChangeLog(Base):
+    """One row per product or category insert, update or delete.
+
+    Filled by triggers. AUTOINCREMENT keeps sequence numbers from being
+    reused once old entries are compacted away.
+    """
+
+    __tablename__ = "change_log"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String(16), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(8), nullable=False)
+    version = Column(Integer)
+    changed_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+
+    def __repr__(self):
+        return f"<ChangeLog {self.seq} {self.op} {self.entity}>"
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, conint, validator
 
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -20,14 +20,119 @@ class ProductUpdate(ProductBase):
     pass
 
 
+class ProductPatch(BaseModel):
+    """A partial update: only the fields present in the body change."""
+
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    quantity: Optional[int] = None
+    category_id: Optional[int] = None
+
+    @validator("*", pre=True)
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+
 class Product(ProductBase):
     id: int
-    created_at: Optional[datetime] = datetime.now()
+    # Deleting a category leaves its products without one.
+    category_id: Optional[int] = None
+    created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    version: Optional[int] = None
 
     class Config:
         orm_mode = True
 
 
+class ProductFilter(BaseModel):
+    category_id: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+
+class ProductPage(BaseModel):
+    items: List[Product]
+    next_cursor: Optional[str] = None
+
+
+class ProductsDeleted(BaseModel):
+    deleted: int
+
+
+class ProductBatchRequest(BaseModel):
+    ids: List[int]
+
+
+class ProductBatch(BaseModel):
+    products: Dict[int, Product]
+    missing: List[int] = []
+
+
+class StockChange(BaseModel):
+    quantity: conint(gt=0)
+
+
+class StockChangeItem(StockChange):
+    product_id: int
+
+
+class CartStockChange(BaseModel):
+    items: List[StockChangeItem]
+
+
+class StockLevel(BaseModel):
+    product_id: int
+    remaining: int
+
+
+class CartStockLevels(BaseModel):
+    items: List[StockLevel]
+
+
+class ProductSearchHit(Product):
+    score: float
+    # HTML: the text is escaped and each match wrapped in <mark>.
+    snippet: Optional[str] = None
+
+
+class ProductSearchPage(BaseModel):
+    items: List[ProductSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class ProductBulkResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class ProductBulkResponse(BaseModel):
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    results: List[ProductBulkResult] = []
+
+
+class ProductImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class ProductImportReport(BaseModel):
+    processed: int = 0
+    imported: int = 0
+    failed: int = 0
+    chunks: int = 0
+    errors: List[ProductImportError] = []
+
+
 class CategoryBase(BaseModel):
     name: str
 
@@ -42,6 +147,42 @@ class CategoryUpdate(CategoryBase):
 
 class Category(CategoryBase):
     id: int
+    version: Optional[int] = None
 
     class Config:
         orm_mode = True
+
+
+class ProductWithCategory(Product):
+    category: Optional[Category] = None
+
+
+class CategoryStats(BaseModel):
+    category_id: Optional[int]
+    product_count: int = 0
+    total_quantity: int = 0
+    inventory_value: float = 0.0
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    avg_price: Optional[float] = None
+
+
+class CatalogStats(BaseModel):
+    totals: CategoryStats
+    categories: List[CategoryStats]
+
+
+class Change(BaseModel):
+    seq: int
+    entity: str
+    entity_id: int
+    op: str
+    version: Optional[int] = None
+    changed_at: datetime
+
+
+class ChangePage(BaseModel):
+    changes: List[Change]
+    # Pass back as ``since`` to continue.
+    last_seq: int
+    has_more: bool = False
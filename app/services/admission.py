@@ -0,0 +1,182 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Iterable, Optional
+
+import orjson
+
+from app.config import settings
+from app.services.metrics import Metrics, metrics
+
+
+class Shed(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class ConcurrencyLimiter:
+    """Admits ``limit`` requests at a time and queues up to ``max_queue``.
+
+    Waiters are admitted in arrival order and give up after ``timeout``
+    seconds. A request is refused straight away when the queue is full, or
+    when the queue ahead of it would take longer than ``timeout`` to drain
+    at the recent average hold time, so it fails fast rather than late.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int,
+        timeout: float,
+        registry: Metrics = metrics,
+    ):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.registry = registry
+        self.active = 0
+        # Exponentially weighted average of how long a slot is held.
+        self.hold_time = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> float:
+        """Waits for a slot and returns the time spent waiting."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._update_gauges()
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self._shed("queue_full")
+        expected = (len(self._waiters) + 1) / self.limit * self.hold_time
+        if expected > self.timeout:
+            self._shed("expected_wait")
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self._shed("timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled.
+                self.release(self.hold_time)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._update_gauges()
+        waited = time.perf_counter() - started
+        self.registry.admission_wait_seconds.observe(waited, self.name)
+        return waited
+
+    def release(self, held: float):
+        self.hold_time = 0.9 * self.hold_time + 0.1 * held
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter.
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.active -= 1
+        self._update_gauges()
+
+    def _shed(self, reason: str):
+        self.registry.admission_shed.inc(self.name, reason)
+        raise Shed(reason)
+
+    def _update_gauges(self):
+        self.registry.admission_in_flight.set(self.active, self.name)
+        self.registry.admission_queue_depth.set(
+            len(self._waiters), self.name
+        )
+
+
+class AdmissionMiddleware:
+    """Bounds concurrent database work, shedding excess with 503.
+
+    GET and HEAD requests, plus POSTs to ``read_paths``, go through the
+    read limiter and everything else through the write limiter. Paths
+    starting with an ``exempt`` prefix, such as metrics, the readiness
+    probe and long-lived streams, are never limited.
+    """
+
+    def __init__(
+        self,
+        app,
+        read: Optional[ConcurrencyLimiter] = None,
+        write: Optional[ConcurrencyLimiter] = None,
+        retry_after: int = settings.admission_retry_after,
+        exempt: Iterable[str] = (
+            "/metrics",
+            "/health/ready",
+            "/cache/stats",
+            "/changes/stream",
+            "/docs",
+            "/redoc",
+            "/openapi.json",
+        ),
+        read_paths: Iterable[str] = ("/products/batch",),
+    ):
+        self.app = app
+        self.read = read or ConcurrencyLimiter(
+            "read",
+            limit=settings.admission_read_limit,
+            max_queue=settings.admission_read_queue,
+            timeout=settings.admission_queue_timeout,
+        )
+        self.write = write or ConcurrencyLimiter(
+            "write",
+            limit=settings.admission_write_limit,
+            max_queue=settings.admission_write_queue,
+            timeout=settings.admission_queue_timeout,
+        )
+        self.retry_after = retry_after
+        self.exempt = tuple(exempt)
+        self.read_paths = frozenset(read_paths)
+
+    def limiter_for(self, scope) -> Optional[ConcurrencyLimiter]:
+        path = scope["path"]
+        if path.startswith(self.exempt):
+            return None
+        if scope["method"] in ("GET", "HEAD") or path in self.read_paths:
+            return self.read
+        return self.write
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope["type"] == "http":
+            limiter = self.limiter_for(scope)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await limiter.acquire()
+        except Shed:
+            await self._send_overloaded(send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started)
+
+    async def _send_overloaded(self, send):
+        body = orjson.dumps({"detail": "Server overloaded, retry later"})
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from app.config import settings
+
+
+class LRUCache:
+    """A bounded least-recently-used cache whose entries expire after ttl.
+
+    Invalidation is local to the process, so with several workers the ttl
+    bounds how long another worker's write can go unnoticed.
+
+    A read that fills the cache takes a ``generation()`` before it queries
+    and passes it to ``set``, which then drops the value if the key was
+    invalidated meanwhile: the read may predate that write.
+    """
+
+    def __init__(self, max_size: int, ttl: float, enabled: bool = True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._generation = 0
+        # When each recently invalidated key was last invalidated, oldest
+        # first. Reads that started before a forgotten one cannot set.
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._forgotten = -1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def generation(self) -> int:
+        return self._generation
+
+    def set(
+        self, key: Hashable, value: Any, generation: Optional[int] = None
+    ):
+        if not self.enabled:
+            return
+        if generation is not None and (
+            generation <= self._forgotten
+            or self._invalidated.get(key, -1) >= generation
+        ):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._invalidated[key] = self._generation
+        self._invalidated.move_to_end(key)
+        self._generation += 1
+        while len(self._invalidated) > self.max_size:
+            _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self._invalidated.clear()
+        self._forgotten = self._generation
+        self._generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+product_cache = LRUCache(
+    max_size=settings.cache_max_size,
+    ttl=settings.cache_ttl,
+    enabled=settings.cache_enabled,
+)
+category_cache = LRUCache(
+    max_size=settings.cache_max_size,
+    ttl=settings.cache_ttl,
+    enabled=settings.cache_enabled,
+)
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Tuple
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import crud
+
+logger = logging.getLogger(__name__)
+
+
+class ChangesExpired(Exception):
+    """The entries after ``since`` have been compacted away."""
+
+
+class ChangeNotifier:
+    """Wakes change streams whenever a session in this process commits."""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    def waiter(self) -> asyncio.Event:
+        """An event set by the next commit; take it before reading."""
+        return self._event
+
+
+change_notifier = ChangeNotifier()
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_commit(session):
+    change_notifier.notify()
+
+
+async def read_changes(
+    db: AsyncSession, since: int, limit: int
+) -> Tuple[List[Row], bool]:
+    """Returns up to ``limit`` entries after ``since`` and whether more exist.
+
+    Raises ChangesExpired when entries the caller has not seen were
+    compacted, in which case it has to resync from the full lists.
+    """
+    changes = await crud.get_changes(db=db, since=since, limit=limit + 1)
+    # A contiguous start proves nothing was skipped.
+    if not changes or changes[0].seq != since + 1:
+        oldest, last = await crud.get_change_log_bounds(db=db)
+        if since < (last if oldest is None else oldest - 1):
+            raise ChangesExpired(since)
+    return changes[:limit], len(changes) > limit
+
+
+def format_event(change: Row) -> bytes:
+    return b"id: %d\nevent: change\ndata: %s\n\n" % (
+        change.seq,
+        orjson.dumps(change._asdict()),
+    )
+
+
+async def stream_changes(
+    session_factory,
+    since: int,
+    poll_interval: float,
+    batch_size: int = 500,
+) -> AsyncIterator[bytes]:
+    """Yields server-sent events for change log entries as they commit.
+
+    Commits in this process wake the stream immediately. Writes from other
+    processes are picked up by polling every ``poll_interval`` seconds, and
+    each idle poll also sends a keep-alive comment. A session is only held
+    while reading, not for the life of the stream.
+    """
+    while True:
+        waiter = change_notifier.waiter()
+        try:
+            async with session_factory() as db:
+                changes, has_more = await read_changes(db, since, batch_size)
+        except ChangesExpired:
+            yield b"event: expired\ndata: {}\n\n"
+            return
+        if changes:
+            yield b"".join(format_event(change) for change in changes)
+            since = changes[-1].seq
+        if has_more:
+            continue
+        try:
+            await asyncio.wait_for(waiter.wait(), poll_interval)
+        except asyncio.TimeoutError:
+            yield b": keep-alive\n\n"
+
+
+async def compact_periodically(
+    session_factory, retention: float, interval: float
+):
+    """Deletes entries older than ``retention`` seconds every ``interval``."""
+    while True:
+        await asyncio.sleep(interval)
+        before = datetime.utcnow() - timedelta(seconds=retention)
+        try:
+            async with session_factory() as db:
+                removed = await crud.compact_changes(db=db, before=before)
+                await db.commit()
+        except Exception:
+            logger.exception("Change log compaction failed")
+            continue
+        if removed:
+            logger.info("Compacted %d change log entries", removed)
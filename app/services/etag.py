@@ -0,0 +1,39 @@
+import hashlib
+from typing import Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+
+
+def entity_etag(kind: str, entity_id: int, version: Optional[int]):
+    if version is None:
+        return None
+    return f'"{kind}-{entity_id}-{version}"'
+
+
+def list_etag(
+    kind: str, bounds: tuple, rows: Iterable[Tuple[int, Optional[int]]]
+) -> Optional[str]:
+    digest = hashlib.sha1(repr((kind, bounds)).encode())
+    for entity_id, version in rows:
+        if version is None:
+            return None
+        digest.update(b"%d:%d;" % (entity_id, version))
+    return f'"{kind}-list-{digest.hexdigest()}"'
+
+
+def if_none_match(
+    request: Request, response: Response, etag: Optional[str]
+) -> Optional[Response]:
+    """Returns a 304 response when the client already holds ``etag``.
+
+    Otherwise the ETag header is set on ``response`` and None is returned.
+    """
+    if etag is None:
+        return None
+    header = request.headers.get("if-none-match")
+    if header:
+        tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
@@ -0,0 +1,46 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Sequence
+
+import orjson
+from sqlalchemy.engine import Row
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def rows_to_dicts(rows: Sequence[Row]) -> list:
+    return [row._asdict() for row in rows]
+
+
+async def render_ndjson(
+    partitions: AsyncIterator[Sequence[Row]],
+) -> AsyncIterator[bytes]:
+    async for rows in partitions:
+        yield b"".join(
+            orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE)
+            for row in rows
+        )
+
+
+async def render_csv(
+    partitions: AsyncIterator[Sequence[Row]], columns: Sequence[str]
+) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    async for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ]
+            for row in rows
+        )
+        yield buffer.getvalue()
@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+import logging
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.serializers import schemas
+from app.services.product_service import ProductService, ProductValidator
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    if filename:
+        extension = filename.rsplit(".", 1)[-1].lower()
+        if extension in ("ndjson", "jsonl"):
+            return "ndjson"
+        if extension == "csv":
+            return "csv"
+    return None
+
+
+class ProductImporter:
+    def __init__(
+        self,
+        validator: ProductValidator,
+        chunk_size: int = 1000,
+        max_errors: int = 100,
+        product_service: Optional[ProductService] = None,
+    ):
+        self.validator = validator
+        self.product_service = product_service or ProductService()
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+    async def run(
+        self, db: AsyncSession, stream: IO[bytes], fmt: str
+    ) -> schemas.ProductImportReport:
+        report = schemas.ProductImportReport()
+        categories = await crud.get_category_ids_by_name(db=db)
+        category_ids = set(categories.values())
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        chunk: List[dict] = []
+        try:
+            for line, record in self._records(text, fmt):
+                report.processed += 1
+                try:
+                    row = self._validate(record, categories, category_ids)
+                except ValueError as exc:
+                    self._fail(report, line, str(exc))
+                    continue
+                chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    await self._flush(db, chunk, report)
+                    chunk = []
+        except UnicodeDecodeError:
+            self._fail(report, report.processed + 1, "File is not valid UTF-8")
+        finally:
+            # Leave the upload's file open for its owner to close.
+            text.detach()
+        if chunk:
+            await self._flush(db, chunk, report)
+        return report
+
+    def _records(
+        self, text: IO[str], fmt: str
+    ) -> Iterator[Tuple[int, Optional[dict]]]:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for record in reader:
+                yield reader.line_num, record
+            return
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            try:
+                yield line, json.loads(raw)
+            except ValueError:
+                yield line, None
+
+    def _validate(
+        self,
+        record: Optional[dict],
+        categories: Dict[str, int],
+        category_ids: set,
+    ) -> dict:
+        if not isinstance(record, dict):
+            raise ValueError("Expected a JSON object")
+        category = record.pop("category", None)
+        category_id = record.get("category_id")
+        if isinstance(category_id, str):
+            category_id = category_id.strip()
+            if category_id and not category_id.isdigit():
+                category, category_id = category_id, None
+        if not category_id and category:
+            if category not in categories:
+                raise ValueError(f"Unknown category {category!r}")
+            record["category_id"] = categories[category]
+        try:
+            product = schemas.ProductCreate(**record)
+        except ValidationError as exc:
+            raise ValueError(
+                "; ".join(
+                    f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                    for error in exc.errors()
+                )
+            )
+        if product.category_id not in category_ids:
+            raise ValueError(f"Unknown category {product.category_id}")
+        try:
+            self.validator.validate_product_create(product)
+        except HTTPException as exc:
+            raise ValueError(exc.detail)
+        return product.dict()
+
+    async def _flush(
+        self,
+        db: AsyncSession,
+        chunk: List[dict],
+        report: schemas.ProductImportReport,
+    ):
+        await self.product_service.upsert_rows(db=db, rows=chunk)
+        report.imported += len(chunk)
+        report.chunks += 1
+        logger.info(
+            "Imported chunk %d (%d rows processed, %d failed)",
+            report.chunks,
+            report.processed,
+            report.failed,
+        )
+
+    def _fail(
+        self, report: schemas.ProductImportReport, line: int, detail: str
+    ):
+        report.failed += 1
+        if len(report.errors) < self.max_errors:
+            report.errors.append(
+                schemas.ProductImportError(line=line, detail=detail)
+            )
@@ -0,0 +1,20 @@
+from typing import Optional
+
+
+class StockError(Exception):
+    def __init__(self, product_id: int):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+
+class UnknownProduct(StockError):
+    pass
+
+
+class InsufficientStock(StockError):
+    def __init__(
+        self, product_id: int, requested: int, available: Optional[int]
+    ):
+        super().__init__(product_id)
+        self.requested = requested
+        self.available = available
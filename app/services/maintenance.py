@@ -0,0 +1,42 @@
+import asyncio
+import logging
+
+from app import crud
+
+logger = logging.getLogger(__name__)
+
+
+async def reclaim_free_pages(session_factory, step_pages: int) -> int:
+    """Shrinks the database file by the pages bulk deletes left free.
+
+    Each step of ``step_pages`` pages commits on its own, so the writer
+    lock is never held for long. Returns the pages reclaimed.
+    """
+    reclaimed = 0
+    while True:
+        async with session_factory() as db:
+            freed = await crud.incremental_vacuum(db=db, pages=step_pages)
+            await db.commit()
+        reclaimed += freed
+        if freed < step_pages:
+            return reclaimed
+        # Let queued writers in between steps.
+        await asyncio.sleep(0)
+
+
+async def maintain_periodically(
+    session_factory, interval: float, step_pages: int
+):
+    """Reclaims free pages and runs PRAGMA optimize every ``interval``."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            reclaimed = await reclaim_free_pages(session_factory, step_pages)
+            async with session_factory() as db:
+                await crud.optimize(db=db)
+                await db.commit()
+        except Exception:
+            logger.exception("Database maintenance failed")
+            continue
+        if reclaimed:
+            logger.info("Reclaimed %d free database pages", reclaimed)
@@ -0,0 +1,428 @@
+import asyncio
+import bisect
+import functools
+import logging
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+@dataclass
+class RequestTimings:
+    """What one request spent, filled in as it runs."""
+
+    statements: int = 0
+    db: float = 0.0
+    handler: float = 0.0
+    serialize: float = 0.0
+
+    def server_timing(self, total: float) -> str:
+        return ", ".join(
+            [
+                f"db;dur={self.db * 1e3:.2f}"
+                f';desc="{self.statements} queries"',
+                f"handler;dur={self.handler * 1e3:.2f}",
+                f"serialize;dur={self.serialize * 1e3:.2f}",
+                f"total;dur={total * 1e3:.2f}",
+            ]
+        )
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "current_timings", default=None
+)
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label set."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Tuple[str, ...],
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> (bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [
+                [0] * len(self.buckets),
+                0.0,
+                0,
+            ]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def clear(self):
+        self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for label_values, (counts, total, count) in sorted(
+            self._series.items()
+        ):
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(
+                    self.labels + ("le",), label_values + (f"{bound:g}",)
+                )
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(
+                self.labels + ("le",), label_values + ("+Inf",)
+            )
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self._values[label_values] = (
+            self._values.get(label_values, 0) + amount
+        )
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def clear(self):
+        self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+        ]
+        for label_values, value in sorted(self._values.items()):
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}{labels} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, *label_values: str):
+        self._values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    )
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metrics:
+    def __init__(self):
+        route = ("method", "route")
+        self.requests = Counter(
+            "http_requests_total",
+            "Requests by route and status.",
+            route + ("status",),
+        )
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds",
+            "Wall time from request to the end of the response.",
+            route,
+        )
+        self.request_db_seconds = Histogram(
+            "http_request_db_seconds",
+            "Time spent executing SQL per request.",
+            route,
+        )
+        self.request_handler_seconds = Histogram(
+            "http_request_handler_seconds",
+            "Time spent in the endpoint function per request.",
+            route,
+        )
+        self.request_serialize_seconds = Histogram(
+            "http_request_serialize_seconds",
+            "Time spent validating and encoding the response per request.",
+            route,
+        )
+        self.request_statements = Histogram(
+            "http_request_sql_statements",
+            "SQL statements executed per request.",
+            route,
+            buckets=COUNT_BUCKETS,
+        )
+        self.statement_limit_exceeded = Counter(
+            "http_request_sql_statement_limit_exceeded_total",
+            "Requests that ran more SQL statements than the warning limit.",
+            route,
+        )
+        self.statement_seconds = Histogram(
+            "db_statement_duration_seconds",
+            "Execution time per SQL statement.",
+            ("statement",),
+        )
+        self.admission_in_flight = Gauge(
+            "admission_in_flight",
+            "Requests currently admitted, per pool.",
+            ("pool",),
+        )
+        self.admission_queue_depth = Gauge(
+            "admission_queue_depth",
+            "Requests waiting for admission, per pool.",
+            ("pool",),
+        )
+        self.admission_wait_seconds = Histogram(
+            "admission_wait_seconds",
+            "Time admitted requests spent waiting in the queue.",
+            ("pool",),
+        )
+        self.admission_shed = Counter(
+            "admission_shed_total",
+            "Requests rejected with 503, by pool and reason.",
+            ("pool", "reason"),
+        )
+        self.warmup_seconds = Gauge(
+            "warmup_duration_seconds",
+            "How long this process took to warm up at start-up.",
+            (),
+        )
+
+    def collectors(self):
+        return (
+            self.requests,
+            self.request_seconds,
+            self.request_db_seconds,
+            self.request_handler_seconds,
+            self.request_serialize_seconds,
+            self.request_statements,
+            self.statement_limit_exceeded,
+            self.statement_seconds,
+            self.admission_in_flight,
+            self.admission_queue_depth,
+            self.admission_wait_seconds,
+            self.admission_shed,
+            self.warmup_seconds,
+        )
+
+    def clear(self):
+        for collector in self.collectors():
+            collector.clear()
+
+    def render(self) -> str:
+        lines = []
+        for collector in self.collectors():
+            lines.extend(collector.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_label(statement: str, max_length: int = 200) -> str:
+    """Collapses a statement so its variants share one metric series."""
+    label = _SPACES.sub(" ", statement).strip()
+    # Expanded IN lists would otherwise get a series per list length.
+    label = _IN_LIST.sub("(?)", label)
+    return label[:max_length]
+
+
+def instrument_engine(sync_engine, registry: Metrics = metrics):
+    """Times every statement the engine runs and charges it to the request."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        registry.statement_seconds.observe(
+            elapsed, statement_label(statement)
+        )
+        timings = current_timings.get()
+        if timings is not None:
+            timings.statements += 1
+            timings.db += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def drop_timer(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+class TimedRoute(APIRoute):
+    """Splits a route's time into the endpoint and everything around it.
+
+    ``handler`` is the endpoint function. ``serialize`` is the rest of the
+    route: request parsing, dependencies, and response validation and
+    encoding. Endpoints that build their own response encode it inside
+    ``handler``.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+
+            @functools.wraps(call)
+            async def timed_call(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    timings = current_timings.get()
+                    if timings is not None:
+                        timings.handler += time.perf_counter() - started
+
+            self.dependant.call = timed_call
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            timings = current_timings.get()
+            if timings is None:
+                return await handler(request)
+            started = time.perf_counter()
+            handler_before = timings.handler
+            try:
+                return await handler(request)
+            finally:
+                elapsed = time.perf_counter() - started
+                timings.serialize += elapsed - (
+                    timings.handler - handler_before
+                )
+
+        return timed_handler
+
+
+class MetricsMiddleware:
+    """Records per-request SQL, handler and serialization time.
+
+    The totals go out in a ``Server-Timing`` header and into the route
+    histograms served at ``/metrics``. Requests that run more than
+    ``statement_limit`` statements are logged, which is how N+1 query
+    patterns show up.
+    """
+
+    def __init__(
+        self,
+        app,
+        registry: Metrics = metrics,
+        statement_limit: int = settings.metrics_statement_limit,
+    ):
+        self.app = app
+        self.registry = registry
+        self.statement_limit = statement_limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    timings.server_timing(time.perf_counter() - started),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_timings.reset(token)
+            self._record(scope, status, time.perf_counter() - started, timings)
+
+    def _record(self, scope, status, elapsed, timings):
+        route = scope.get("route")
+        labels = (scope["method"], route.path if route else "unmatched")
+        registry = self.registry
+        registry.requests.inc(*labels, str(status))
+        registry.request_seconds.observe(elapsed, *labels)
+        registry.request_db_seconds.observe(timings.db, *labels)
+        registry.request_handler_seconds.observe(timings.handler, *labels)
+        registry.request_serialize_seconds.observe(timings.serialize, *labels)
+        registry.request_statements.observe(timings.statements, *labels)
+        if self.statement_limit and timings.statements > self.statement_limit:
+            registry.statement_limit_exceeded.inc(*labels)
+            logger.warning(
+                "%s %s ran %d SQL statements (limit %d)",
+                scope["method"],
+                scope["path"],
+                timings.statements,
+                self.statement_limit,
+            )
@@ -0,0 +1,51 @@
+import base64
+import binascii
+import json
+from typing import Any, Dict, Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class PageTooDeep(ValueError):
+    """An offset page too deep to serve; cursors reach it instead."""
+
+    def __init__(self, max_offset: int):
+        super().__init__(max_offset)
+        self.max_offset = max_offset
+
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(payload, dict):
+        raise InvalidCursor(cursor)
+    return payload
+
+
+def decode_page_cursor(
+    cursor: str, order_by: str
+) -> Tuple[int, Optional[float]]:
+    """The id and price a product list cursor resumes after.
+
+    Raises InvalidCursor unless the cursor is for ``order_by`` and holds
+    an integer id and a numeric or null price.
+    """
+    position = decode_cursor(cursor)
+    after_id, after_price = position.get("id"), position.get("price")
+    if (
+        position.get("o") != order_by
+        or type(after_id) is not int
+        or type(after_price) not in (int, float, type(None))
+    ):
+        raise InvalidCursor(cursor)
+    return after_id, after_price
@@ -1,49 +1,355 @@
-from typing import List, Optional
+import asyncio
+from typing import (
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from fastapi import HTTPException
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud
-from app.models.models import Product
 from app.serializers import schemas
+from app.services.cache import category_cache, product_cache
+from app.services.pagination import (
+    InvalidCursor,
+    decode_cursor,
+    decode_page_cursor,
+    encode_cursor,
+)
+from app.services.projection import with_fields
+from app.services.search import to_match_expression
 
 
 class ProductService:
     async def get_all_products(
-        self, db: AsyncSession, offset: int, limit: int, order_by: str = "id"
-    ) -> List[schemas.Product]:
+        self,
+        db: AsyncSession,
+        offset: int,
+        limit: int,
+        order_by: str = "id",
+        filters: Optional[schemas.ProductFilter] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Row]:
         if order_by == "price":
             return await crud.get_all_products_sorted_by_price(
-                db=db, offset=offset, limit=limit
+                db=db,
+                offset=offset,
+                limit=limit,
+                filters=filters,
+                fields=fields,
             )
         else:
             return await crud.get_all_products(
-                db=db, offset=offset, limit=limit
+                db=db,
+                offset=offset,
+                limit=limit,
+                filters=filters,
+                fields=fields,
             )
 
+    async def get_products_page(
+        self,
+        db: AsyncSession,
+        limit: int,
+        cursor: Optional[str] = None,
+        order_by: str = "id",
+        filters: Optional[schemas.ProductFilter] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[List[Row], Optional[str]]:
+        after_id = after_price = None
+        if cursor is not None:
+            after_id, after_price = decode_page_cursor(cursor, order_by)
+        # One extra row tells us whether another page exists.
+        products = await self._products_after(
+            db=db,
+            limit=limit + 1,
+            after_id=after_id,
+            after_price=after_price,
+            order_by=order_by,
+            filters=filters,
+            # The cursor is built from the last row's sort key.
+            fields=with_fields(fields, "id", order_by),
+        )
+        if len(products) <= limit:
+            return products, None
+        products = products[:limit]
+        last = products[-1]
+        position = {"o": order_by, "id": last.id}
+        if order_by == "price":
+            position["price"] = last.price
+        return products, encode_cursor(position)
+
+    async def search_products(
+        self,
+        db: AsyncSession,
+        query: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        prefix: bool = True,
+    ) -> Tuple[List[Row], Optional[str]]:
+        match = to_match_expression(query, prefix=prefix)
+        if match is None:
+            return [], None
+        after_score = after_id = None
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            after_score, after_id = position.get("score"), position.get("id")
+            if (
+                position.get("o") != "search"
+                or position.get("q") != match
+                or type(after_score) not in (int, float)
+                or type(after_id) is not int
+            ):
+                raise InvalidCursor(cursor)
+        hits = await self._search_hits(
+            db=db,
+            match=match,
+            limit=limit + 1,
+            after_score=after_score,
+            after_id=after_id,
+        )
+        if len(hits) <= limit:
+            return hits, None
+        hits = hits[:limit]
+        position = {
+            "o": "search",
+            "q": match,
+            "score": hits[-1].score,
+            "id": hits[-1].id,
+        }
+        return hits, encode_cursor(position)
+
+    async def _products_after(self, db: AsyncSession, **query) -> List[Row]:
+        return await crud.get_products_after(db=db, **query)
+
+    async def _search_hits(self, db: AsyncSession, **query) -> List[Row]:
+        return await crud.search_products(db=db, **query)
+
+    def export_products(
+        self,
+        db: AsyncSession,
+        batch_size: int = 1000,
+        fields: Optional[List[str]] = None,
+    ) -> AsyncIterator[Sequence[Row]]:
+        return crud.stream_products(
+            db=db, batch_size=batch_size, fields=fields
+        )
+
     async def get_product_by_id(
         self, db: AsyncSession, product_id: int
     ) -> Optional[schemas.Product]:
-        return await crud.get_product_by_id(db=db, product_id=product_id)
+        product = product_cache.get(product_id)
+        if product is not None:
+            return product
+        generation = product_cache.generation()
+        product = await crud.get_product_by_id(db=db, product_id=product_id)
+        if product is not None:
+            product = schemas.Product.from_orm(product)
+            product_cache.set(product_id, product, generation)
+        return product
+
+    async def get_product_dict(
+        self,
+        db: AsyncSession,
+        product_id: int,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[dict]:
+        """A product as a dict, selecting only ``fields`` on a cache miss."""
+        if fields is None:
+            product = await self.get_product_by_id(
+                db=db, product_id=product_id
+            )
+            return None if product is None else product.dict()
+        product = product_cache.get(product_id)
+        if product is not None:
+            return product.dict()
+        row = await crud.get_product_row(
+            db=db, product_id=product_id, fields=fields
+        )
+        return None if row is None else row._asdict()
+
+    async def get_products_by_ids(
+        self, db: AsyncSession, ids: Sequence[int]
+    ) -> Tuple[Dict[int, dict], List[int]]:
+        """Looks up many products at once, cache first.
+
+        Returns the products found keyed by id, in request order, and the
+        ids that matched nothing.
+        """
+        ids = list(dict.fromkeys(ids))
+        found = {}
+        for product_id in ids:
+            product = product_cache.get(product_id)
+            if product is not None:
+                found[product_id] = product.dict()
+        generation = product_cache.generation()
+        rows = await self._rows_by_ids(
+            db=db, ids=[i for i in ids if i not in found]
+        )
+        for product_id, row in rows.items():
+            found[product_id] = row._asdict()
+            if product_cache.enabled:
+                product_cache.set(
+                    product_id,
+                    schemas.Product(**found[product_id]),
+                    generation,
+                )
+        products = {i: found[i] for i in ids if i in found}
+        return products, [i for i in ids if i not in found]
+
+    async def _rows_by_ids(
+        self, db: AsyncSession, ids: List[int]
+    ) -> Dict[int, Row]:
+        return await crud.get_products_by_ids(db=db, ids=ids)
+
+    async def expand_categories(
+        self, db: AsyncSession, products: List[dict]
+    ) -> List[dict]:
+        """Embeds each product's category, fetching the uncached ones at once.
+
+        ``products`` are dicts as produced by ``rows_to_dicts`` and are
+        updated in place.
+        """
+        categories = {}
+        missing = []
+        for category_id in {p["category_id"] for p in products}:
+            if category_id is None:
+                continue
+            category = category_cache.get(category_id)
+            if category is not None:
+                categories[category_id] = category.dict()
+            else:
+                missing.append(category_id)
+        if missing:
+            generation = category_cache.generation()
+            rows = await crud.get_categories_by_ids(db=db, ids=missing)
+            for category_id, row in rows.items():
+                categories[category_id] = row._asdict()
+                category_cache.set(
+                    category_id,
+                    schemas.Category(**categories[category_id]),
+                    generation,
+                )
+        for product in products:
+            product["category"] = categories.get(product["category_id"])
+        return products
 
     async def create_product(
         self, db: AsyncSession, product: schemas.ProductCreate
     ) -> schemas.Product:
         return await crud.create_product(db=db, product=product)
 
+    async def bulk_upsert_products(
+        self, db: AsyncSession, products: List[schemas.ProductCreate]
+    ) -> Dict[str, Tuple[int, bool]]:
+        if not products:
+            return {}
+        # Later rows win when the same name appears twice in one batch.
+        rows = list({p.name: p.dict() for p in products}.values())
+        return await self.upsert_rows(db=db, rows=rows)
+
+    async def upsert_rows(
+        self, db: AsyncSession, rows: List[dict]
+    ) -> Dict[str, Tuple[int, bool]]:
+        """Inserts or updates product dicts by name and commits."""
+        results = await crud.upsert_products(db=db, rows=rows)
+        await db.commit()
+        for product_id, _ in results.values():
+            product_cache.invalidate(product_id)
+        return results
+
     async def update_product(
         self, db: AsyncSession, product_id: int, product: schemas.ProductUpdate
-    ) -> Optional[schemas.Product]:
+    ) -> Optional[Row]:
         return await crud.update_product(
             db=db, product_id=product_id, product=product
         )
 
+    async def patch_product(
+        self, db: AsyncSession, product_id: int, product: schemas.ProductPatch
+    ) -> Optional[Row]:
+        values = product.dict(exclude_unset=True)
+        if not values:
+            # Nothing to change, so leave the version (and ETags) alone.
+            return await self.get_product_by_id(db=db, product_id=product_id)
+        return await crud.patch_product(
+            db=db, product_id=product_id, values=values
+        )
+
+    async def reserve_stock(
+        self, db: AsyncSession, items: List[schemas.StockChangeItem]
+    ) -> List[schemas.StockLevel]:
+        remaining = await crud.reserve_stock(db=db, items=_merge(items))
+        return _stock_levels(remaining)
+
+    async def release_stock(
+        self, db: AsyncSession, items: List[schemas.StockChangeItem]
+    ) -> List[schemas.StockLevel]:
+        remaining = await crud.release_stock(db=db, items=_merge(items))
+        return _stock_levels(remaining)
+
     async def delete_product(self, db: AsyncSession, product_id: int) -> bool:
         return await crud.delete_product(db=db, product_id=product_id)
 
-    async def delete_all_products(self, db: AsyncSession):
-        await db.query(Product).delete()
-        await db.commit()
+    async def detach_category_products(
+        self, db: AsyncSession, category_id: int
+    ) -> List[int]:
+        """Moves a category's products to no category.
+
+        Returns the ids of the products moved. The caller commits ``db``
+        and then invalidates their cache entries.
+        """
+        return await crud.detach_category_products(
+            db=db, category_id=category_id
+        )
+
+    async def delete_products(
+        self,
+        db: AsyncSession,
+        filters: Optional[schemas.ProductFilter] = None,
+        batch_size: int = 1000,
+    ) -> int:
+        """Deletes every product matching ``filters`` and returns the count.
+
+        Each batch of ``batch_size`` is a transaction of its own, so other
+        writers get the lock in between and readers never wait on one
+        huge transaction.
+        """
+        deleted = 0
+        while True:
+            product_ids = await crud.delete_products(
+                db=db, filters=filters, limit=batch_size
+            )
+            deleted += len(product_ids)
+            if len(product_ids) < batch_size:
+                return deleted
+            await asyncio.sleep(0)
+
+    async def delete_all_products(self, db: AsyncSession) -> int:
+        return await self.delete_products(db=db)
+
+
+def _merge(items: List[schemas.StockChangeItem]) -> Dict[int, int]:
+    """Adds up the quantities of cart lines for the same product."""
+    merged: Dict[int, int] = {}
+    for item in items:
+        merged[item.product_id] = (
+            merged.get(item.product_id, 0) + item.quantity
+        )
+    return merged
+
+
+def _stock_levels(remaining: Dict[int, int]) -> List[schemas.StockLevel]:
+    return [
+        schemas.StockLevel(product_id=product_id, remaining=quantity)
+        for product_id, quantity in sorted(remaining.items())
+    ]
 
 
 class ProductValidator:
@@ -51,6 +357,8 @@ class ProductValidator:
         if product.price <= 0:
             raise HTTPException(status_code=400, detail="Invalid price")
 
-    def validate_product_update(self, product: schemas.ProductUpdate):
-        if product.price and product.price <= 0:
+    def validate_product_update(
+        self, product: Union[schemas.ProductUpdate, schemas.ProductPatch]
+    ):
+        if product.price is not None and product.price <= 0:
             raise HTTPException(status_code=400, detail="Invalid price")
@@ -0,0 +1,40 @@
+from typing import List, Optional, Sequence
+
+from app.crud import PRODUCT_FIELDS
+
+
+class InvalidFields(ValueError):
+    def __init__(self, unknown: Sequence[str]):
+        super().__init__(unknown)
+        self.unknown = list(unknown)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parses a ``fields=id,name,price`` parameter; None means every field."""
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(n.strip() for n in fields.split(",")))
+    names = [name for name in names if name]
+    unknown = [name for name in names if name not in PRODUCT_FIELDS]
+    if unknown or not names:
+        raise InvalidFields(unknown)
+    return names
+
+
+def with_fields(
+    fields: Optional[List[str]], *required: str
+) -> Optional[List[str]]:
+    """``fields`` plus the columns needed internally, such as for ETags."""
+    if fields is None:
+        return None
+    return fields + [name for name in required if name not in fields]
+
+
+def project(items: List[dict], fields: Optional[List[str]]) -> List[dict]:
+    """Trims items to ``fields``, keeping any embedded category."""
+    if fields is None:
+        return items
+    keep = list(fields)
+    if items and "category" in items[0]:
+        keep.append("category")
+    return [{name: item[name] for name in keep} for item in items]
@@ -0,0 +1,35 @@
+import html
+import re
+from typing import Optional
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+# Private-use characters around each match in a raw snippet, so the text
+# can be escaped before they become <mark> tags.
+HIGHLIGHT = ("\ue000", "\ue001")
+
+
+def to_match_expression(query: str, prefix: bool = True) -> Optional[str]:
+    """Turns free text into an FTS5 MATCH expression.
+
+    Every word must match; the last one also matches as a prefix so
+    results update while the user is still typing. Words are quoted, so
+    FTS5 operators in the input are treated as plain text.
+    """
+    tokens = _TOKEN.findall(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if prefix:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def highlight_snippet(snippet: Optional[str]) -> Optional[str]:
+    """Escapes a raw snippet as HTML and marks its matches with <mark>."""
+    if snippet is None:
+        return None
+    return (
+        html.escape(snippet)
+        .replace(HIGHLIGHT[0], "<mark>")
+        .replace(HIGHLIGHT[1], "</mark>")
+    )
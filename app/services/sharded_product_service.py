@@ -0,0 +1,394 @@
+import asyncio
+import heapq
+import logging
+from collections import namedtuple
+from contextlib import AsyncExitStack
+from itertools import islice
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.config import settings
+from app.database.shards import ShardRouter
+from app.serializers import schemas
+from app.services.inventory import StockError
+from app.services.pagination import PageTooDeep
+from app.services.product_service import (
+    ProductService,
+    _merge,
+    _stock_levels,
+)
+from app.services.projection import with_fields
+from app.services.stats_service import StatsService, _to_schema
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS: Dict[str, Callable] = {
+    "id": lambda row: row.id,
+    # SQLite sorts NULL prices first.
+    "price": lambda row: (row.price is not None, row.price or 0.0, row.id),
+    "search": lambda row: (row.score, row.id),
+}
+
+
+def _merged(shards: List[List[Row]], order: str, limit: int) -> List[Row]:
+    """The first ``limit`` rows of per-shard results sorted by ``order``."""
+    return list(islice(heapq.merge(*shards, key=SORT_KEYS[order]), limit))
+
+
+async def _rows(partitions: AsyncIterator[Sequence[Row]]):
+    async for rows in partitions:
+        for row in rows:
+            yield row
+
+
+async def _merge_streams(streams: List[AsyncIterator[Row]], key: Callable):
+    """Merges async row iterators that are each already sorted by ``key``."""
+    heap = []
+
+    async def advance(index: int):
+        try:
+            row = await streams[index].__anext__()
+        except StopAsyncIteration:
+            return
+        heapq.heappush(heap, (key(row), index, row))
+
+    for index in range(len(streams)):
+        await advance(index)
+    while heap:
+        _, index, row = heapq.heappop(heap)
+        yield row
+        await advance(index)
+
+
+class ShardedProductService(ProductService):
+    """ProductService over products spread across a router's shards.
+
+    Point reads and writes open a session on the product's shard. Lists,
+    exports, searches and batch lookups query the shards concurrently and
+    merge their results in the requested order. The ``db`` each method
+    takes is a shard 0 session and is still used for categories.
+
+    Offset pages stop at ``max_offset`` rows in, since every shard would
+    have to read down to the offset; cursor pages go any depth.
+
+    Search scores come from each shard's own full-text index, so their
+    ranking is only as good as the shards are alike.
+    """
+
+    def __init__(
+        self,
+        router: ShardRouter,
+        max_offset: int = settings.database_shard_max_offset,
+    ):
+        self.router = router
+        self.max_offset = max_offset
+
+    def _session(self, product_id: int) -> AsyncSession:
+        return self.router.sessions[self.router.shard_for_id(product_id)]()
+
+    def _read_session(self, product_id: int) -> AsyncSession:
+        shard = self.router.shard_for_id(product_id)
+        return self.router.read_sessions[shard]()
+
+    async def get_all_products(
+        self,
+        db: AsyncSession,
+        offset: int,
+        limit: int,
+        order_by: str = "id",
+        filters: Optional[schemas.ProductFilter] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[Row]:
+        # Any one shard may hold every row up to offset + limit, so deep
+        # offsets cost every shard; cursors stay cheap.
+        if offset > self.max_offset:
+            raise PageTooDeep(self.max_offset)
+        products = await self._products_after(
+            db=db,
+            limit=offset + limit,
+            order_by=order_by,
+            filters=filters,
+            fields=with_fields(fields, "id", order_by),
+        )
+        return products[offset:]
+
+    async def _products_after(
+        self, db: AsyncSession, limit: int, order_by: str = "id", **query
+    ) -> List[Row]:
+        async def fetch(session: AsyncSession, shard: int):
+            return await crud.get_products_after(
+                db=session, limit=limit, order_by=order_by, **query
+            )
+
+        return _merged(await self.router.fan_out(fetch), order_by, limit)
+
+    async def _search_hits(
+        self, db: AsyncSession, limit: int, **query
+    ) -> List[Row]:
+        async def search(session: AsyncSession, shard: int):
+            return await crud.search_products(db=session, limit=limit, **query)
+
+        return _merged(await self.router.fan_out(search), "search", limit)
+
+    def export_products(
+        self,
+        db: AsyncSession,
+        batch_size: int = 1000,
+        fields: Optional[List[str]] = None,
+    ) -> AsyncIterator[Sequence[Row]]:
+        return self._export(batch_size=batch_size, fields=fields)
+
+    async def _export(self, batch_size: int, fields: Optional[List[str]]):
+        columns = with_fields(fields, "id")
+        trim = None
+        if fields is not None and "id" not in fields:
+            # The id is only selected to merge by.
+            trim = namedtuple("Product", fields)
+        async with AsyncExitStack() as stack:
+            streams = []
+            for factory in self.router.read_sessions:
+                session = await stack.enter_async_context(factory())
+                streams.append(
+                    _rows(
+                        crud.stream_products(
+                            db=session, batch_size=batch_size, fields=columns
+                        )
+                    )
+                )
+            batch = []
+            async for row in _merge_streams(streams, SORT_KEYS["id"]):
+                batch.append(trim(*row[: len(fields)]) if trim else row)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    async def get_product_by_id(
+        self, db: AsyncSession, product_id: int
+    ) -> Optional[schemas.Product]:
+        async with self._read_session(product_id) as session:
+            return await super().get_product_by_id(
+                db=session, product_id=product_id
+            )
+
+    async def get_product_dict(
+        self,
+        db: AsyncSession,
+        product_id: int,
+        fields: Optional[List[str]] = None,
+    ) -> Optional[dict]:
+        async with self._read_session(product_id) as session:
+            return await super().get_product_dict(
+                db=session, product_id=product_id, fields=fields
+            )
+
+    async def _rows_by_ids(
+        self, db: AsyncSession, ids: List[int]
+    ) -> Dict[int, Row]:
+        by_shard: Dict[int, List[int]] = {}
+        for product_id in ids:
+            shard = self.router.shard_for_id(product_id)
+            by_shard.setdefault(shard, []).append(product_id)
+
+        async def fetch(session: AsyncSession, shard: int):
+            return await crud.get_products_by_ids(
+                db=session, ids=by_shard[shard]
+            )
+
+        rows = {}
+        for found in await self.router.fan_out(fetch, shards=by_shard):
+            rows.update(found)
+        return rows
+
+    async def create_product(
+        self, db: AsyncSession, product: schemas.ProductCreate
+    ) -> schemas.Product:
+        shard = self.router.shard_for_name(product.name)
+        async with self.router.sessions[shard]() as session:
+            return await super().create_product(db=session, product=product)
+
+    async def upsert_rows(
+        self, db: AsyncSession, rows: List[dict]
+    ) -> Dict[str, Tuple[int, bool]]:
+        """Updates existing names where they are and places new ones by
+        name, then upserts every shard's share at once.
+        """
+        names = [row["name"] for row in rows]
+
+        async def lookup(session: AsyncSession, shard: int):
+            return await crud.get_product_ids_by_name(db=session, names=names)
+
+        homes = {}
+        for shard, found in enumerate(await self.router.fan_out(lookup)):
+            homes.update((name, shard) for name in found)
+        by_shard: Dict[int, List[dict]] = {}
+        for row in rows:
+            shard = homes.get(row["name"])
+            if shard is None:
+                shard = self.router.shard_for_name(row["name"])
+            by_shard.setdefault(shard, []).append(row)
+
+        async def upsert(shard: int):
+            if shard == 0:
+                # db's transaction may already hold shard 0's only writer.
+                return await ProductService.upsert_rows(
+                    self, db=db, rows=by_shard[0]
+                )
+            async with self.router.sessions[shard]() as session:
+                return await ProductService.upsert_rows(
+                    self, db=session, rows=by_shard[shard]
+                )
+
+        results = {}
+        for written in await asyncio.gather(*map(upsert, by_shard)):
+            results.update(written)
+        return results
+
+    async def update_product(
+        self, db: AsyncSession, product_id: int, product: schemas.ProductUpdate
+    ) -> Optional[Row]:
+        async with self._session(product_id) as session:
+            return await super().update_product(
+                db=session, product_id=product_id, product=product
+            )
+
+    async def patch_product(
+        self, db: AsyncSession, product_id: int, product: schemas.ProductPatch
+    ) -> Optional[Row]:
+        async with self._session(product_id) as session:
+            return await super().patch_product(
+                db=session, product_id=product_id, product=product
+            )
+
+    async def reserve_stock(
+        self, db: AsyncSession, items: List[schemas.StockChangeItem]
+    ) -> List[schemas.StockLevel]:
+        remaining = await self._adjust_stock(_merge(items), reserve=True)
+        return _stock_levels(remaining)
+
+    async def release_stock(
+        self, db: AsyncSession, items: List[schemas.StockChangeItem]
+    ) -> List[schemas.StockLevel]:
+        remaining = await self._adjust_stock(_merge(items), reserve=False)
+        return _stock_levels(remaining)
+
+    async def _adjust_stock(
+        self, items: Dict[int, int], reserve: bool
+    ) -> Dict[int, int]:
+        """Adjusts each shard's share of a cart in turn.
+
+        A failing shard only rolls back its own share, so the shards done
+        before it are put back with the opposite adjustment.
+        """
+        by_shard: Dict[int, Dict[int, int]] = {}
+        for product_id, quantity in items.items():
+            shard = self.router.shard_for_id(product_id)
+            by_shard.setdefault(shard, {})[product_id] = quantity
+        adjust, undo = crud.reserve_stock, crud.release_stock
+        if not reserve:
+            adjust, undo = undo, adjust
+        remaining = {}
+        done = []
+        try:
+            for shard in sorted(by_shard):
+                async with self.router.sessions[shard]() as session:
+                    remaining.update(
+                        await adjust(db=session, items=by_shard[shard])
+                    )
+                done.append(shard)
+        except StockError:
+            for shard in done:
+                try:
+                    async with self.router.sessions[shard]() as session:
+                        await undo(db=session, items=by_shard[shard])
+                except StockError:
+                    logger.exception("Could not undo stock change")
+            raise
+        return remaining
+
+    async def delete_product(self, db: AsyncSession, product_id: int) -> bool:
+        async with self._session(product_id) as session:
+            return await super().delete_product(
+                db=session, product_id=product_id
+            )
+
+    async def delete_products(
+        self,
+        db: AsyncSession,
+        filters: Optional[schemas.ProductFilter] = None,
+        batch_size: int = 1000,
+    ) -> int:
+        """Deletes in batches on every shard at once."""
+
+        async def purge(shard: int):
+            if shard == 0:
+                return await ProductService.delete_products(
+                    self, db=db, filters=filters, batch_size=batch_size
+                )
+            async with self.router.sessions[shard]() as session:
+                return await ProductService.delete_products(
+                    self, db=session, filters=filters, batch_size=batch_size
+                )
+
+        return sum(
+            await asyncio.gather(*map(purge, range(len(self.router))))
+        )
+
+    async def detach_category_products(
+        self, db: AsyncSession, category_id: int
+    ) -> List[int]:
+        # Shard 0 goes through db, whose transaction holds its only writer.
+        async def detach(session: AsyncSession, shard: int):
+            product_ids = await crud.detach_category_products(
+                db=session, category_id=category_id
+            )
+            await session.commit()
+            return product_ids
+
+        moved = await self.router.fan_out(
+            detach, shards=range(1, len(self.router)), read=False
+        )
+        product_ids = await super().detach_category_products(
+            db=db, category_id=category_id
+        )
+        for shard_ids in moved:
+            product_ids.extend(shard_ids)
+        return product_ids
+
+
+class ShardedStatsService(StatsService):
+    """StatsService adding up every shard's category stats."""
+
+    def __init__(self, router: ShardRouter):
+        self.router = router
+
+    async def get_catalog_stats(
+        self, db: AsyncSession
+    ) -> schemas.CatalogStats:
+        shards = await self.router.fan_out(
+            lambda session, shard: crud.get_category_stats(db=session)
+        )
+        return self.summarize([row for rows in shards for row in rows])
+
+    async def get_category_stats(
+        self, db: AsyncSession, category_id: int
+    ) -> schemas.CategoryStats:
+        shards = await self.router.fan_out(
+            lambda session, shard: crud.get_category_stats(
+                db=session, category_id=category_id
+            )
+        )
+        rows = [row for shard_rows in shards for row in shard_rows]
+        return _to_schema(category_id, rows)
@@ -0,0 +1,413 @@
+"""A read-only catalog snapshot shared by every worker through mmap.
+
+One worker per host wins a lock file and rebuilds the snapshot whenever
+the change log moves. Every worker maps the current file and serves hot
+reads from it, so the pages live once in the OS page cache rather than
+once per worker heap.
+
+File layout (native byte order, every index section 8-byte aligned)::
+
+    header
+    product records, category records
+    product ids, versions (int64 × n) and offsets (uint64 × n + 1)
+    category ids, versions (int64 × m) and offsets (uint64 × m + 1)
+
+Records are JSON objects written back to back with a comma between them,
+so any run of consecutive records is already the body of a JSON array.
+The records come first so a builder can stream rows straight into the
+file; the header, written last, says where each index starts.
+"""
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from array import array
+from itertools import chain
+from bisect import bisect_left, bisect_right
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.config import settings
+from app.models.models import Category, Product
+from app.services.change_feed import change_notifier
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PSNAPSHT"
+FORMAT = 2
+# magic, format, padding, change log seq, products, categories, taken_at,
+# product index position, category index position
+HEADER = struct.Struct("=8sIIqqqdqq")
+# Index entries buffered per column before they spill to disk.
+SPILL_SIZE = 8192
+CATALOG_TABLES = {"products", "categories"}
+
+
+class SnapshotMismatch(ValueError):
+    """The file is not a snapshot this code can read."""
+
+
+class Table:
+    """One table's records, looked up by id without copying the file."""
+
+    def __init__(self, buffer: memoryview, count: int, start: int):
+        size = 8 * count
+        self.ids = buffer[start : start + size].cast("q")
+        self.versions = buffer[start + size : start + 2 * size].cast("q")
+        self.offsets = buffer[
+            start + 2 * size : start + 3 * size + 8
+        ].cast("Q")
+        self.buffer = buffer
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, entity_id: int) -> Optional[Tuple[int, bytes]]:
+        """The version and JSON body of ``entity_id``, if present."""
+        index = bisect_left(self.ids, entity_id)
+        if index == len(self.ids) or self.ids[index] != entity_id:
+            return None
+        record = self.buffer[
+            self.offsets[index] : self.offsets[index + 1] - 1
+        ]
+        return self.versions[index], bytes(record)
+
+    def index_after(self, entity_id: int) -> int:
+        return bisect_right(self.ids, entity_id)
+
+    def json_array(self, start: int, stop: int) -> bytes:
+        """Records ``start`` to ``stop`` as a JSON array."""
+        if start >= stop:
+            return b"[]"
+        # Drop the comma that follows the last record.
+        body = self.buffer[self.offsets[start] : self.offsets[stop] - 1]
+        return b"[%s]" % body
+
+    def versions_of(
+        self, start: int, stop: int
+    ) -> Iterator[Tuple[int, int]]:
+        for index in range(start, stop):
+            yield self.ids[index], self.versions[index]
+
+
+class Snapshot:
+    def __init__(self, mapped: mmap.mmap):
+        self.mapped = mapped
+        buffer = memoryview(mapped)
+        if len(buffer) < HEADER.size:
+            raise SnapshotMismatch("File too short")
+        (
+            magic,
+            fmt,
+            _,
+            self.change_seq,
+            products,
+            categories,
+            self.taken_at,
+            products_index,
+            categories_index,
+        ) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or fmt != FORMAT:
+            raise SnapshotMismatch(f"Unknown format {magic!r} {fmt}")
+        self.products = Table(buffer, products, products_index)
+        self.categories = Table(buffer, categories, categories_index)
+
+
+class _Column:
+    """A column of 64-bit integers spilled to a temporary file as it grows."""
+
+    def __init__(self, typecode: str):
+        self.typecode = typecode
+        self.buffer = array(typecode)
+        self.spill = tempfile.TemporaryFile()
+
+    def append(self, value: int):
+        self.buffer.append(value)
+        if len(self.buffer) >= SPILL_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.buffer.tofile(self.spill)
+        self.buffer = array(self.typecode)
+
+    def copy_to(self, f: IO):
+        self.flush()
+        self.spill.seek(0)
+        shutil.copyfileobj(self.spill, f)
+        self.spill.close()
+
+
+class SnapshotWriter:
+    """Writes a snapshot table by table, one batch of rows at a time.
+
+    Records go straight to the file and index entries to temporary
+    files, so memory stays flat however large the catalog is. Tables are
+    products then categories, each in id order.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.temporary = f"{path}.{os.getpid()}.tmp"
+        self.file = open(self.temporary, "wb")
+        self.file.write(bytes(HEADER.size))
+        self.position = HEADER.size
+        self.tables: List[Tuple[_Column, _Column, _Column]] = []
+        self.next_table()
+
+    def next_table(self):
+        self.tables.append((_Column("q"), _Column("q"), _Column("Q")))
+        self.tables[-1][2].append(self.position)
+
+    def write_rows(self, rows: Iterable[dict]):
+        ids, versions, offsets = self.tables[-1]
+        for row in rows:
+            record = orjson.dumps(row) + b","
+            self.file.write(record)
+            self.position += len(record)
+            ids.append(row["id"])
+            versions.append(row["version"])
+            offsets.append(self.position)
+
+    def finish(self, change_seq: int, taken_at: float):
+        """Writes the indexes and header and swaps the file in."""
+        counts, positions = [], []
+        for ids, versions, offsets in self.tables:
+            counts.append(ids.spill.tell() // 8 + len(ids.buffer))
+            # Keeps every index 8-byte aligned for the casts in Table.
+            self.file.write(bytes(-self.file.tell() % 8))
+            positions.append(self.file.tell())
+            for column in (ids, versions, offsets):
+                column.copy_to(self.file)
+        self.file.seek(0)
+        self.file.write(
+            HEADER.pack(
+                MAGIC,
+                FORMAT,
+                0,
+                change_seq,
+                counts[0],
+                counts[1],
+                taken_at,
+                positions[0],
+                positions[1],
+            )
+        )
+        self.file.close()
+        # Readers that mapped the old file keep it until they let go.
+        os.replace(self.temporary, self.path)
+
+    def discard(self):
+        self.file.close()
+        for table in self.tables:
+            for column in table:
+                column.spill.close()
+        os.unlink(self.temporary)
+
+
+def write_snapshot(
+    path: str,
+    products: List[dict],
+    categories: List[dict],
+    change_seq: int,
+    taken_at: float,
+):
+    """Writes a snapshot of id-ordered rows and swaps it in atomically."""
+    writer = SnapshotWriter(path)
+    writer.write_rows(products)
+    writer.next_table()
+    writer.write_rows(categories)
+    writer.finish(change_seq, taken_at)
+
+
+async def build_snapshot(session_factory, path: str) -> int:
+    """Snapshots the catalog and returns the change log seq it reflects."""
+    # Taken before the read transaction starts, so every commit that
+    # finished earlier is in the snapshot.
+    taken_at = time.time()
+    writer = await asyncio.to_thread(SnapshotWriter, path)
+    try:
+        async with session_factory() as db:
+            _, change_seq = await crud.get_change_log_bounds(db=db)
+            async for rows in crud.stream_products(db=db):
+                await asyncio.to_thread(
+                    writer.write_rows, [row._asdict() for row in rows]
+                )
+            writer.next_table()
+            result = await db.stream(
+                select(*crud.CATEGORY_COLUMNS).order_by(Category.id)
+            )
+            async for rows in result.partitions(SPILL_SIZE):
+                await asyncio.to_thread(
+                    writer.write_rows, [row._asdict() for row in rows]
+                )
+        await asyncio.to_thread(writer.finish, change_seq, taken_at)
+    except BaseException:
+        await asyncio.to_thread(writer.discard)
+        raise
+    return change_seq
+
+
+def acquire_builder_lock(path: str) -> Optional[IO]:
+    """The lock file for ``path`` if this process may build, else None.
+
+    The lock lasts as long as the returned file stays open, and the OS
+    drops it when the process dies, so another worker can take over.
+    """
+    lock = open(f"{path}.lock", "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+async def maintain_snapshot(session_factory, path: str, interval: float):
+    """Keeps the snapshot current from whichever worker holds the lock.
+
+    The others keep retrying so one takes over if the builder exits. The
+    builder checks the change log every ``interval`` seconds, or as soon
+    as a session in its own process commits.
+    """
+    lock = acquire_builder_lock(path)
+    while lock is None:
+        await asyncio.sleep(interval)
+        lock = acquire_builder_lock(path)
+    built_seq = None
+    try:
+        while True:
+            waiter = change_notifier.waiter()
+            try:
+                async with session_factory() as db:
+                    _, change_seq = await crud.get_change_log_bounds(db=db)
+                if change_seq != built_seq:
+                    built_seq = await build_snapshot(session_factory, path)
+            except Exception:
+                logger.exception("Catalog snapshot build failed")
+            try:
+                await asyncio.wait_for(waiter.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        lock.close()
+
+
+class CatalogSnapshot:
+    """This worker's view of the shared snapshot file.
+
+    ``current()`` remaps the file when the builder replaced it, checking
+    at most every ``reload_interval`` seconds. It returns None, sending
+    reads to the database, while there is no readable snapshot or while
+    this process has committed something the snapshot may not include.
+    Writes from other workers show up once the builder has caught up.
+    """
+
+    # When a session in this process last committed a catalog write
+    # (wall clock).
+    last_commit = 0.0
+
+    def __init__(self, path: str, reload_interval: float, enabled: bool):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._snapshot: Optional[Snapshot] = None
+        self._file_key = None
+        self._checked_at = float("-inf")
+
+    def current(self) -> Optional[Snapshot]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            self._reload()
+        snapshot = self._snapshot
+        if snapshot is None or self.last_commit >= snapshot.taken_at:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return snapshot
+
+    def _reload(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._snapshot = self._file_key = None
+            return
+        file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_key == self._file_key:
+            return
+        self._file_key = file_key
+        try:
+            with open(self.path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._snapshot = Snapshot(mapped)
+        except (OSError, ValueError):
+            logger.exception("Cannot map catalog snapshot %s", self.path)
+            self._snapshot = None
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        stats = {
+            "enabled": self.enabled,
+            "change_seq": None,
+            "products": None,
+            "categories": None,
+            "taken_at": None,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+        snapshot = self._snapshot
+        if snapshot is not None:
+            stats.update(
+                change_seq=snapshot.change_seq,
+                products=len(snapshot.products),
+                categories=len(snapshot.categories),
+                taken_at=snapshot.taken_at,
+            )
+        return stats
+
+
+catalog_snapshot = CatalogSnapshot(
+    settings.snapshot_path,
+    reload_interval=settings.snapshot_reload_interval,
+    # The change log seq that drives rebuilds is per database file.
+    enabled=settings.snapshot_enabled and settings.database_shards == 1,
+)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_catalog_statement(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        if state.statement.table.name in CATALOG_TABLES:
+            state.session.info["catalog_written"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _note_catalog_flush(session, flush_context):
+    changed = chain(session.new, session.dirty, session.deleted)
+    if any(isinstance(obj, (Product, Category)) for obj in changed):
+        session.info["catalog_written"] = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_catalog_writes(session):
+    session.info.pop("catalog_written", None)
+
+
+@event.listens_for(Session, "after_commit")
+def _record_commit(session):
+    # Commits that leave the catalog alone, such as maintenance, would
+    # otherwise keep this worker off the snapshot until the next rebuild.
+    if session.info.pop("catalog_written", False):
+        CatalogSnapshot.last_commit = time.time()
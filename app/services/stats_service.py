@@ -0,0 +1,61 @@
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.models.models import CategoryStats
+from app.serializers import schemas
+
+
+def _to_schema(
+    category_id: Optional[int],
+    rows: Iterable[CategoryStats],
+) -> schemas.CategoryStats:
+    stats = schemas.CategoryStats(category_id=category_id)
+    price_sum = priced_count = 0
+    for row in rows:
+        stats.product_count += row.product_count
+        stats.total_quantity += row.total_quantity
+        stats.inventory_value += row.inventory_value
+        price_sum += row.price_sum
+        priced_count += row.priced_count
+        for name, pick in (("min_price", min), ("max_price", max)):
+            value = getattr(row, name)
+            current = getattr(stats, name)
+            if value is not None:
+                setattr(
+                    stats,
+                    name,
+                    value if current is None else pick(current, value),
+                )
+    if priced_count:
+        stats.avg_price = price_sum / priced_count
+    return stats
+
+
+class StatsService:
+    async def get_catalog_stats(
+        self, db: AsyncSession
+    ) -> schemas.CatalogStats:
+        rows = await crud.get_category_stats(db=db)
+        return self.summarize(rows)
+
+    async def get_category_stats(
+        self, db: AsyncSession, category_id: int
+    ) -> schemas.CategoryStats:
+        rows = await crud.get_category_stats(db=db, category_id=category_id)
+        return _to_schema(category_id, rows)
+
+    def summarize(self, rows: List[CategoryStats]) -> schemas.CatalogStats:
+        # Partitioned storage has a row per category in every shard.
+        by_category: Dict[int, List[CategoryStats]] = {}
+        for row in rows:
+            by_category.setdefault(row.category_id, []).append(row)
+        return schemas.CatalogStats(
+            totals=_to_schema(None, rows),
+            categories=[
+                # Category 0 holds the products without a category.
+                _to_schema(category_id or None, by_category[category_id])
+                for category_id in sorted(by_category)
+            ],
+        )
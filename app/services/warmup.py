@@ -0,0 +1,69 @@
+"""Start-up warm-up, so a worker's first requests are not its slowest.
+
+A cold worker pays for opening connections, compiling each statement and
+reading pages from disk on its first requests. Warming up does all of
+that before the worker reports itself ready at ``/health/ready``.
+"""
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable, Iterable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.services.metrics import Metrics, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """Whether this worker has warmed up and should be sent traffic."""
+
+    def __init__(self):
+        self.ready = False
+        self.warmup_seconds: Optional[float] = None
+
+
+readiness = Readiness()
+
+
+def _pool_size(engine: AsyncEngine) -> int:
+    # In-memory databases use a single-connection pool without a size.
+    size = getattr(engine.pool, "size", None)
+    return size() if size is not None else 1
+
+
+async def open_connections(engines: Iterable[AsyncEngine]):
+    """Fills every engine's pool, so no request waits for a connect.
+
+    The connections are all held at once so each one is a new one, then
+    go back to their pools on the way out.
+    """
+    async with AsyncExitStack() as stack:
+        for engine in dict.fromkeys(engines):
+            for _ in range(_pool_size(engine)):
+                await stack.enter_async_context(engine.connect())
+
+
+async def warm_up(
+    engines: Iterable[AsyncEngine],
+    run_queries: Callable[[], Awaitable[None]],
+    registry: Metrics = metrics,
+) -> float:
+    """Opens the pools, runs ``run_queries`` and then reports ready.
+
+    A failed warm-up is logged and the worker still becomes ready, since
+    serving cold beats not serving. Returns the seconds it took.
+    """
+    started = time.perf_counter()
+    try:
+        await open_connections(engines)
+        await run_queries()
+    except Exception:
+        logger.exception("Warm-up failed; serving cold")
+    elapsed = time.perf_counter() - started
+    registry.warmup_seconds.set(elapsed)
+    readiness.warmup_seconds = elapsed
+    readiness.ready = True
+    logger.info("Warmed up in %.3f s", elapsed)
+    return elapsed
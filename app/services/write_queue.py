@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.engine import async_session
+from app.services.metrics import current_timings
+
+logger = logging.getLogger(__name__)
+
+WriteOp = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class WriteBatcher:
+    """Applies queued writes from concurrent requests in shared transactions.
+
+    A single writer task collects whatever arrives within ``window`` seconds
+    (at most ``max_batch`` operations), runs each one in its own SAVEPOINT
+    so a failing operation only rolls back itself, and commits once.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        window: float,
+        max_batch: int,
+        enabled: bool = False,
+    ):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def submit(self, op: WriteOp) -> Any:
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        # The task inherits the context of the request that started it, but
+        # its statements belong to no single request.
+        current_timings.set(None)
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            await self._apply(batch)
+
+    async def _apply(self, batch: List[Tuple[WriteOp, asyncio.Future]]):
+        outcomes = []
+        try:
+            async with self.session_factory() as session:
+                for op, future in batch:
+                    try:
+                        async with session.begin_nested():
+                            outcomes.append((future, await op(session), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+                await session.commit()
+        except Exception as exc:
+            logger.exception("Write batch of %d failed", len(batch))
+            outcomes = [(future, None, exc) for _, future in batch]
+        for future, result, exc in outcomes:
+            if future.done():
+                continue
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+write_batcher = WriteBatcher(
+    async_session,
+    window=settings.write_batch_window,
+    max_batch=settings.write_batch_max_size,
+    enabled=settings.write_batching_enabled,
+)
+
+
+async def run_write(db: AsyncSession, op: WriteOp) -> Any:
+    """Runs ``op`` and commits, through the write batcher when enabled.
+
+    Sessions of a partitioned shard name their own batcher in ``info``.
+    """
+    batcher = db.info.get("write_batcher", write_batcher)
+    if batcher.enabled:
+        return await batcher.submit(op)
+    try:
+        result = await op(db)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return result
@@ -0,0 +1,130 @@
+import asyncio
+import unittest
+
+import httpx
+from fastapi import FastAPI
+
+from app.services.admission import (
+    AdmissionMiddleware,
+    ConcurrencyLimiter,
+    Shed,
+)
+from app.services.metrics import Metrics
+
+
+class TestConcurrencyLimiter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.registry = Metrics()
+
+    def limiter(self, **options):
+        options = {"limit": 1, "max_queue": 1, "timeout": 1.0, **options}
+        return ConcurrencyLimiter("read", registry=self.registry, **options)
+
+    async def test_hands_slots_over_in_order(self):
+        limiter = self.limiter(max_queue=2)
+        await limiter.acquire()
+        order = []
+
+        async def wait(name):
+            await limiter.acquire()
+            order.append(name)
+
+        waiters = [asyncio.ensure_future(wait(n)) for n in ("a", "b")]
+        await asyncio.sleep(0)
+        self.assertEqual(self.registry.admission_queue_depth.value("read"), 2)
+        limiter.release(0.01)
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        await asyncio.gather(*waiters)
+
+        self.assertEqual(order, ["a", "b"])
+        self.assertEqual(limiter.active, 1)
+        self.assertEqual(self.registry.admission_wait_seconds.count("read"), 2)
+
+    async def test_sheds_when_queue_is_full(self):
+        limiter = self.limiter()
+        await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+
+        with self.assertRaises(Shed) as caught:
+            await limiter.acquire()
+        self.assertEqual(caught.exception.reason, "queue_full")
+        waiting.cancel()
+
+    async def test_sheds_after_timeout(self):
+        limiter = self.limiter(timeout=0.01)
+        await limiter.acquire()
+
+        with self.assertRaises(Shed) as caught:
+            await limiter.acquire()
+        self.assertEqual(caught.exception.reason, "timeout")
+        self.assertEqual(self.registry.admission_queue_depth.value("read"), 0)
+        # The slot is still held once, not leaked or double counted.
+        limiter.release(0.01)
+        self.assertEqual(limiter.active, 0)
+
+    async def test_sheds_early_when_wait_would_exceed_timeout(self):
+        limiter = self.limiter(timeout=0.5, max_queue=10)
+        limiter.hold_time = 1.0
+        await limiter.acquire()
+
+        with self.assertRaises(Shed) as caught:
+            await limiter.acquire()
+        self.assertEqual(caught.exception.reason, "expected_wait")
+        self.assertEqual(
+            self.registry.admission_shed.value("read", "expected_wait"), 1
+        )
+
+
+class TestAdmissionMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def test_overload_returns_503(self):
+        registry = Metrics()
+        release = asyncio.Event()
+        app = FastAPI()
+        app.add_middleware(
+            AdmissionMiddleware,
+            read=ConcurrencyLimiter(
+                "read", limit=1, max_queue=0, timeout=1, registry=registry
+            ),
+            write=ConcurrencyLimiter(
+                "write", limit=1, max_queue=0, timeout=1, registry=registry
+            ),
+            retry_after=3,
+        )
+
+        @app.get("/slow")
+        async def slow():
+            await release.wait()
+            return {}
+
+        @app.get("/metrics")
+        async def unlimited():
+            return {}
+
+        @app.get("/health/ready")
+        async def ready():
+            return {}
+
+        @app.post("/write")
+        async def write():
+            return {}
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as c:
+            first = asyncio.ensure_future(c.get("/slow"))
+            await asyncio.sleep(0.05)
+            shed = await c.get("/slow")
+            exempt = await c.get("/metrics")
+            probe = await c.get("/health/ready")
+            other_pool = await c.post("/write")
+            release.set()
+            self.assertEqual((await first).status_code, 200)
+
+        self.assertEqual(shed.status_code, 503)
+        self.assertEqual(shed.headers["retry-after"], "3")
+        self.assertEqual(exempt.status_code, 200)
+        self.assertEqual(probe.status_code, 200)
+        self.assertEqual(other_pool.status_code, 200)
+        self.assertEqual(
+            registry.admission_shed.value("read", "queue_full"), 1
+        )
@@ -0,0 +1,76 @@
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from app import crud
+from app.models.models import Product
+from app.tests.utils import DatabaseTestCase
+
+
+class TestBatchRead(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        await self.session.execute(
+            Product.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "name": f"Product {i}",
+                    "description": "",
+                    "price": i,
+                    "quantity": 1,
+                    "category_id": 1,
+                }
+                for i in range(1, 1201)
+            ],
+        )
+        await self.session.commit()
+        self.selects = 0
+
+        @event.listens_for(self.engine.sync_engine, "before_cursor_execute")
+        def count(conn, cursor, statement, parameters, context, many):
+            if statement.lstrip().upper().startswith("SELECT"):
+                self.selects += 1
+
+    async def test_get_keys_results_by_id(self):
+        async with self.client() as client:
+            response = await client.get("/products/batch?ids=3,9999,1,3")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(list(body["products"]), ["3", "1"])
+        self.assertEqual(body["products"]["3"]["name"], "Product 3")
+        self.assertEqual(body["missing"], [9999])
+        self.assertEqual(self.selects, 1)
+
+    async def test_post_chunks_large_sets(self):
+        ids = list(range(1, 1201))
+        async with self.client() as client:
+            response = await client.post("/products/batch", json={"ids": ids})
+
+        self.assertEqual(len(response.json()["products"]), 1200)
+        chunks = -(-len(ids) // crud.BULK_BATCH_SIZE)
+        self.assertEqual(self.selects, chunks)
+
+    async def test_cached_products_skip_the_database(self):
+        async with self.client() as client:
+            await client.get("/products/1")
+            await client.get("/products/2")
+            self.selects = 0
+            response = await client.get("/products/batch?ids=1,2")
+
+        self.assertEqual(len(response.json()["products"]), 2)
+        self.assertEqual(self.selects, 0)
+
+    async def test_invalid_ids(self):
+        async with self.client() as client:
+            response = await client.get("/products/batch?ids=1,x")
+
+        self.assertEqual(response.status_code, 422)
+
+    async def test_too_many_ids(self):
+        with patch("app.main.MAX_BATCH_IDS", 2):
+            async with self.client() as client:
+                response = await client.get("/products/batch?ids=1,2,3")
+
+        self.assertEqual(response.status_code, 400)
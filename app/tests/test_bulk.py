@@ -0,0 +1,64 @@
+from unittest.mock import patch
+
+from app.serializers import schemas
+from app.services.product_service import ProductService
+from app.tests.utils import DatabaseTestCase
+
+
+def make_product(name, price=10.0, quantity=1):
+    return schemas.ProductCreate(
+        name=name,
+        description=f"{name} description",
+        price=price,
+        quantity=quantity,
+        category_id=1,
+    )
+
+
+class TestBulkUpsert(DatabaseTestCase):
+    async def test_insert_then_update(self):
+        service = ProductService()
+        first = await service.bulk_upsert_products(
+            db=self.session,
+            products=[make_product("A"), make_product("B")],
+        )
+        self.assertTrue(all(created for _, created in first.values()))
+
+        second = await service.bulk_upsert_products(
+            db=self.session,
+            products=[make_product("A", price=42), make_product("C")],
+        )
+        self.assertEqual(second["A"], (first["A"][0], False))
+        self.assertTrue(second["C"][1])
+
+        product = await service.get_product_by_id(
+            db=self.session, product_id=first["A"][0]
+        )
+        self.assertEqual(product.price, 42)
+
+
+class TestBulkEndpoint(DatabaseTestCase):
+    @patch("app.crud.upsert_products")
+    async def test_per_row_results(self, mock_upsert_products):
+        mock_upsert_products.return_value = {
+            "A": (1, True),
+            "B": (2, False),
+        }
+        rows = [
+            make_product("A").dict(),
+            make_product("Bad", price=-1).dict(),
+            make_product("B").dict(),
+        ]
+        async with self.client() as client:
+            response = await client.post("/products/bulk", json=rows)
+        data = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (data["created"], data["updated"], data["failed"]), (1, 1, 1)
+        )
+        self.assertEqual(
+            [r["status"] for r in data["results"]],
+            ["created", "error", "updated"],
+        )
+        self.assertEqual(data["results"][1]["detail"], "Invalid price")
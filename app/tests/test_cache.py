@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import patch
+
+from app import crud
+from app.models.models import Category, Product
+from app.services.cache import LRUCache, product_cache
+from app.services.product_service import ProductService
+from app.tests.utils import DatabaseTestCase
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set(1, "a")
+        cache.set(2, "b")
+        cache.get(1)
+        cache.set(3, "c")
+
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), "a")
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_expires_after_ttl(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        with patch("app.services.cache.time.monotonic", return_value=0):
+            cache.set(1, "a")
+        with patch("app.services.cache.time.monotonic", return_value=61):
+            self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_read_that_raced_an_invalidation_is_not_cached(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        before = cache.generation()
+        cache.invalidate(1)
+        cache.set(1, "stale", before)
+        cache.set(2, "b", before)
+        cache.set(1, "fresh", cache.generation())
+
+        self.assertEqual(cache.get(1), "fresh")
+        self.assertEqual(cache.get(2), "b")
+
+        # Past max_size invalidations, older reads are refused outright.
+        before = cache.generation()
+        for key in (3, 4, 5):
+            cache.invalidate(key)
+        cache.set(2, "stale", before)
+        self.assertEqual(cache.get(2), "b")
+
+    def test_disabled(self):
+        cache = LRUCache(max_size=2, ttl=60, enabled=False)
+        cache.set(1, "a")
+        self.assertIsNone(cache.get(1))
+
+
+class TestReadThroughCache(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add(Category(id=1, name="Tools"))
+        self.session.add(
+            Product(
+                id=1,
+                name="Hammer",
+                description="Steel",
+                price=10,
+                quantity=1,
+                category_id=1,
+            )
+        )
+        await self.session.commit()
+
+    async def test_hot_product_reads_skip_database(self):
+        async with self.client() as client:
+            await client.get("/products/1")
+            with patch("app.crud.get_product_by_id") as mock_get:
+                response = await client.get("/products/1")
+
+        self.assertEqual(response.json()["name"], "Hammer")
+        mock_get.assert_not_called()
+
+    async def test_write_during_a_miss_is_not_cached_over(self):
+        get_product_by_id = crud.get_product_by_id
+
+        async def read_then_update(db, product_id):
+            # The row was read before a concurrent write invalidated it.
+            product = await get_product_by_id(db=db, product_id=product_id)
+            product_cache.invalidate(product_id)
+            return product
+
+        with patch("app.crud.get_product_by_id", read_then_update):
+            await ProductService().get_product_by_id(
+                db=self.session, product_id=1
+            )
+
+        self.assertIsNone(product_cache.get(1))
+
+    async def test_update_invalidates_product(self):
+        body = {
+            "name": "Mallet",
+            "description": "Rubber",
+            "price": 12,
+            "quantity": 2,
+            "category_id": 1,
+        }
+        async with self.client() as client:
+            await client.get("/products/1")
+            await client.put("/products/1", json=body)
+            response = await client.get("/products/1")
+
+        self.assertEqual(response.json()["name"], "Mallet")
+
+    async def test_category_update_invalidates_category(self):
+        async with self.client() as client:
+            await client.get("/categories/1")
+            await client.put("/categories/1", json={"name": "Hardware"})
+            response = await client.get("/categories/1")
+            stats = (await client.get("/cache/stats")).json()
+
+        self.assertEqual(response.json()["name"], "Hardware")
+        self.assertEqual(stats["categories"]["misses"], 2)
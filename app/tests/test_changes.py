@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import orjson
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, main
+from app.database.engine import create_engine
+from app.models.models import ChangeLog
+from app.services import change_feed
+from app.tests.utils import MigratedDatabaseTestCase
+
+PRODUCT = {
+    "name": "Hammer",
+    "description": "Steel",
+    "price": 10,
+    "quantity": 3,
+    "category_id": 1,
+}
+
+
+class TestChangeLog(MigratedDatabaseTestCase):
+    async def mutate(self, client):
+        await client.post("/categories", json={"name": "Tools"})
+        await client.post("/products/", json=PRODUCT)
+        await client.patch("/products/1", json={"price": 12})
+        await client.put("/categories/1", json={"name": "Hand tools"})
+        await client.delete("/products/1")
+
+    async def test_every_mutation_is_logged(self):
+        async with self.client() as client:
+            await self.mutate(client)
+            response = await client.get("/changes")
+
+        body = response.json()
+        changes = body["changes"]
+        self.assertEqual(
+            [(c["entity"], c["entity_id"], c["op"]) for c in changes],
+            [
+                ("category", 1, "insert"),
+                ("product", 1, "insert"),
+                ("product", 1, "update"),
+                ("category", 1, "update"),
+                ("product", 1, "delete"),
+            ],
+        )
+        self.assertEqual(changes[2]["version"], 2)
+        self.assertEqual(body["last_seq"], 5)
+        self.assertFalse(body["has_more"])
+
+    async def test_catch_up_in_pages(self):
+        async with self.client() as client:
+            await self.mutate(client)
+            first = (await client.get("/changes?limit=3")).json()
+            rest = (
+                await client.get(f"/changes?since={first['last_seq']}")
+            ).json()
+            idle = (
+                await client.get(f"/changes?since={rest['last_seq']}")
+            ).json()
+
+        self.assertTrue(first["has_more"])
+        self.assertEqual([c["seq"] for c in rest["changes"]], [4, 5])
+        self.assertEqual(
+            idle, {"changes": [], "last_seq": 5, "has_more": False}
+        )
+
+    async def test_compaction_expires_old_positions(self):
+        async with self.client() as client:
+            await self.mutate(client)
+            await self.session.execute(
+                update(ChangeLog)
+                .where(ChangeLog.seq <= 3)
+                .values(changed_at=datetime.utcnow() - timedelta(days=30))
+            )
+            removed = await crud.compact_changes(
+                self.session, before=datetime.utcnow() - timedelta(days=7)
+            )
+            await self.session.commit()
+            expired = await client.get("/changes?since=1")
+            current = await client.get("/changes?since=3")
+
+        self.assertEqual(removed, 3)
+        self.assertEqual(expired.status_code, 410)
+        self.assertEqual(
+            [c["seq"] for c in current.json()["changes"]], [4, 5]
+        )
+
+    def read_session_factory(self):
+        """Sessions on a separate read-only engine, as in production."""
+        engine = create_engine(
+            f"sqlite+aiosqlite:///{self.database_path}",
+            pool_size=1,
+            max_overflow=0,
+            read_only=True,
+        )
+        self.addAsyncCleanup(engine.dispose)
+        return sessionmaker(engine, class_=AsyncSession)
+
+    async def test_stream_pushes_new_commits(self):
+        async with self.client() as client:
+            await client.post("/categories", json={"name": "Tools"})
+            events = change_feed.stream_changes(
+                self.read_session_factory(), since=0, poll_interval=30
+            )
+            backlog = await events.__anext__()
+            pending = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0.05)
+            self.assertFalse(pending.done())
+            await client.post("/products/", json=PRODUCT)
+            pushed = await asyncio.wait_for(pending, 5)
+            await events.aclose()
+
+        self.assertTrue(backlog.startswith(b"id: 1\nevent: change\n"))
+        self.assertEqual(pushed.split(b"\n")[0], b"id: 2")
+        data = orjson.loads(pushed.split(b"data: ")[1])
+        self.assertEqual((data["entity"], data["op"]), ("product", "insert"))
+
+    async def test_stream_rejects_compacted_position(self):
+        read_session_factory = self.read_session_factory()
+        main.app.dependency_overrides[
+            main.get_read_session_factory
+        ] = lambda: read_session_factory
+        async with self.client() as client:
+            await self.mutate(client)
+            await crud.compact_changes(
+                self.session, before=datetime.utcnow() + timedelta(days=1)
+            )
+            await self.session.commit()
+            response = await client.get(
+                "/changes/stream", headers={"Last-Event-ID": "2"}
+            )
+
+        self.assertEqual(response.status_code, 410)
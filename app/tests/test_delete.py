@@ -0,0 +1,88 @@
+from datetime import datetime
+
+from sqlalchemy import func, select, text
+
+from app.models.models import Category, ChangeLog, Product
+from app.services.cache import product_cache
+from app.services.maintenance import reclaim_free_pages
+from app.tests.utils import MigratedDatabaseTestCase
+
+
+class TestBulkDelete(MigratedDatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add_all(
+            [Category(id=1, name="Tools"), Category(id=2, name="Garden")]
+        )
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description="x" * 200,
+                price=i,
+                quantity=i,
+                category_id=1 + i % 2,
+                created_at=datetime(2026, 1, 1 + i),
+            )
+            for i in range(20)
+        )
+        await self.session.commit()
+
+    async def product_ids(self):
+        result = await self.session.scalars(
+            select(Product.id).order_by(Product.id)
+        )
+        return result.all()
+
+    async def test_deletes_matching_products_in_batches(self):
+        async with self.client() as client:
+            cached = await client.get("/products/2")
+            by_category = await client.delete(
+                "/products/?category_id=2&batch_size=3"
+            )
+            by_date = await client.delete(
+                "/products/?created_before=2026-01-05T00:00:00"
+            )
+            gone = await client.get("/products/2")
+
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(by_category.json(), {"deleted": 10})
+        # Products 0 and 2 are in category 1; 1 and 3 went with category 2.
+        self.assertEqual(by_date.json(), {"deleted": 2})
+        self.assertEqual(gone.status_code, 404)
+        self.assertIsNone(product_cache.get(2))
+        # ids start at 1, so odd products (category 2) have even ids.
+        self.assertEqual(await self.product_ids(), list(range(5, 20, 2)))
+        deletes = await self.session.scalar(
+            select(func.count()).where(ChangeLog.op == "delete")
+        )
+        self.assertEqual(deletes, 12)
+
+    async def test_everything_needs_all(self):
+        async with self.client() as client:
+            refused = await client.delete("/products/")
+            purged = await client.delete("/products/?all=true&batch_size=7")
+            stats = await client.get("/stats")
+
+        self.assertEqual(refused.status_code, 400)
+        self.assertEqual(purged.json(), {"deleted": 20})
+        self.assertEqual(await self.product_ids(), [])
+        self.assertEqual(stats.json()["totals"]["product_count"], 0)
+
+    async def test_free_pages_are_reclaimed(self):
+        async with self.client() as client:
+            await client.delete("/products/?all=true")
+        await self.session.close()
+
+        async def pages():
+            async with self.session_factory() as db:
+                return await db.scalar(text("PRAGMA page_count"))
+
+        before = await pages()
+        reclaimed = await reclaim_free_pages(self.session_factory, 1)
+
+        self.assertGreater(reclaimed, 0)
+        self.assertEqual(await pages(), before - reclaimed)
+        async with self.session_factory() as db:
+            self.assertEqual(
+                await db.scalar(text("PRAGMA freelist_count")), 0
+            )
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.database.engine import create_engine
+
+
+class TestEngines(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        url = "sqlite+aiosqlite:///" + os.path.join(directory.name, "t.db")
+        self.write_engine = create_engine(url, pool_size=1, max_overflow=0)
+        self.read_engine = create_engine(
+            url, pool_size=2, max_overflow=0, read_only=True
+        )
+
+    async def asyncTearDown(self):
+        await self.read_engine.dispose()
+        await self.write_engine.dispose()
+
+    async def test_write_engine_uses_wal(self):
+        async with self.write_engine.begin() as conn:
+            mode = await conn.scalar(text("PRAGMA journal_mode"))
+            await conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        self.assertEqual(mode, "wal")
+
+    async def test_read_engine_is_read_only(self):
+        async with self.write_engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        async with self.read_engine.connect() as conn:
+            self.assertEqual(await conn.scalar(text("PRAGMA query_only")), 1)
+            with self.assertRaises(OperationalError):
+                await conn.execute(text("INSERT INTO t VALUES (1)"))
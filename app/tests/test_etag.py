@@ -0,0 +1,61 @@
+from app.models.models import Category, Product
+from app.tests.utils import DatabaseTestCase
+
+
+class TestConditionalGet(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add(Category(id=1, name="Tools"))
+        self.session.add(
+            Product(
+                id=1,
+                name="Hammer",
+                description="Steel",
+                price=10,
+                quantity=1,
+                category_id=1,
+            )
+        )
+        await self.session.commit()
+
+    async def assert_revalidates(self, client, url):
+        first = await client.get(url)
+        etag = first.headers["etag"]
+        second = await client.get(url, headers={"If-None-Match": etag})
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b"")
+        self.assertEqual(second.headers["etag"], etag)
+        return etag
+
+    async def test_product(self):
+        body = {
+            "name": "Hammer",
+            "description": "Steel",
+            "price": 11,
+            "quantity": 1,
+            "category_id": 1,
+        }
+        async with self.client() as client:
+            etag = await self.assert_revalidates(client, "/products/1")
+            await client.put("/products/1", json=body)
+            response = await client.get(
+                "/products/1", headers={"If-None-Match": etag}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 2)
+
+    async def test_lists(self):
+        async with self.client() as client:
+            await self.assert_revalidates(client, "/products/")
+            await self.assert_revalidates(client, "/products/?limit=5")
+            await self.assert_revalidates(client, "/categories/")
+            await self.assert_revalidates(client, "/categories/1")
+
+    async def test_list_etag_changes_with_page_bounds(self):
+        async with self.client() as client:
+            first = await client.get("/products/?per_page=5")
+            second = await client.get("/products/?per_page=6")
+
+        self.assertNotEqual(first.headers["etag"], second.headers["etag"])
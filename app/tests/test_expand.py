@@ -0,0 +1,92 @@
+from sqlalchemy import event
+
+from app import crud
+from app.models.models import Category, Product
+from app.serializers.schemas import ProductUpdate
+from app.tests.utils import DatabaseTestCase
+
+
+class TestCategoryExpansion(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add_all(
+            Category(id=i, name=f"Category {i}") for i in range(1, 6)
+        )
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description="",
+                price=i,
+                quantity=1,
+                category_id=i % 5 + 1,
+            )
+            for i in range(100)
+        )
+        await self.session.commit()
+        self.selects = []
+
+        @event.listens_for(self.engine.sync_engine, "before_cursor_execute")
+        def count(conn, cursor, statement, parameters, context, many):
+            if statement.lstrip().upper().startswith("SELECT"):
+                self.selects.append(statement)
+
+    async def test_list_page_costs_two_queries(self):
+        async with self.client() as client:
+            response = await client.get(
+                "/products/?per_page=100&expand=category"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        products = response.json()
+        self.assertEqual(len(products), 100)
+        for product in products:
+            self.assertEqual(product["category"]["id"], product["category_id"])
+        self.assertEqual(len(self.selects), 2)
+
+    async def test_cursor_page(self):
+        async with self.client() as client:
+            response = await client.get("/products/?limit=3&expand=category")
+
+        items = response.json()["items"]
+        self.assertEqual(items[0]["category"]["name"], "Category 1")
+
+    async def test_not_expanded_by_default(self):
+        async with self.client() as client:
+            listed = await client.get("/products/")
+            single = await client.get("/products/1")
+
+        self.assertNotIn("category", listed.json()[0])
+        self.assertNotIn("category", single.json())
+
+    async def test_detail(self):
+        async with self.client() as client:
+            response = await client.get("/products/1?expand=category")
+            etag = response.headers["etag"]
+            await client.put("/categories/1", json={"name": "Renamed"})
+            renamed = await client.get(
+                "/products/1?expand=category",
+                headers={"If-None-Match": etag},
+            )
+
+        self.assertEqual(response.json()["category"]["name"], "Category 1")
+        self.assertEqual(renamed.status_code, 200)
+        self.assertEqual(renamed.json()["category"]["name"], "Renamed")
+
+    async def test_unknown_expansion(self):
+        async with self.client() as client:
+            response = await client.get("/products/?expand=supplier")
+
+        self.assertEqual(response.status_code, 422)
+
+    async def test_update_skips_category_lookup(self):
+        product = ProductUpdate(
+            name="Product 0",
+            description="",
+            price=2,
+            quantity=1,
+            category_id=3,
+        )
+        updated = await crud.update_product(self.session, 1, product)
+
+        self.assertEqual(updated.category_id, 3)
+        self.assertFalse(any("FROM categories" in s for s in self.selects))
@@ -0,0 +1,47 @@
+import csv
+import io
+import json
+
+from app.models.models import Product
+from app.tests.utils import DatabaseTestCase
+
+
+class TestExport(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description=f"Description, {i}",
+                price=i + 0.5,
+                quantity=i,
+                category_id=1,
+            )
+            for i in range(25)
+        )
+        await self.session.commit()
+
+    async def test_ndjson(self):
+        async with self.client() as client:
+            response = await client.get(
+                "/products/export", params={"batch_size": 10}
+            )
+        lines = response.text.splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["content-type"], "application/x-ndjson"
+        )
+        self.assertEqual(len(lines), 25)
+        self.assertEqual(json.loads(lines[3])["name"], "Product 3")
+
+    async def test_csv(self):
+        async with self.client() as client:
+            response = await client.get(
+                "/products/export", params={"format": "csv"}
+            )
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[7]["description"], "Description, 7")
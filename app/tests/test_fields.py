@@ -0,0 +1,118 @@
+import unittest
+
+import orjson
+from sqlalchemy import event
+
+from app.models.models import Category, Product
+from app.services.projection import InvalidFields, parse_fields
+from app.tests.utils import DatabaseTestCase
+
+
+class TestParseFields(unittest.TestCase):
+    def test_parse(self):
+        self.assertIsNone(parse_fields(None))
+        self.assertEqual(parse_fields("price, id,price,"), ["price", "id"])
+
+    def test_unknown(self):
+        with self.assertRaises(InvalidFields) as caught:
+            parse_fields("id,colour")
+        self.assertEqual(caught.exception.unknown, ["colour"])
+        with self.assertRaises(InvalidFields):
+            parse_fields(",")
+
+
+class TestSparseFieldsets(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add(Category(id=1, name="Tools"))
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description="A long description " * 10,
+                price=i,
+                quantity=i,
+                category_id=1,
+            )
+            for i in range(1, 6)
+        )
+        await self.session.commit()
+        self.statements = []
+
+        @event.listens_for(self.engine.sync_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, many):
+            if statement.lstrip().upper().startswith("SELECT"):
+                self.statements.append(statement)
+
+    async def test_list_selects_only_requested_columns(self):
+        async with self.client() as client:
+            response = await client.get("/products/?fields=id,price")
+
+        self.assertEqual(response.json()[0], {"id": 1, "price": 1.0})
+        (select,) = self.statements
+        self.assertNotIn("description", select)
+        self.assertNotIn("products.name", select)
+        self.assertIn("etag", response.headers)
+
+    async def test_cursor_page_by_price(self):
+        async with self.client() as client:
+            first = await client.get(
+                "/products/?limit=2&order_by=price&fields=quantity"
+            )
+            second = await client.get(
+                "/products/?limit=2&order_by=price&fields=quantity"
+                f"&cursor={first.json()['next_cursor']}"
+            )
+
+        self.assertEqual(
+            first.json()["items"], [{"quantity": 1}, {"quantity": 2}]
+        )
+        self.assertEqual(
+            second.json()["items"], [{"quantity": 3}, {"quantity": 4}]
+        )
+
+    async def test_expand_with_fields(self):
+        async with self.client() as client:
+            response = await client.get(
+                "/products/?fields=name&expand=category&per_page=1"
+            )
+
+        self.assertEqual(
+            response.json(),
+            [
+                {
+                    "name": "Product 1",
+                    "category": {"id": 1, "name": "Tools", "version": 1},
+                }
+            ],
+        )
+
+    async def test_detail(self):
+        async with self.client() as client:
+            response = await client.get("/products/2?fields=name,quantity")
+            missing = await client.get("/products/99?fields=name")
+
+        self.assertEqual(response.json(), {"name": "Product 2", "quantity": 2})
+        self.assertNotIn("description", self.statements[0])
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_export(self):
+        async with self.client() as client:
+            ndjson = await client.get("/products/export?fields=id,quantity")
+            csv = await client.get(
+                "/products/export?format=csv&fields=quantity,id"
+            )
+
+        lines = ndjson.content.splitlines()
+        self.assertEqual(orjson.loads(lines[0]), {"id": 1, "quantity": 1})
+        self.assertEqual(csv.text.splitlines()[:2], ["quantity,id", "1,1"])
+
+    async def test_unknown_field(self):
+        async with self.client() as client:
+            for url in (
+                "/products/?fields=id,colour",
+                "/products/1?fields=colour",
+                "/products/export?fields=colour",
+            ):
+                response = await client.get(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("colour", response.json()["detail"])
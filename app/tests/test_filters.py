@@ -0,0 +1,157 @@
+import itertools
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import crud
+from app.models.models import Product
+from app.serializers import schemas
+from app.tests.utils import MigratedDatabaseTestCase
+
+FILTER_VALUES = {
+    "category_id": 2,
+    "min_price": 5.0,
+    "max_price": 20.0,
+    "in_stock": True,
+    "created_after": datetime(2024, 1, 1),
+}
+NEW = {
+    "name": "New",
+    "description": "",
+    "price": 1.0,
+    "quantity": 1,
+    "category_id": 1,
+}
+
+
+def filter_combinations():
+    names = list(FILTER_VALUES)
+    for size in range(1, len(names) + 1):
+        for combination in itertools.combinations(names, size):
+            yield {name: FILTER_VALUES[name] for name in combination}
+    yield {"in_stock": False}
+    yield {"in_stock": False, "category_id": 2}
+    yield {"in_stock": False, "created_after": datetime(2024, 1, 1)}
+
+
+class TestProductFilters(MigratedDatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description="",
+                price=float(i),
+                quantity=i % 3,
+                category_id=i % 4,
+                created_at=datetime(2023, 1 + i % 12, 1),
+            )
+            for i in range(48)
+        )
+        await self.session.commit()
+
+    async def query_plan(self, stmt):
+        compiled = stmt.compile(
+            dialect=self.engine.dialect,
+            compile_kwargs={"literal_binds": True},
+        )
+        result = await self.session.execute(
+            text(f"EXPLAIN QUERY PLAN {compiled}")
+        )
+        return [row.detail for row in result]
+
+    async def test_every_filter_combination_uses_an_index(self):
+        for values in filter_combinations():
+            filters = schemas.ProductFilter(**values)
+            for order_by, after in itertools.product(
+                ("id", "price"), ({}, {"after_id": 10, "after_price": 10.0})
+            ):
+                stmt = crud.product_page_stmt(
+                    limit=10, order_by=order_by, filters=filters, **after
+                )
+                plan = await self.query_plan(stmt)
+                with self.subTest(order_by=order_by, after=after, **values):
+                    # Every page either searches an index or walks a
+                    # partial stock index that holds only matching rows;
+                    # walking the table or the whole price index and
+                    # discarding rows costs the catalog on sparse pages.
+                    step = next(s for s in plan if " products" in s)
+                    self.assertTrue(
+                        step.startswith("SEARCH products")
+                        or "_stock_" in step,
+                        plan,
+                    )
+
+    async def test_sort_order_serves_id_pages(self):
+        cases = {
+            "category_id": (
+                {"category_id": 2},
+                "SEARCH products USING INDEX ix_products_category_id_id "
+                "(category_id=? AND id>?)",
+            ),
+            # Past a cursor, a single range filter follows the rowid: the
+            # cursor bounds the search and matching rows come in order.
+            "min_price": (
+                {"min_price": 1.0},
+                "SEARCH products USING INTEGER PRIMARY KEY (rowid>?)",
+            ),
+            "created_after": (
+                {"created_after": datetime(2023, 1, 1)},
+                "SEARCH products USING INTEGER PRIMARY KEY (rowid>?)",
+            ),
+        }
+        for name, (values, expected) in cases.items():
+            stmt = crud.product_page_stmt(
+                limit=10,
+                filters=schemas.ProductFilter(**values),
+                after_id=10,
+            )
+            with self.subTest(name):
+                self.assertEqual(await self.query_plan(stmt), [expected])
+
+    async def test_filters_compose(self):
+        async with self.client() as client:
+            response = await client.get(
+                "/products/",
+                params={
+                    "category_id": 2,
+                    "max_price": 30,
+                    "in_stock": True,
+                    "per_page": 100,
+                },
+            )
+        products = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(products)
+        for product in products:
+            self.assertEqual(product["category_id"], 2)
+            self.assertLessEqual(product["price"], 30)
+            self.assertGreater(product["quantity"], 0)
+
+    async def test_filters_with_cursor(self):
+        params = {"min_price": 10, "in_stock": True, "limit": 5}
+        seen = []
+        async with self.client() as client:
+            while True:
+                page = (await client.get("/products/", params=params)).json()
+                seen.extend(product["id"] for product in page["items"])
+                if page["next_cursor"] is None:
+                    break
+                params["cursor"] = page["next_cursor"]
+
+        expected = [i + 1 for i in range(10, 48) if i % 3]
+        self.assertEqual(seen, expected)
+
+    async def test_new_products_get_their_own_creation_time(self):
+        async with self.client() as client:
+            first = (await client.post("/products/", json=NEW)).json()
+            second = (
+                await client.post("/products/", json=dict(NEW, name="Later"))
+            ).json()
+            after = await client.get(
+                "/products/", params={"created_after": first["created_at"]}
+            )
+
+        self.assertLess(first["created_at"], second["created_at"])
+        self.assertEqual([p["id"] for p in after.json()], [second["id"]])
@@ -0,0 +1,58 @@
+from app.models.models import Category
+from app.tests.utils import DatabaseTestCase
+
+CSV_FILE = b"""name,description,price,quantity,category_id,category
+Chair,Wooden,10.5,3,1,
+Desk,Oak,99,1,,Furniture
+Lamp,Bright,-2,5,1,
+Rug,Wool,20,2,,Garden
+Shelf,Pine,35,4,1,
+"""
+
+NDJSON_FILE = (
+    b'{"name": "Chair", "description": "Wooden", "price": 12, '
+    b'"quantity": 3, "category_id": 1}\n'
+    b"not json\n"
+    b"\n"
+    b'{"name": "Stool", "description": "Tall", "price": 7, '
+    b'"quantity": 2, "category_id": "Furniture"}\n'
+)
+
+
+class TestImport(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add(Category(id=1, name="Furniture"))
+        await self.session.commit()
+
+    async def upload(self, name, content, **params):
+        async with self.client() as client:
+            return await client.post(
+                "/products/import",
+                params=params,
+                files={"file": (name, content)},
+            )
+
+    async def test_csv_in_chunks(self):
+        response = await self.upload("supplier.csv", CSV_FILE, chunk_size=2)
+        data = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["processed"], 5)
+        self.assertEqual(data["imported"], 3)
+        self.assertEqual(data["chunks"], 2)
+        self.assertEqual(
+            [error["line"] for error in data["errors"]], [4, 5]
+        )
+
+    async def test_ndjson(self):
+        response = await self.upload("supplier.ndjson", NDJSON_FILE)
+        data = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((data["imported"], data["failed"]), (2, 1))
+        self.assertEqual(data["errors"][0]["line"], 2)
+
+    async def test_unknown_format(self):
+        response = await self.upload("supplier.xlsx", b"")
+        self.assertEqual(response.status_code, 400)
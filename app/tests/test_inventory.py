@@ -0,0 +1,122 @@
+import asyncio
+
+from app import crud
+from app.models.models import Product
+from app.services.inventory import InsufficientStock
+from app.tests.utils import DatabaseTestCase, MigratedDatabaseTestCase
+
+
+class TestReservations(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add_all(
+            Product(
+                id=i,
+                name=f"Product {i}",
+                description="",
+                price=10,
+                quantity=5,
+                category_id=1,
+            )
+            for i in (1, 2)
+        )
+        await self.session.commit()
+
+    async def quantities(self):
+        rows = await self.session.execute(
+            Product.__table__.select().order_by(Product.id)
+        )
+        return [row.quantity for row in rows]
+
+    async def test_reserve_and_release_one_product(self):
+        async with self.client() as client:
+            reserved = await client.post(
+                "/products/1/reserve", json={"quantity": 3}
+            )
+            released = await client.post(
+                "/products/1/release", json={"quantity": 1}
+            )
+
+        self.assertEqual(reserved.json(), {"product_id": 1, "remaining": 2})
+        self.assertEqual(released.json(), {"product_id": 1, "remaining": 3})
+
+    async def test_insufficient_stock(self):
+        async with self.client() as client:
+            response = await client.post(
+                "/products/1/reserve", json={"quantity": 6}
+            )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["detail"]["available"], 5)
+        self.assertEqual(await self.quantities(), [5, 5])
+
+    async def test_cart_is_all_or_nothing(self):
+        cart = {
+            "items": [
+                {"product_id": 1, "quantity": 2},
+                {"product_id": 2, "quantity": 4},
+                {"product_id": 2, "quantity": 2},
+            ]
+        }
+        async with self.client() as client:
+            response = await client.post("/products/reserve", json=cart)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["detail"]["product_id"], 2)
+        self.assertEqual(response.json()["detail"]["requested"], 6)
+        self.assertEqual(await self.quantities(), [5, 5])
+
+    async def test_cart(self):
+        cart = {
+            "items": [
+                {"product_id": 2, "quantity": 1},
+                {"product_id": 1, "quantity": 5},
+            ]
+        }
+        async with self.client() as client:
+            reserved = await client.post("/products/reserve", json=cart)
+            await client.post("/products/release", json=cart)
+
+        self.assertEqual(
+            reserved.json()["items"],
+            [
+                {"product_id": 1, "remaining": 0},
+                {"product_id": 2, "remaining": 4},
+            ],
+        )
+        self.assertEqual(await self.quantities(), [5, 5])
+
+    async def test_unknown_product(self):
+        cart = {"items": [{"product_id": 99, "quantity": 1}]}
+        async with self.client() as client:
+            response = await client.post("/products/reserve", json=cart)
+            invalid = await client.post(
+                "/products/1/reserve", json={"quantity": 0}
+            )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(invalid.status_code, 422)
+
+
+class TestConcurrentReservations(MigratedDatabaseTestCase):
+    async def test_hot_product_never_oversells(self):
+        self.session.add(
+            Product(id=1, name="Hot", description="", price=1, quantity=50)
+        )
+        await self.session.commit()
+
+        async def reserve():
+            async with self.session_factory() as session:
+                try:
+                    await crud.reserve_stock(session, {1: 1})
+                    return True
+                except InsufficientStock:
+                    return False
+
+        outcomes = await asyncio.gather(*(reserve() for _ in range(80)))
+
+        self.assertEqual(outcomes.count(True), 50)
+        product = await crud.get_product_by_id(self.session, 1)
+        await self.session.refresh(product)
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(product.version, 51)
@@ -6,11 +6,14 @@ from starlette import status
 
 from app import main
 from app.serializers import schemas
+from app.services.cache import category_cache, product_cache
 
 
 class TestProductManagement(unittest.TestCase):
     def setUp(self):
         self.client = TestClient(main.app)
+        product_cache.clear()
+        category_cache.clear()
 
     def tearDown(self):
         self.client = None
@@ -0,0 +1,107 @@
+import unittest
+
+import httpx
+from fastapi import FastAPI
+
+from app import crud
+from app.models.models import Category, Product
+from app.services.metrics import (
+    Histogram,
+    Metrics,
+    MetricsMiddleware,
+    TimedRoute,
+    metrics,
+    statement_label,
+)
+from app.tests.utils import DatabaseTestCase
+
+
+class TestStatementLabel(unittest.TestCase):
+    def test_collapses_in_lists_and_whitespace(self):
+        a = statement_label("SELECT id\n  FROM products WHERE id IN (?, ?)")
+        b = statement_label("SELECT id FROM products WHERE id IN (?,?,?)")
+        self.assertEqual(a, b)
+        self.assertEqual(a, "SELECT id FROM products WHERE id IN (?)")
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram("h", "Help.", ("route",), buckets=(1, 2))
+        for value in (0.5, 1.5, 3):
+            histogram.observe(value, "/a")
+        lines = histogram.render()
+        self.assertIn('h_bucket{route="/a",le="1"} 1', lines)
+        self.assertIn('h_bucket{route="/a",le="2"} 2', lines)
+        self.assertIn('h_bucket{route="/a",le="+Inf"} 3', lines)
+        self.assertIn('h_count{route="/a"} 3', lines)
+
+
+class TestRequestMetrics(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        metrics.clear()
+        self.session.add(Category(id=1, name="Tools"))
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description="",
+                price=i,
+                quantity=1,
+                category_id=1,
+            )
+            for i in range(3)
+        )
+        await self.session.commit()
+
+    async def test_server_timing(self):
+        async with self.client() as client:
+            response = await client.get("/products/")
+
+        timing = response.headers["server-timing"]
+        for name in ("db;", "handler;", "serialize;", "total;"):
+            self.assertIn(name, timing)
+        self.assertNotIn('desc="0 queries"', timing)
+
+    async def test_route_histograms(self):
+        async with self.client() as client:
+            await client.get("/products/1")
+            await client.get("/products/2")
+            response = await client.get("/metrics")
+
+        self.assertEqual(
+            metrics.request_seconds.count("GET", "/products/{product_id}"), 2
+        )
+        self.assertGreaterEqual(
+            metrics.requests.value("GET", "/products/{product_id}", "200"), 2
+        )
+        self.assertIn(
+            'http_request_sql_statements_count{method="GET",'
+            'route="/products/{product_id}"} 2',
+            response.text,
+        )
+        self.assertIn("db_statement_duration_seconds_bucket", response.text)
+
+    async def test_statement_limit(self):
+        registry = Metrics()
+        app = FastAPI()
+        app.router.route_class = TimedRoute
+        app.add_middleware(
+            MetricsMiddleware, registry=registry, statement_limit=2
+        )
+
+        @app.get("/products")
+        async def read_one_by_one():
+            # One query per product, the pattern the limit is there to catch.
+            for product_id in (1, 2, 3):
+                await crud.get_product_by_id(self.session, product_id)
+            return {}
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as c:
+            with self.assertLogs("app.services.metrics", "WARNING") as logs:
+                await c.get("/products")
+
+        # The three reads plus the BEGIN that opened the transaction.
+        self.assertIn("ran 4 SQL statements", logs.output[0])
+        self.assertEqual(
+            registry.statement_limit_exceeded.value("GET", "/products"), 1
+        )
@@ -0,0 +1,102 @@
+import unittest
+
+from app.models.models import Product
+from app.services.pagination import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+)
+from app.services.product_service import ProductService
+from app.tests.utils import DatabaseTestCase
+
+
+class TestCursorEncoding(unittest.TestCase):
+    def test_round_trip(self):
+        payload = {"o": "price", "id": 7, "price": 9.5}
+        self.assertEqual(decode_cursor(encode_cursor(payload)), payload)
+
+    def test_garbage_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor("not-a-cursor")
+
+
+class TestKeysetPagination(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        prices = [5, None, 3, 5, 1, None, 3, 2, 5, 4]
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description="",
+                price=price,
+                quantity=1,
+                category_id=1,
+            )
+            for i, price in enumerate(prices)
+        )
+        await self.session.commit()
+        self.service = ProductService()
+
+    async def walk(self, order_by):
+        seen, cursor = [], None
+        while True:
+            products, cursor = await self.service.get_products_page(
+                db=self.session, limit=3, cursor=cursor, order_by=order_by
+            )
+            seen.extend(products)
+            if cursor is None:
+                return seen
+
+    async def test_walk_by_id(self):
+        products = await self.walk("id")
+        self.assertEqual([p.id for p in products], list(range(1, 11)))
+
+    async def test_walk_by_price(self):
+        products = await self.walk("price")
+        expected = sorted(
+            products,
+            key=lambda p: (p.price is not None, p.price or 0, p.id),
+        )
+        self.assertEqual(len(products), 10)
+        self.assertEqual(
+            [p.id for p in products], [p.id for p in expected]
+        )
+
+    async def test_cursor_order_mismatch(self):
+        _, cursor = await self.service.get_products_page(
+            db=self.session, limit=3, order_by="id"
+        )
+        with self.assertRaises(InvalidCursor):
+            await self.service.get_products_page(
+                db=self.session, limit=3, cursor=cursor, order_by="price"
+            )
+
+    async def test_malformed_cursor_is_a_bad_request(self):
+        async with self.client() as client:
+            for position in (
+                {"o": "id", "id": [1]},
+                {"o": "id", "id": "x"},
+                {"o": "id", "id": None},
+                {"o": "id", "id": 1.5},
+                {"o": "id"},
+                {"o": "price", "id": 1, "price": "5"},
+            ):
+                response = await client.get(
+                    "/products/",
+                    params={
+                        "cursor": encode_cursor(position),
+                        "order_by": position["o"],
+                    },
+                )
+                self.assertEqual(response.status_code, 400, position)
+            ok = await client.get(
+                "/products/",
+                params={
+                    "cursor": encode_cursor(
+                        {"o": "price", "id": 2, "price": None}
+                    ),
+                    "order_by": "price",
+                },
+            )
+
+        self.assertEqual(ok.status_code, 200)
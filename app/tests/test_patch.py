@@ -0,0 +1,117 @@
+from sqlalchemy import event
+
+from app.models.models import Category, Product
+from app.tests.utils import DatabaseTestCase
+
+
+class TestSingleStatementWrites(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add_all(
+            [Category(id=1, name="Tools"), Category(id=2, name="Garden")]
+        )
+        self.session.add(
+            Product(
+                id=1,
+                name="Hammer",
+                description="Steel",
+                price=10,
+                quantity=5,
+                category_id=1,
+            )
+        )
+        await self.session.commit()
+        self.statements = []
+
+        @event.listens_for(self.engine.sync_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, many):
+            self.statements.append(statement.split()[0].upper())
+
+    def data_statements(self):
+        return [s for s in self.statements if s not in ("BEGIN", "COMMIT")]
+
+    async def test_patch_changes_only_given_fields(self):
+        async with self.client() as client:
+            response = await client.patch("/products/1", json={"price": 12.5})
+
+        self.assertEqual(response.status_code, 200)
+        product = response.json()
+        self.assertEqual(product["price"], 12.5)
+        self.assertEqual(product["name"], "Hammer")
+        self.assertEqual(product["quantity"], 5)
+        self.assertEqual(product["version"], 2)
+        self.assertEqual(self.data_statements(), ["UPDATE"])
+
+    async def test_patch_missing_product(self):
+        async with self.client() as client:
+            response = await client.patch("/products/99", json={"price": 1})
+
+        self.assertEqual(response.status_code, 404)
+
+    async def test_rename_to_a_taken_name_conflicts(self):
+        body = {
+            "name": "Mallet",
+            "description": "",
+            "price": 1,
+            "quantity": 1,
+            "category_id": 1,
+        }
+        async with self.client() as client:
+            await client.post("/products/", json=body)
+            patched = await client.patch(
+                "/products/1", json={"name": "Mallet"}
+            )
+            put = await client.put("/products/1", json=body)
+            created = await client.post("/products/", json=body)
+            unchanged = await client.get("/products/1")
+
+        self.assertEqual(patched.status_code, 409)
+        self.assertEqual(put.status_code, 409)
+        self.assertEqual(created.status_code, 409)
+        self.assertEqual(unchanged.json()["name"], "Hammer")
+
+    async def test_patch_rejects_null_and_invalid_price(self):
+        async with self.client() as client:
+            null = await client.patch("/products/1", json={"name": None})
+            free = await client.patch("/products/1", json={"price": 0})
+
+        self.assertEqual(null.status_code, 422)
+        self.assertEqual(free.status_code, 400)
+
+    async def test_empty_patch_keeps_version(self):
+        async with self.client() as client:
+            response = await client.patch("/products/1", json={})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 1)
+
+    async def test_put_is_one_statement(self):
+        body = {
+            "name": "Mallet",
+            "description": "Rubber",
+            "price": 8,
+            "quantity": 2,
+            "category_id": 2,
+        }
+        async with self.client() as client:
+            response = await client.put("/products/1", json=body)
+            missing = await client.put("/products/99", json=body)
+
+        self.assertEqual(response.json()["category_id"], 2)
+        self.assertEqual(response.json()["version"], 2)
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(self.data_statements(), ["UPDATE", "UPDATE"])
+
+    async def test_delete_is_one_statement(self):
+        async with self.client() as client:
+            await client.get("/products/1")
+            deleted = await client.delete("/products/1")
+            again = await client.delete("/products/1")
+            read = await client.get("/products/1")
+
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(again.status_code, 404)
+        self.assertEqual(read.status_code, 404)
+        self.assertEqual(
+            self.data_statements(), ["SELECT", "DELETE", "DELETE", "SELECT"]
+        )
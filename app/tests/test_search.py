@@ -0,0 +1,120 @@
+from sqlalchemy import text
+
+from app import crud
+from app.models.models import Product
+from app.services.pagination import encode_cursor
+from app.tests.utils import MigratedDatabaseTestCase
+
+PRODUCTS = [
+    ("Claw hammer", "Steel hammer for framing"),
+    ("Sledgehammer", "Heavy hammer"),
+    ("Hamper", "Wicker laundry basket"),
+    ("Screwdriver", "Flat head, hammer-proof handle"),
+    ("Wrench", "Adjustable"),
+    ("<b>Bold</b> clamp", "Grips & holds"),
+]
+
+
+class TestSearch(MigratedDatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add_all(
+            Product(
+                name=name,
+                description=description,
+                price=1,
+                quantity=1,
+                category_id=1,
+            )
+            for name, description in PRODUCTS
+        )
+        await self.session.commit()
+
+    async def search(self, client, **params):
+        response = await client.get("/products/search", params=params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    async def test_ranked_results_with_snippets(self):
+        async with self.client() as client:
+            data = await self.search(client, q="hammer", prefix=False)
+
+        names = [hit["name"] for hit in data["items"]]
+        self.assertEqual(names[0], "Claw hammer")
+        self.assertEqual(
+            set(names), {"Claw hammer", "Sledgehammer", "Screwdriver"}
+        )
+        self.assertIn("<mark>", data["items"][0]["snippet"])
+
+    async def test_snippet_text_is_escaped(self):
+        async with self.client() as client:
+            data = await self.search(client, q="clamp")
+
+        self.assertEqual(
+            data["items"][0]["snippet"],
+            "&lt;b&gt;Bold&lt;/b&gt; <mark>clamp</mark>",
+        )
+
+    async def test_malformed_cursor(self):
+        valid = {"o": "search", "q": '"ham"*', "score": -1.0, "id": 1}
+        async with self.client() as client:
+            for position in (
+                {k: v for k, v in valid.items() if k != "score"},
+                {**valid, "id": "1"},
+                {**valid, "score": None},
+                {**valid, "q": '"hammer"*'},
+            ):
+                response = await client.get(
+                    "/products/search",
+                    params={"q": "ham", "cursor": encode_cursor(position)},
+                )
+                self.assertEqual(response.status_code, 400, position)
+            ok = await client.get(
+                "/products/search",
+                params={"q": "ham", "cursor": encode_cursor(valid)},
+            )
+
+        self.assertEqual(ok.status_code, 200)
+
+    async def test_prefix(self):
+        async with self.client() as client:
+            data = await self.search(client, q="ham")
+
+        self.assertIn("Hamper", [hit["name"] for hit in data["items"]])
+
+    async def test_cursor_pagination(self):
+        async with self.client() as client:
+            first = await self.search(client, q="ham", limit=2)
+            second = await self.search(
+                client, q="ham", limit=2, cursor=first["next_cursor"]
+            )
+
+        ids = [hit["id"] for hit in first["items"] + second["items"]]
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(len(set(ids)), 4)
+        self.assertIsNone(second["next_cursor"])
+
+    async def test_triggers_keep_index_in_sync(self):
+        product = await self.session.get(Product, 5)
+        product.name = "Torque wrench"
+        product.description = "Calibrated"
+        await self.session.delete(await self.session.get(Product, 1))
+        await self.session.commit()
+
+        async with self.client() as client:
+            calibrated = await self.search(client, q="calibrated")
+            claw = await self.search(client, q="claw")
+
+        self.assertEqual([hit["id"] for hit in calibrated["items"]], [5])
+        self.assertEqual(claw["items"], [])
+
+    async def test_rebuild(self):
+        await crud.rebuild_search_index(db=self.session)
+        await self.session.commit()
+        count = await self.session.scalar(
+            text(
+                "SELECT count(*) FROM products_fts "
+                "WHERE products_fts MATCH 'wrench'"
+            )
+        )
+        self.assertEqual(count, 1)
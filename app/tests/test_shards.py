@@ -0,0 +1,257 @@
+import unittest
+
+from sqlalchemy import select
+
+from app import main
+from app.database.engine import create_engine
+from app.database.shards import ShardRouter, shard_urls
+from app.models.models import Category, Product
+from app.serializers import schemas
+from app.services.inventory import InsufficientStock
+from app.services.pagination import PageTooDeep
+from app.services.sharded_product_service import (
+    ShardedProductService,
+    ShardedStatsService,
+)
+from app.tests.utils import MigratedDatabaseTestCase, migrate
+
+SHARDS = 3
+
+
+def product(name: str, price: float = 10, quantity: int = 5):
+    return schemas.ProductCreate(
+        name=name,
+        description="",
+        price=price,
+        quantity=quantity,
+        category_id=1,
+    )
+
+
+class TestShardUrls(unittest.TestCase):
+    def test_urls(self):
+        self.assertEqual(
+            shard_urls("sqlite+aiosqlite:///./data/products.db", 3),
+            [
+                "sqlite+aiosqlite:///./data/products.db",
+                "sqlite+aiosqlite:///./data/products.shard1.db",
+                "sqlite+aiosqlite:///./data/products.shard2.db",
+            ],
+        )
+        with self.assertRaises(ValueError):
+            shard_urls("sqlite+aiosqlite://", 2)
+
+
+class TestShardedProducts(MigratedDatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        urls = shard_urls(
+            f"sqlite+aiosqlite:///{self.database_path}", SHARDS
+        )
+        engines = []
+        for url in urls:
+            if url != urls[0]:
+                migrate(url.split("///", 1)[1])
+            engines.append(
+                (
+                    create_engine(url, pool_size=1, max_overflow=0),
+                    create_engine(
+                        url, pool_size=2, max_overflow=0, read_only=True
+                    ),
+                )
+            )
+        self.router = ShardRouter(engines)
+        self.service = ShardedProductService(self.router)
+        for write, read in engines:
+            self.addAsyncCleanup(write.dispose)
+            self.addAsyncCleanup(read.dispose)
+        self.session.add(Category(id=1, name="Tools"))
+        await self.session.commit()
+        # What get_db hands the service when storage is partitioned.
+        self.db = self.router.sessions[0]()
+        self.addAsyncCleanup(self.db.close)
+
+    async def create(self, count: int, **options):
+        return [
+            await self.service.create_product(
+                db=self.db, product=product(f"Product {i}", **options)
+            )
+            for i in range(count)
+        ]
+
+    async def shard_ids(self):
+        async def ids(session, shard):
+            return (await session.scalars(select(Product.id))).all()
+
+        return await self.router.fan_out(ids)
+
+    async def test_products_live_on_the_shard_of_their_id(self):
+        created = await self.create(12)
+
+        shard_ids = await self.shard_ids()
+        for shard, ids in enumerate(shard_ids):
+            self.assertTrue(all(i % SHARDS == shard for i in ids))
+        self.assertEqual(
+            sorted(i for ids in shard_ids for i in ids),
+            sorted(p.id for p in created),
+        )
+        # Every shard got some of the writes.
+        self.assertTrue(all(shard_ids))
+        for p in created:
+            self.assertEqual(
+                p.id % SHARDS, self.router.shard_for_name(p.name)
+            )
+
+    async def test_point_reads_and_writes(self):
+        first, second = await self.create(2)
+
+        patched = await self.service.patch_product(
+            db=self.db,
+            product_id=second.id,
+            product=schemas.ProductPatch(price=99),
+        )
+        deleted = await self.service.delete_product(
+            db=self.db, product_id=first.id
+        )
+        found = await self.service.get_product_by_id(
+            db=self.db, product_id=second.id
+        )
+        gone = await self.service.get_product_by_id(
+            db=self.db, product_id=first.id
+        )
+
+        self.assertEqual((patched.price, patched.version), (99, 2))
+        self.assertTrue(deleted)
+        self.assertEqual(found.price, 99)
+        self.assertIsNone(gone)
+
+    async def test_lists_merge_across_shards(self):
+        created = await self.create(10)
+        prices = {p.id: 100 - i % 4 for i, p in enumerate(created)}
+        for product_id, price in prices.items():
+            await self.service.patch_product(
+                db=self.db,
+                product_id=product_id,
+                product=schemas.ProductPatch(price=price),
+            )
+        by_price = sorted(prices, key=lambda i: (prices[i], i))
+
+        page = await self.service.get_all_products(
+            db=self.db, offset=2, limit=5, order_by="price"
+        )
+        self.assertEqual([row.id for row in page], by_price[2:7])
+
+        with self.assertRaises(PageTooDeep):
+            await ShardedProductService(
+                self.router, max_offset=4
+            ).get_all_products(db=self.db, offset=5, limit=5)
+
+        ids, cursor = [], None
+        while True:
+            rows, cursor = await self.service.get_products_page(
+                db=self.db, limit=3, cursor=cursor
+            )
+            ids.extend(row.id for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(ids, sorted(p.id for p in created))
+
+    async def test_export_and_batch_lookup(self):
+        created = await self.create(7)
+        ids = sorted(p.id for p in created)
+
+        partitions = self.service.export_products(
+            db=self.db, batch_size=3, fields=["name"]
+        )
+        rows = [row async for rows in partitions for row in rows]
+        found, missing = await self.service.get_products_by_ids(
+            db=self.db, ids=ids[::-1] + [1000]
+        )
+
+        by_id = {p.id: p.name for p in created}
+        self.assertEqual(
+            [row._asdict() for row in rows],
+            [{"name": by_id[i]} for i in ids],
+        )
+        self.assertEqual(list(found), ids[::-1])
+        self.assertEqual(missing, [1000])
+
+    async def test_failed_cart_is_undone_on_every_shard(self):
+        created = await self.create(6, quantity=2)
+        one_per_shard = {p.id % SHARDS: p for p in created}
+        cart = [
+            schemas.StockChangeItem(product_id=p.id, quantity=2)
+            for _, p in sorted(one_per_shard.items())
+        ]
+        # The last shard runs out after the others have reserved.
+        cart[-1].quantity = 3
+
+        with self.assertRaises(InsufficientStock):
+            await self.service.reserve_stock(db=self.db, items=cart)
+
+        found, _ = await self.service.get_products_by_ids(
+            db=self.db, ids=[item.product_id for item in cart]
+        )
+        self.assertEqual([p["quantity"] for p in found.values()], [2, 2, 2])
+
+    async def test_bulk_upsert_updates_where_the_name_lives(self):
+        (existing,) = await self.create(1)
+        renamed = await self.service.update_product(
+            db=self.db,
+            product_id=existing.id,
+            product=schemas.ProductUpdate(**product("Renamed").dict()),
+        )
+
+        results = await self.service.bulk_upsert_products(
+            db=self.db,
+            products=[product("Renamed", price=5), product("New")],
+        )
+
+        self.assertEqual(results["Renamed"], (renamed.id, False))
+        new_id, created = results["New"]
+        self.assertTrue(created)
+        self.assertEqual(new_id % SHARDS, self.router.shard_for_name("New"))
+        self.assertEqual(sum(map(len, await self.shard_ids())), 2)
+
+    async def test_stats_add_up_across_shards(self):
+        await self.create(9, quantity=2)
+
+        stats = await ShardedStatsService(self.router).get_catalog_stats(
+            db=self.db
+        )
+
+        self.assertEqual(stats.totals.product_count, 9)
+        (category,) = stats.categories
+        self.assertEqual(
+            (category.category_id, category.total_quantity), (1, 18)
+        )
+
+    async def test_http_routes(self):
+        main.product_service, original = self.service, main.product_service
+        self.addCleanup(setattr, main, "product_service", original)
+        async with self.client() as client:
+            for i in range(4):
+                await client.post(
+                    "/products/", json=product(f"P{i}", price=4 - i).dict()
+                )
+            listed = await client.get("/products/?order_by=price")
+            one = await client.get(f"/products/{listed.json()[0]['id']}")
+            too_deep = await client.get("/products/?page=1000&per_page=100")
+
+        self.assertEqual(
+            [p["name"] for p in listed.json()], ["P3", "P2", "P1", "P0"]
+        )
+        self.assertEqual(one.json()["name"], "P3")
+        self.assertEqual(too_deep.status_code, 400)
+
+    async def test_bulk_delete_reaches_every_shard(self):
+        await self.create(10)
+
+        deleted = await self.service.delete_products(
+            db=self.db,
+            filters=schemas.ProductFilter(category_id=1),
+            batch_size=2,
+        )
+
+        self.assertEqual(deleted, 10)
+        self.assertEqual(await self.shard_ids(), [[], [], []])
@@ -0,0 +1,217 @@
+import asyncio
+import mmap
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, main
+from app.database.engine import create_engine
+from app.models.models import Category, Product
+from app.services import snapshot
+from app.services.maintenance import reclaim_free_pages
+from app.services.pagination import encode_cursor
+from app.services.snapshot import CatalogSnapshot
+from app.tests.utils import MigratedDatabaseTestCase
+
+
+def temporary_path(test: unittest.TestCase) -> str:
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    return os.path.join(directory.name, "products.snapshot")
+
+
+class TestSnapshotFile(unittest.TestCase):
+    def test_round_trip(self):
+        path = temporary_path(self)
+        products = [
+            {"id": 1, "name": "Saw", "version": 2},
+            {"id": 3, "name": "Ruler", "version": 1},
+        ]
+        snapshot.write_snapshot(
+            path, products, [{"id": 1, "name": "Tools", "version": 1}], 7, 1.0
+        )
+
+        with open(path, "rb") as f:
+            current = snapshot.Snapshot(
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            )
+
+        self.assertEqual(current.change_seq, 7)
+        self.assertEqual(
+            current.products.get(3), (1, orjson.dumps(products[1]))
+        )
+        self.assertIsNone(current.products.get(2))
+        self.assertEqual(
+            orjson.loads(current.products.json_array(0, 2)), products
+        )
+        self.assertEqual(current.products.json_array(2, 2), b"[]")
+        self.assertEqual(current.products.index_after(1), 1)
+        self.assertEqual(current.categories.get(1)[0], 1)
+
+    def test_rows_written_in_batches(self):
+        path = temporary_path(self)
+        writer = snapshot.SnapshotWriter(path)
+        products = [
+            {"id": i, "name": f"Product {i}", "version": 1}
+            for i in range(1, 2 * snapshot.SPILL_SIZE + 100)
+        ]
+        for start in range(0, len(products), 1000):
+            writer.write_rows(products[start : start + 1000])
+        writer.next_table()
+        writer.write_rows([{"id": 1, "name": "Tools", "version": 1}])
+        writer.finish(3, 1.0)
+
+        with open(path, "rb") as f:
+            current = snapshot.Snapshot(
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            )
+
+        self.assertEqual(len(current.products), len(products))
+        self.assertEqual(
+            orjson.loads(current.products.json_array(0, len(products))),
+            products,
+        )
+        self.assertEqual(
+            current.products.get(9000), (1, orjson.dumps(products[8999]))
+        )
+        self.assertEqual(len(current.categories), 1)
+        self.assertEqual(
+            os.listdir(os.path.dirname(path)), ["products.snapshot"]
+        )
+
+    def test_unreadable_file_is_ignored(self):
+        path = temporary_path(self)
+        with open(path, "wb") as f:
+            f.write(b"not a snapshot" * 10)
+
+        self.assertIsNone(CatalogSnapshot(path, 0, enabled=True).current())
+
+    def test_one_builder_per_path(self):
+        path = temporary_path(self)
+        first = snapshot.acquire_builder_lock(path)
+        self.assertIsNotNone(first)
+        self.assertIsNone(snapshot.acquire_builder_lock(path))
+        first.close()
+        second = snapshot.acquire_builder_lock(path)
+        self.assertIsNotNone(second)
+        second.close()
+
+
+class TestSnapshotReads(MigratedDatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add(Category(id=1, name="Tools"))
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description="",
+                price=i,
+                quantity=i,
+                category_id=1,
+            )
+            for i in range(1, 6)
+        )
+        await self.session.commit()
+        self.path = temporary_path(self)
+        self.catalog = CatalogSnapshot(self.path, 0, enabled=True)
+        main.catalog_snapshot, original = self.catalog, main.catalog_snapshot
+        self.addCleanup(setattr, main, "catalog_snapshot", original)
+        engine = create_engine(
+            f"sqlite+aiosqlite:///{self.database_path}",
+            pool_size=1,
+            max_overflow=0,
+            read_only=True,
+        )
+        self.addAsyncCleanup(engine.dispose)
+        self.read_session = sessionmaker(engine, class_=AsyncSession)
+
+    def queries(self, response) -> str:
+        return response.headers["server-timing"].split('desc="')[1]
+
+    async def test_reads_come_from_the_snapshot(self):
+        await snapshot.build_snapshot(self.read_session, self.path)
+        async with self.client() as client:
+            product = await client.get("/products/2")
+            category = await client.get("/categories/1")
+            first = await client.get("/products/?limit=2")
+            second = await client.get(
+                f"/products/?limit=2&cursor={first.json()['next_cursor']}"
+            )
+            page = await client.get("/products/?page=3&per_page=2")
+            self.catalog.enabled = False
+            from_db = await client.get("/products/?page=3&per_page=2")
+
+        for response in (product, category, first, second, page):
+            self.assertTrue(self.queries(response).startswith("0 queries"))
+        self.assertEqual(product.json()["name"], "Product 2")
+        self.assertEqual(category.json()["name"], "Tools")
+        self.assertEqual([p["id"] for p in second.json()["items"]], [3, 4])
+        self.assertEqual(page.json(), from_db.json())
+        self.assertEqual(page.headers["etag"], from_db.headers["etag"])
+        self.assertEqual(self.catalog.stats()["products"], 5)
+
+    async def test_malformed_cursor_is_a_bad_request(self):
+        await snapshot.build_snapshot(self.read_session, self.path)
+        async with self.client() as client:
+            responses = [
+                await client.get(
+                    "/products/", params={"cursor": encode_cursor(position)}
+                )
+                for position in (
+                    {"o": "id", "id": "x"},
+                    {"o": "id", "id": [1]},
+                    {"o": "id", "id": 1.5},
+                )
+            ]
+
+        for response in responses:
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(self.queries(response).startswith("0 queries"))
+
+    async def test_own_writes_are_read_from_the_database(self):
+        await snapshot.build_snapshot(self.read_session, self.path)
+        async with self.client() as client:
+            await client.patch("/products/1", json={"price": 42})
+            stale = await client.get("/products/1")
+            await snapshot.build_snapshot(self.read_session, self.path)
+            rebuilt = await client.get("/products/1")
+
+        self.assertEqual(stale.json()["price"], 42)
+        self.assertFalse(self.queries(stale).startswith("0 queries"))
+        self.assertEqual(rebuilt.json()["price"], 42)
+        self.assertTrue(self.queries(rebuilt).startswith("0 queries"))
+
+    async def test_maintenance_keeps_the_snapshot_in_use(self):
+        await snapshot.build_snapshot(self.read_session, self.path)
+        await reclaim_free_pages(self.session_factory, 1)
+        async with self.session_factory() as db:
+            await crud.compact_changes(db=db, before=datetime.utcnow())
+            await db.commit()
+
+        self.assertIsNotNone(self.catalog.current())
+
+    async def test_builder_follows_the_change_log(self):
+        builder = asyncio.ensure_future(
+            snapshot.maintain_snapshot(self.read_session, self.path, 0.01)
+        )
+        self.addAsyncCleanup(self.stop, builder)
+        async with self.client() as client:
+            await client.post("/categories", json={"name": "Garden"})
+            for _ in range(200):
+                current = self.catalog.current()
+                if current is not None and len(current.categories) == 2:
+                    break
+                await asyncio.sleep(0.01)
+            response = await client.get("/categories/2")
+
+        self.assertEqual(response.json()["name"], "Garden")
+        self.assertTrue(self.queries(response).startswith("0 queries"))
+
+    async def stop(self, task: asyncio.Task):
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,96 @@
+from sqlalchemy import delete, update
+
+from app import crud
+from app.models.models import Category, CategoryStats, Product
+from app.tests.utils import MigratedDatabaseTestCase
+
+
+class TestCategoryStats(MigratedDatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add_all(
+            [Category(id=1, name="Tools"), Category(id=2, name="Garden")]
+        )
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description="",
+                price=float(i + 1),
+                quantity=i,
+                category_id=1 + i % 2,
+            )
+            for i in range(10)
+        )
+        await self.session.commit()
+
+    async def assert_consistent(self):
+        self.assertEqual(await crud.verify_category_stats(self.session), [])
+
+    async def test_triggers_track_writes(self):
+        await self.assert_consistent()
+        await self.session.execute(
+            update(Product)
+            .where(Product.id.in_([1, 2]))
+            .values(price=100, quantity=3, category_id=2)
+        )
+        await self.session.execute(delete(Product).where(Product.id == 10))
+        await self.session.execute(
+            update(Product).where(Product.id == 3).values(category_id=None)
+        )
+        await self.session.commit()
+        await self.assert_consistent()
+
+    async def test_endpoints(self):
+        async with self.client() as client:
+            catalog = (await client.get("/stats")).json()
+            tools = (await client.get("/categories/1/stats")).json()
+            missing = await client.get("/categories/99/stats")
+
+        self.assertEqual(catalog["totals"]["product_count"], 10)
+        self.assertEqual(catalog["totals"]["min_price"], 1)
+        self.assertEqual(catalog["totals"]["max_price"], 10)
+        self.assertEqual(
+            catalog["totals"]["inventory_value"],
+            sum((i + 1) * i for i in range(10)),
+        )
+        self.assertEqual(tools["product_count"], 5)
+        self.assertEqual(tools["avg_price"], 5)
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_deleting_category_moves_products(self):
+        async with self.client() as client:
+            await client.delete("/categories/1")
+            catalog = (await client.get("/stats")).json()
+
+        counts = {
+            row["category_id"]: row["product_count"]
+            for row in catalog["categories"]
+        }
+        self.assertEqual(counts, {None: 5, 2: 5})
+        await self.assert_consistent()
+
+    async def test_detached_products_are_served(self):
+        async with self.client() as client:
+            await client.delete("/categories/1")
+            product = await client.get("/products/1")
+            batch = await client.get("/products/batch?ids=1")
+            patched = await client.patch("/products/1", json={"price": 7})
+
+        self.assertEqual(product.status_code, 200)
+        self.assertIsNone(product.json()["category_id"])
+        self.assertIsNone(batch.json()["products"]["1"]["category_id"])
+        self.assertEqual(patched.status_code, 200)
+        self.assertEqual(
+            (patched.json()["price"], patched.json()["category_id"]),
+            (7, None),
+        )
+
+    async def test_rebuild(self):
+        await self.session.execute(
+            update(CategoryStats).values(product_count=0)
+        )
+        self.assertEqual(
+            await crud.verify_category_stats(self.session), [1, 2]
+        )
+        await crud.rebuild_category_stats(self.session)
+        await self.assert_consistent()
@@ -0,0 +1,91 @@
+import asyncio
+
+from app import main
+from app.models.models import Category, Product
+from app.services import warmup
+from app.services.cache import product_cache
+from app.services.metrics import metrics
+from app.services.warmup import readiness
+from app.tests.utils import MigratedDatabaseTestCase
+
+
+class TestWarmUp(MigratedDatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add(Category(id=1, name="Tools"))
+        self.session.add_all(
+            Product(
+                name=f"Product {i}",
+                description="A product",
+                price=i,
+                quantity=i,
+                category_id=1,
+            )
+            for i in range(1, 6)
+        )
+        await self.session.commit()
+        self.addCleanup(setattr, readiness, "ready", readiness.ready)
+        readiness.ready = False
+        metrics.clear()
+        self.addCleanup(metrics.clear)
+
+    def statements(self):
+        return set(metrics.statement_seconds._series)
+
+    async def test_ready_only_after_warm_up(self):
+        release = asyncio.Event()
+
+        async def run_queries():
+            await release.wait()
+
+        task = asyncio.ensure_future(
+            warmup.warm_up([self.engine], run_queries)
+        )
+        async with self.client() as client:
+            await asyncio.sleep(0.01)
+            warming = await client.get("/health/ready")
+            release.set()
+            await task
+            ready = await client.get("/health/ready")
+
+        self.assertEqual(warming.status_code, 503)
+        self.assertEqual(ready.status_code, 200)
+        self.assertEqual(ready.json()["status"], "ready")
+        self.assertIn("warmup_duration_seconds ", metrics.render())
+
+    async def test_failed_warm_up_still_becomes_ready(self):
+        async def run_queries():
+            raise RuntimeError("database unavailable")
+
+        with self.assertLogs("app.services.warmup", "ERROR"):
+            await warmup.warm_up([self.engine], run_queries)
+
+        self.assertTrue(readiness.ready)
+
+    async def test_routes_run_only_warmed_statements(self):
+        await warmup.warm_up(
+            [self.engine], lambda: main.warm_up_queries(db=self.session)
+        )
+        warmed = self.statements()
+        product_cache.clear()
+
+        async with self.client() as client:
+            first = await client.get("/products/?limit=2")
+            for url in (
+                "/products/",
+                "/products/?order_by=price",
+                "/products/?category_id=1",
+                f"/products/?limit=2&cursor={first.json()['next_cursor']}",
+                "/products/search?q=product",
+                "/products/3",
+                "/products/batch?ids=1,2",
+                "/products/?expand=category",
+                "/categories/",
+                "/categories/1/stats",
+                "/stats",
+                "/changes",
+            ):
+                response = await client.get(url)
+                self.assertEqual(response.status_code, 200, url)
+
+        self.assertEqual(self.statements() - warmed, set())
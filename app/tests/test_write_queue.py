@@ -0,0 +1,65 @@
+import asyncio
+
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import Product
+from app.services.write_queue import WriteBatcher
+from app.tests.utils import DatabaseTestCase
+
+
+def insert(name):
+    async def op(session):
+        product = Product(
+            name=name, description="", price=1, quantity=1, category_id=1
+        )
+        session.add(product)
+        await session.flush()
+        return product.id
+
+    return op
+
+
+class TestWriteBatcher(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.commits = 0
+
+        @event.listens_for(self.engine.sync_engine, "commit")
+        def count_commit(conn):
+            self.commits += 1
+
+        self.batcher = WriteBatcher(
+            sessionmaker(
+                self.engine, class_=AsyncSession, expire_on_commit=False
+            ),
+            window=0.05,
+            max_batch=100,
+            enabled=True,
+        )
+
+    async def asyncTearDown(self):
+        await self.batcher.stop()
+        await super().asyncTearDown()
+
+    async def test_concurrent_writes_share_one_commit(self):
+        names = [f"Product {i}" for i in range(10)] + ["Product 3"]
+        results = await asyncio.gather(
+            *(self.batcher.submit(insert(name)) for name in names),
+            return_exceptions=True,
+        )
+
+        self.assertIsInstance(results[-1], IntegrityError)
+        self.assertEqual(sorted(results[:-1]), list(range(1, 11)))
+        self.assertEqual(self.commits, 1)
+        count = await self.session.scalar(select(func.count(Product.id)))
+        self.assertEqual(count, 10)
+
+    async def test_batches_are_bounded(self):
+        self.batcher.max_batch = 4
+        await asyncio.gather(
+            *(self.batcher.submit(insert(f"P{i}")) for i in range(10))
+        )
+        self.assertEqual(self.commits, 3)
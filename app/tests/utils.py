@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+import httpx
+from alembic import command
+from alembic.config import Config
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import main
+from app.database.engine import Base, create_engine
+from app.services.cache import category_cache, product_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def migrate(path: str):
+    """Upgrades the SQLite file at ``path`` to the latest revision."""
+    config = Config()
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    config.set_main_option("sqlalchemy.url", f"sqlite:///{path}")
+    command.upgrade(config, "head")
+
+
+class DatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs each test against a fresh in-memory database."""
+
+    async def asyncSetUp(self):
+        product_cache.clear()
+        category_cache.clear()
+        self.engine = await self.create_database()
+        self.session_factory = sessionmaker(
+            self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.session = self.session_factory()
+
+    async def create_database(self):
+        engine = create_engine(
+            "sqlite+aiosqlite://", pool_size=1, max_overflow=0
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        return engine
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    def client(self) -> httpx.AsyncClient:
+        """An in-process client whose requests use this test's database."""
+
+        async def get_test_db():
+            yield self.session
+
+        main.app.dependency_overrides[main.get_db] = get_test_db
+        main.app.dependency_overrides[main.get_read_db] = get_test_db
+        self.addCleanup(main.app.dependency_overrides.clear)
+        return httpx.AsyncClient(app=main.app, base_url="http://test")
+
+
+class MigratedDatabaseTestCase(DatabaseTestCase):
+    """Runs each test against a database built by the Alembic migrations.
+
+    Use this for features that live only in migrations, such as triggers
+    and virtual tables.
+    """
+
+    async def create_database(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.database_path = os.path.join(directory.name, "products.db")
+        migrate(self.database_path)
+        return create_engine(
+            f"sqlite+aiosqlite:///{self.database_path}",
+            pool_size=1,
+            max_overflow=0,
+        )
@@ -0,0 +1,623 @@
+"""Latency and throughput benchmark for every route in app.main.
+
+Seeds a throwaway SQLite database, drives each endpoint with concurrent
+clients and reports throughput and p50/p95/p99 latency per endpoint:
+
+    python -m benchmarks.load --products 50000 --output results.json
+    python -m benchmarks.load --compare results.json --threshold 0.15
+    python -m benchmarks.load --shards 4 --only "create product"
+
+By default requests go through httpx straight into the ASGI app; --spawn
+starts a local uvicorn process instead so the numbers include the server.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from alembic import command
+from alembic.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Long-lived streams have no per-request latency to measure.
+UNMEASURED_ROUTES = {"GET /changes/stream"}
+# Routes that answer 501 with partitioned storage.
+SINGLE_DATABASE_ROUTES = {"GET /changes", "GET /changes/stream"}
+
+
+@dataclass
+class Request:
+    method: str
+    url: str
+    json: Optional[object] = None
+    files: Optional[dict] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Scenario:
+    name: str
+    route: str
+    make_request: Callable[[int], Request]
+    # Scenarios that consume rows (deletes) cap how many requests they send.
+    max_requests: Optional[int] = None
+
+
+@dataclass
+class Dataset:
+    categories: int
+    products: int
+    # Ids past the shared range that only the delete scenarios consume.
+    spare_products: int
+    spare_categories: int
+
+
+def migrate(path: str):
+    config = Config()
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    config.set_main_option("sqlalchemy.url", f"sqlite:///{path}")
+    command.upgrade(config, "head")
+
+
+def seed(path: str, dataset: Dataset, shards: int = 1):
+    # Migrates every shard, as DATABASE_SHARDS is already set.
+    migrate(path)
+    from app.database.shards import shard_urls
+
+    urls = shard_urls(f"sqlite:///{path}", shards)
+    paths = [url.split("///", 1)[1] for url in urls]
+    random.seed(42)
+    now = datetime.now().isoformat(sep=" ")
+    categories = dataset.categories + dataset.spare_categories
+    products = dataset.products + dataset.spare_products
+    with sqlite3.connect(paths[0]) as conn:
+        conn.executemany(
+            "INSERT INTO categories (id, name) VALUES (?, ?)",
+            ((i, f"Category {i}") for i in range(1, categories + 1)),
+        )
+    rows = [
+        (
+            i,
+            f"Product {i}",
+            f"Description of product {i} "
+            + random.choice(["steel", "oak", "wool", "glass"]),
+            round(random.uniform(1, 500), 2),
+            random.randint(0, 100),
+            random.randint(1, dataset.categories),
+            now,
+        )
+        for i in range(1, products + 1)
+    ]
+    for shard, shard_path in enumerate(paths):
+        with sqlite3.connect(shard_path) as conn:
+            conn.executemany(
+                "INSERT INTO products (id, name, description, price, "
+                "quantity, category_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row for row in rows if row[0] % shards == shard),
+            )
+
+
+def scenarios(dataset: Dataset) -> List[Scenario]:
+    def product_id():
+        return random.randint(1, dataset.products)
+
+    def category_id():
+        return random.randint(1, dataset.categories)
+
+    def product_body(name):
+        return {
+            "name": name,
+            "description": "Benchmark product",
+            "price": round(random.uniform(1, 500), 2),
+            "quantity": random.randint(0, 100),
+            "category_id": category_id(),
+        }
+
+    run = f"{time.time_ns():x}"
+    spare_products = itertools.count(dataset.products + 1)
+    spare_categories = itertools.count(dataset.categories + 1)
+
+    def import_file(n):
+        rows = "\n".join(
+            f"Import {run} {n} {i},Imported,9.99,3,{category_id()}"
+            for i in range(100)
+        )
+        content = "name,description,price,quantity,category_id\n" + rows
+        return {"file": ("products.csv", content.encode())}
+
+    return [
+        Scenario(
+            "list products",
+            "GET /products/",
+            lambda n: Request(
+                "GET", f"/products/?page={random.randint(1, 20)}&per_page=50"
+            ),
+        ),
+        Scenario(
+            "list products by price (cursor)",
+            "GET /products/",
+            lambda n: Request("GET", "/products/?limit=50&order_by=price"),
+        ),
+        Scenario(
+            "filter products",
+            "GET /products/",
+            lambda n: Request(
+                "GET",
+                f"/products/?category_id={category_id()}"
+                "&max_price=100&in_stock=true",
+            ),
+        ),
+        Scenario(
+            "list products (sparse fields)",
+            "GET /products/",
+            lambda n: Request(
+                "GET",
+                f"/products/?page={random.randint(1, 20)}&per_page=50"
+                "&fields=id,price,quantity",
+            ),
+        ),
+        Scenario(
+            "export products",
+            "GET /products/export",
+            lambda n: Request("GET", "/products/export?format=ndjson"),
+            max_requests=20,
+        ),
+        Scenario(
+            "search products",
+            "GET /products/search",
+            lambda n: Request(
+                "GET",
+                "/products/search?q="
+                + random.choice(["steel", "oak pro", "woo", "glass"]),
+            ),
+        ),
+        Scenario(
+            "read product",
+            "GET /products/{product_id}",
+            lambda n: Request("GET", f"/products/{product_id()}"),
+        ),
+        Scenario(
+            "batch read products",
+            "GET /products/batch",
+            lambda n: Request(
+                "GET",
+                "/products/batch?ids="
+                + ",".join(str(product_id()) for _ in range(20)),
+            ),
+        ),
+        Scenario(
+            "batch read products (POST)",
+            "POST /products/batch",
+            lambda n: Request(
+                "POST",
+                "/products/batch",
+                json={"ids": [product_id() for _ in range(500)]},
+            ),
+        ),
+        Scenario(
+            "list categories",
+            "GET /categories/",
+            lambda n: Request("GET", "/categories/"),
+        ),
+        Scenario(
+            "read category",
+            "GET /categories/{category_id}",
+            lambda n: Request("GET", f"/categories/{category_id()}"),
+        ),
+        Scenario(
+            "category stats",
+            "GET /categories/{category_id}/stats",
+            lambda n: Request("GET", f"/categories/{category_id()}/stats"),
+        ),
+        Scenario(
+            "catalog stats",
+            "GET /stats",
+            lambda n: Request("GET", "/stats"),
+        ),
+        Scenario(
+            "cache stats",
+            "GET /cache/stats",
+            lambda n: Request("GET", "/cache/stats"),
+        ),
+        Scenario(
+            "readiness",
+            "GET /health/ready",
+            lambda n: Request("GET", "/health/ready"),
+        ),
+        Scenario(
+            "changes since",
+            "GET /changes",
+            lambda n: Request("GET", "/changes?since=0&limit=500"),
+        ),
+        Scenario(
+            "metrics",
+            "GET /metrics",
+            lambda n: Request("GET", "/metrics"),
+        ),
+        Scenario(
+            "create product",
+            "POST /products/",
+            lambda n: Request(
+                "POST", "/products/", json=product_body(f"New {run} {n}")
+            ),
+        ),
+        Scenario(
+            "bulk upsert products",
+            "POST /products/bulk",
+            lambda n: Request(
+                "POST",
+                "/products/bulk",
+                json=[product_body(f"Bulk {run} {n} {i}") for i in range(50)],
+            ),
+            max_requests=50,
+        ),
+        Scenario(
+            "import products",
+            "POST /products/import",
+            lambda n: Request(
+                "POST", "/products/import", files=import_file(n)
+            ),
+            max_requests=20,
+        ),
+        Scenario(
+            "update product",
+            "PUT /products/{product_id}",
+            lambda n: (
+                lambda i: Request(
+                    "PUT", f"/products/{i}", json=product_body(f"Product {i}")
+                )
+            )(product_id()),
+        ),
+        Scenario(
+            "patch product",
+            "PATCH /products/{product_id}",
+            lambda n: Request(
+                "PATCH",
+                f"/products/{product_id()}",
+                json={"quantity": random.randint(0, 100)},
+            ),
+        ),
+        # Releases run first so the reservations below never run dry.
+        Scenario(
+            "release stock",
+            "POST /products/{product_id}/release",
+            lambda n: Request(
+                "POST", "/products/1/release", json={"quantity": 1000}
+            ),
+        ),
+        Scenario(
+            "release cart",
+            "POST /products/release",
+            lambda n: Request(
+                "POST",
+                "/products/release",
+                json={
+                    "items": [
+                        {"product_id": i, "quantity": 1000}
+                        for i in range(2, 6)
+                    ]
+                },
+            ),
+        ),
+        Scenario(
+            "reserve hot product",
+            "POST /products/{product_id}/reserve",
+            lambda n: Request(
+                "POST", "/products/1/reserve", json={"quantity": 1}
+            ),
+        ),
+        Scenario(
+            "reserve cart",
+            "POST /products/reserve",
+            lambda n: Request(
+                "POST",
+                "/products/reserve",
+                json={
+                    "items": [
+                        {"product_id": i, "quantity": 1} for i in range(2, 6)
+                    ]
+                },
+            ),
+        ),
+        Scenario(
+            "create category",
+            "POST /categories",
+            lambda n: Request(
+                "POST", "/categories", json={"name": f"New {run} {n}"}
+            ),
+        ),
+        Scenario(
+            "update category",
+            "PUT /categories/{category_id}",
+            lambda n: (
+                lambda i: Request(
+                    "PUT", f"/categories/{i}", json={"name": f"Category {i}"}
+                )
+            )(category_id()),
+        ),
+        Scenario(
+            "delete product",
+            "DELETE /products/{product_id}",
+            lambda n: Request("DELETE", f"/products/{next(spare_products)}"),
+            max_requests=dataset.spare_products,
+        ),
+        Scenario(
+            # Matches nothing, so it measures the batch query on its own.
+            "bulk delete products",
+            "DELETE /products/",
+            lambda n: Request(
+                "DELETE", "/products/?created_before=2000-01-01T00:00:00"
+            ),
+        ),
+        Scenario(
+            "delete category",
+            "DELETE /categories/{category_id}",
+            lambda n: Request(
+                "DELETE", f"/categories/{next(spare_categories)}"
+            ),
+            max_requests=dataset.spare_categories,
+        ),
+    ]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, int(round(fraction * len(sorted_values))) - 1)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+) -> dict:
+    if scenario.max_requests is not None:
+        requests = min(requests, scenario.max_requests)
+    numbers = iter(range(requests))
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for n in numbers:
+            request = scenario.make_request(n)
+            started = time.perf_counter()
+            response = await client.request(
+                request.method,
+                request.url,
+                json=request.json,
+                files=request.files,
+                headers=request.headers,
+            )
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "route": scenario.route,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    """Waits for the app to finish warming up, so runs start warm."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get("/health/ready")
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {client.base_url} did not become ready")
+
+
+async def run(args) -> dict:
+    dataset = Dataset(
+        categories=args.categories,
+        products=args.products,
+        spare_products=args.requests,
+        spare_categories=args.requests,
+    )
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, "products.db")
+    # Set before anything imports app.config, including the migrations.
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    os.environ["DATABASE_SHARDS"] = str(args.shards)
+    os.environ["SNAPSHOT_PATH"] = os.path.join(directory.name, "snapshot")
+    print(f"Seeding {args.products} products into {path}", file=sys.stderr)
+    seed(path, dataset, shards=args.shards)
+
+    server = lifespan = None
+    try:
+        if args.spawn:
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "app.main:app",
+                    "--port",
+                    str(port),
+                    "--log-level",
+                    "warning",
+                    "--workers",
+                    str(args.workers),
+                ],
+                cwd=ROOT,
+                env=os.environ.copy(),
+            )
+            client = httpx.AsyncClient(base_url=base_url, timeout=60)
+            covered_routes = None
+        else:
+            # Imported here so the app picks up DATABASE_URL.
+            from app.main import app
+
+            # Runs the lifespan: background tasks such as the snapshot
+            # builder, and the warm-up.
+            lifespan = app.router.lifespan_context(app)
+            await lifespan.__aenter__()
+            client = httpx.AsyncClient(
+                app=app, base_url="http://benchmark", timeout=60
+            )
+            covered_routes = {
+                f"{method} {route.path}"
+                for route in app.routes
+                for method in getattr(route, "methods", ())
+                if method != "HEAD" and route.path.startswith("/")
+                and not route.path.startswith(("/docs", "/redoc", "/openapi"))
+            }
+
+        results = {}
+        async with client:
+            await wait_until_ready(client)
+            for scenario in scenarios(dataset):
+                if args.only and args.only not in scenario.name:
+                    continue
+                if args.shards > 1 and scenario.route in (
+                    SINGLE_DATABASE_ROUTES
+                ):
+                    continue
+                results[scenario.name] = await drive(
+                    client, scenario, args.requests, args.concurrency
+                )
+                print_result(scenario.name, results[scenario.name])
+        if covered_routes is not None:
+            missing = covered_routes - UNMEASURED_ROUTES
+            if args.shards > 1:
+                missing -= SINGLE_DATABASE_ROUTES
+            missing -= {r["route"] for r in results.values()}
+            if missing and not args.only:
+                print(f"Routes without a scenario: {sorted(missing)}")
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        if server is not None:
+            server.terminate()
+            server.wait()
+        directory.cleanup()
+
+    return {
+        "meta": {
+            "products": args.products,
+            "categories": args.categories,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mode": "uvicorn" if args.spawn else "asgi",
+            "shards": args.shards,
+            "created_at": datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+
+
+def print_result(name: str, result: dict):
+    print(
+        f"{name:<34} {result['requests']:>6} req "
+        f"{result['throughput']:>9.1f} req/s  "
+        f"p50 {result['p50_ms']:>8.2f} ms  "
+        f"p95 {result['p95_ms']:>8.2f} ms  "
+        f"p99 {result['p99_ms']:>8.2f} ms  "
+        f"errors {result['errors']}"
+    )
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Lists endpoints whose p95 or throughput regressed past threshold."""
+    regressions = []
+    for name, before in baseline["results"].items():
+        after = current["results"].get(name)
+        if after is None:
+            continue
+        if after["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']:.2f} -> "
+                f"{after['p95_ms']:.2f} ms"
+            )
+        if after["throughput"] < before["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {before['throughput']:.1f} -> "
+                f"{after['throughput']:.1f} req/s"
+            )
+        if after["errors"] > before["errors"]:
+            regressions.append(
+                f"{name}: errors {before['errors']} -> {after['errors']}"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument(
+        "--requests", type=int, default=200, help="requests per endpoint"
+    )
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--spawn", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--shards", type=int, default=1, help="SQLite files to spread over"
+    )
+    parser.add_argument(
+        "--only", help="run scenarios whose name contains this"
+    )
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    current = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
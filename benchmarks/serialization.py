@@ -0,0 +1,90 @@
+"""Compare the pydantic and the row/orjson paths for product list pages.
+
+    python -m benchmarks.serialization --rows 100 --repeat 500
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import orjson
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import PRODUCT_COLUMNS
+from app.database.engine import Base, create_engine
+from app.models.models import Product
+from app.serializers import schemas
+from app.services.export import rows_to_dicts
+
+LIST_FIELD = create_response_field(
+    name="Response_read_all_products", type_=List[schemas.Product]
+)
+
+
+async def pydantic_path(session, limit):
+    result = await session.execute(select(Product).limit(limit))
+    content = await serialize_response(
+        field=LIST_FIELD, response_content=result.scalars().all()
+    )
+    # Mirrors starlette's JSONResponse.render.
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode()
+
+
+async def orjson_path(session, limit):
+    result = await session.execute(select(*PRODUCT_COLUMNS).limit(limit))
+    return orjson.dumps(rows_to_dicts(result.all()))
+
+
+async def run(rows: int, repeat: int):
+    engine = create_engine("sqlite+aiosqlite://", pool_size=1, max_overflow=0)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with session_factory() as session:
+        session.add_all(
+            Product(
+                name=f"Product {i}",
+                description=f"Description of product {i}",
+                price=i + 0.99,
+                quantity=i,
+                category_id=1,
+            )
+            for i in range(rows)
+        )
+        await session.commit()
+
+    results = {}
+    for name, path in (("pydantic", pydantic_path), ("orjson", orjson_path)):
+        async with session_factory() as session:
+            await path(session, rows)
+            started = time.perf_counter()
+            for _ in range(repeat):
+                await path(session, rows)
+                session.expunge_all()
+            results[name] = (time.perf_counter() - started) / repeat
+    await engine.dispose()
+
+    for name, seconds in results.items():
+        print(f"{name:>10}: {seconds * 1e3:8.3f} ms per {rows}-row page")
+    print(f"{'speedup':>10}: {results['pydantic'] / results['orjson']:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()